@@ -14,6 +14,8 @@ set(PYCICLE_ROOT "/scratch/snx3000/biddisco/pycicle")
 set(PYCICLE_HTTP TRUE)
 # Method used to launch jobs "slurm", "pbs" or "direct" supported
 set(PYCICLE_JOB_LAUNCH "slurm")
+# PRs are built with each of these in turn, the base branch with all
+set(PYCICLE_COMPILERS "gcc;clang")
 #
 set(PYCICLE_BUILD_TYPE "Release")
 
@@ -0,0 +1,100 @@
+#  Copyright (c) 2017-2019 John Biddiscombe
+#
+#  Distributed under the Boost Software License, Version 1.0. (See accompanying
+#  file LICENSE_1_0.txt or copy at http://www.boost.org/LICENSE_1_0.txt)
+
+cmake_minimum_required(VERSION 3.1 FATAL_ERROR)
+
+#######################################################################
+# For debugging this script
+#######################################################################
+message("In ${CMAKE_CURRENT_LIST_FILE}")
+message("Project name is        : " ${PYCICLE_PROJECT_NAME})
+message("Github name is         : " ${PYCICLE_GITHUB_PROJECT_NAME})
+message("Machine name is        : " ${PYCICLE_HOST})
+message("PYCICLE_ROOT is        : " ${PYCICLE_ROOT})
+message("PYCICLE_CONFIG_PATH is : " ${PYCICLE_CONFIG_PATH})
+message("Random string is       : " ${PYCICLE_RANDOM})
+message("COMPILER type is       : " ${PYCICLE_COMPILER_TYPE})
+message("Build type is          : " ${PYCICLE_BUILD_TYPE})
+message("Task file is           : " ${PYCICLE_ARRAY_FILE})
+message("Array size is          : " ${PYCICLE_ARRAY_SIZE})
+
+#######################################################################
+# Load machine specific settings
+#######################################################################
+include(${PYCICLE_CONFIG_PATH}/${PYCICLE_HOST}.cmake)
+
+if(NOT PYCICLE_JOB_SCRIPT_TEMPLATE)
+  message(FATAL_ERROR "You must have a job template to submit a job array for CI")
+endif()
+
+#######################################################################
+# Generate one job script for all the tasks of the array.
+# Each task reads its PR, branch and test label from its line of the
+# task file (line N+1 for task N) and passes them after the arguments
+# that are shared by all tasks.
+#######################################################################
+set(PYCICLE_JOB_SCRIPT_TEMPLATE ${PYCICLE_JOB_SCRIPT_TEMPLATE}
+  "\n"
+  "task=$SLURM_ARRAY_TASK_ID\n"
+  "if [ -z \"$task\" ]; then task=$PBS_ARRAYID; fi\n"
+  "if [ -z \"$task\" ]; then task=$PBS_ARRAY_INDEX; fi\n"
+  "task_args=$(sed -n \"$((task + 1))p\" ${PYCICLE_ARRAY_FILE})\n"
+  "eval \"ctest "
+  "-S ${PYCICLE_ROOT}/pycicle/dashboard_script.cmake "
+  "-DPYCICLE_ROOT=${PYCICLE_ROOT} "
+  "-DPYCICLE_CONFIG_PATH=${PYCICLE_CONFIG_PATH} "
+  "-DPYCICLE_HOST=${PYCICLE_HOST} "
+  "-DPYCICLE_PROJECT_NAME=${PYCICLE_PROJECT_NAME} "
+  "-DPYCICLE_GITHUB_PROJECT_NAME=${PYCICLE_GITHUB_PROJECT_NAME} "
+  "-DPYCICLE_GITHUB_ORGANISATION=${PYCICLE_GITHUB_ORGANISATION} "
+  "-DPYCICLE_GITHUB_USER_LOGIN=${PYCICLE_GITHUB_USER_LOGIN} "
+  "-DPYCICLE_COMPILER_TYPE=${PYCICLE_COMPILER_TYPE} "
+  "-DPYCICLE_BOOST=${PYCICLE_BOOST} "
+  "-DPYCICLE_BUILD_TYPE=${PYCICLE_BUILD_TYPE} "
+  "-DPYCICLE_INCREMENTAL=${PYCICLE_INCREMENTAL} "
+  "-DPYCICLE_FAIL_FAST=${PYCICLE_FAIL_FAST} "
+  "-DPYCICLE_BASE=${PYCICLE_BASE} "
+  "$task_args\"\n"
+)
+
+# the script must stay until the scheduler has read it, the submission
+# command removes old ones together with the old task files
+get_filename_component(PYCICLE_ARRAY_DIR ${PYCICLE_ARRAY_FILE} DIRECTORY)
+set(PYCICLE_ARRAY_SCRIPT "${PYCICLE_ARRAY_DIR}/ctest-array-${PYCICLE_RANDOM}.sh")
+file(WRITE "${PYCICLE_ARRAY_SCRIPT}" ${PYCICLE_JOB_SCRIPT_TEMPLATE})
+
+#######################################################################
+# Submit the array, tasks 0 to N-1, and print its job id so that
+# pycicle can follow the tasks.
+# Torque takes the range with -t and gives each task PBS_ARRAYID, PBS Pro
+# takes it with -J and gives PBS_ARRAY_INDEX (both are read by the job
+# script above). The machine config may set PYCICLE_PBS_ARRAY_FLAG,
+# otherwise qstat --version tells them apart.
+#######################################################################
+math(EXPR PYCICLE_ARRAY_LAST "${PYCICLE_ARRAY_SIZE} - 1")
+if(PYCICLE_JOB_LAUNCH MATCHES "pbs")
+  if(NOT PYCICLE_PBS_ARRAY_FLAG)
+    execute_process(
+      COMMAND bash "-c" "qstat --version 2>&1"
+      OUTPUT_VARIABLE qstat_version_
+    )
+    if(qstat_version_ MATCHES "pbs_version")
+      set(PYCICLE_PBS_ARRAY_FLAG "-J")
+    else()
+      set(PYCICLE_PBS_ARRAY_FLAG "-t")
+    endif()
+  endif()
+  set(PYCICLE_ARRAY_SUBMIT "qsub ${PYCICLE_PBS_ARRAY_FLAG} 0-${PYCICLE_ARRAY_LAST} ${PYCICLE_ARRAY_SCRIPT}")
+else()
+  set(PYCICLE_ARRAY_SUBMIT "sbatch --parsable --array=0-${PYCICLE_ARRAY_LAST} ${PYCICLE_ARRAY_SCRIPT}")
+endif()
+message("${PYCICLE_ARRAY_SUBMIT}")
+
+execute_process(
+  COMMAND bash "-c" "${PYCICLE_ARRAY_SUBMIT}"
+  OUTPUT_VARIABLE PYCICLE_JOB_ID
+  OUTPUT_STRIP_TRAILING_WHITESPACE
+)
+message("PYCICLE_JOB_ID=${PYCICLE_JOB_ID}")
@@ -49,6 +49,9 @@ set(PYCICLE_JOB_SCRIPT_TEMPLATE ${PYCICLE_JOB_SCRIPT_TEMPLATE}
   "-DPYCICLE_COMPILER_TYPE=${PYCICLE_COMPILER_TYPE} "
   "-DPYCICLE_BOOST=${PYCICLE_BOOST} "
   "-DPYCICLE_BUILD_TYPE=${PYCICLE_BUILD_TYPE} "
+  "-DPYCICLE_INCREMENTAL=${PYCICLE_INCREMENTAL} "
+  "-DPYCICLE_FAIL_FAST=${PYCICLE_FAIL_FAST} "
+  "'-DPYCICLE_TEST_INCLUDE_LABEL=${PYCICLE_TEST_INCLUDE_LABEL}' "
   "-DPYCICLE_BASE=${PYCICLE_BASE} \n"
 )
 
@@ -64,6 +67,7 @@ endif(PYCICLE_JOB_SCRIPT_TEMPLATE)
 # 1 Cancel any build using the same name as this one so that multiple
 #   pushes to the same branch are handled cleanly
 # 2 Spawn a new build
+# 3 Print the job id so that pycicle can follow the job
 #######################################################################
 message("qsub ${PYCICLE_ROOT}/build/ctest-pbs-${PYCICLE_RANDOM}.sh"
 )
@@ -71,7 +75,10 @@ message("qsub ${PYCICLE_ROOT}/build/ctest-pbs-${PYCICLE_RANDOM}.sh"
 execute_process(
   #"qdel $(qstat -u `whoami` | awk -e \'/DCA-${PYCICLE_PR}-${PYCICLE_BUILD_STAMP}/ { print $1 }\') > /dev/null 2>&1;
   COMMAND bash "-c" "qsub ${PYCICLE_ROOT}/build/ctest-pbs-${PYCICLE_RANDOM}.sh"
+  OUTPUT_VARIABLE PYCICLE_JOB_ID
+  OUTPUT_STRIP_TRAILING_WHITESPACE
   )
+message("PYCICLE_JOB_ID=${PYCICLE_JOB_ID}")
 
 # wipe the temp file job script
 #file(REMOVE "${PYCICLE_ROOT}/build/ctest-pbs-${PYCICLE_RANDOM}.sh")
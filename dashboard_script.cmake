@@ -22,6 +22,9 @@ message("PYCICLE_CONFIG_PATH is : " ${PYCICLE_CONFIG_PATH})
 message("COMPILER type is       : " ${PYCICLE_COMPILER_TYPE})
 message("BOOST is               : " ${PYCICLE_BOOST})
 message("Build type is          : " ${PYCICLE_BUILD_TYPE})
+message("Incremental is         : " ${PYCICLE_INCREMENTAL})
+message("Test labels are        : " ${PYCICLE_TEST_INCLUDE_LABEL})
+message("Fail fast is           : " ${PYCICLE_FAIL_FAST})
 
 #######################################################################
 # Load machine specific settings
@@ -33,14 +36,15 @@ include(${PYCICLE_CONFIG_PATH}/${PYCICLE_PROJECT_NAME}.cmake)
 include(${PYCICLE_CONFIG_PATH}/${PYCICLE_HOST}.cmake)
 
 #######################################################################
-# a function that calls ctest_submit - only used to make
+# a macro that calls ctest_submit - only used to make
 # debugging a bit simpler by allowing us to disable submits
+# (a macro so that a BUILD_ID variable is set in the caller's scope)
 #######################################################################
-function(pycicle_submit)
+macro(pycicle_submit)
 #  if(NOT DEBUG_MODE)
     ctest_submit(${ARGN})
 #  endif()
-endfunction()
+endmacro()
 
 #######################################################################
 # All the rest below here should not need changes
@@ -48,6 +52,7 @@ endfunction()
 set(PYCICLE_SRC_ROOT       "${PYCICLE_ROOT}/src")
 set(PYCICLE_BUILD_ROOT     "${PYCICLE_ROOT}/build")
 set(PYCICLE_LOCAL_GIT_COPY "${PYCICLE_ROOT}/repos/${PYCICLE_GITHUB_PROJECT_NAME}")
+set(PYCICLE_GIT_MIRROR     "${PYCICLE_ROOT}/repos/${PYCICLE_GITHUB_PROJECT_NAME}.git")
 
 set(PYCICLE_PR_ROOT          "${PYCICLE_SRC_ROOT}/${PYCICLE_PROJECT_NAME}-${PYCICLE_PR}")
 set(CTEST_SOURCE_DIRECTORY   "${PYCICLE_PR_ROOT}/repo")
@@ -75,15 +80,19 @@ include(FindGit)
 set(CTEST_GIT_COMMAND "${GIT_EXECUTABLE}")
 
 #######################################################################
-# First checkout, copy from $PYCICLE_ROOT/repos/$project to save
-# cloning many GB's which can be a problem for large repos over on
-# slow connections
+# First checkout, a shared clone of the mirror $PYCICLE_ROOT/repos/$project.git
+# that pycicle keeps up to date, it uses the objects of the mirror so it
+# costs a few MB instead of cloning many GB's which can be a problem for
+# large repos over on slow connections
 #
-# if $PYCICLE_ROOT/repos/$project does not exist already, then perform a
-# full checkout
+# without the mirror, copy from $PYCICLE_ROOT/repos/$project, and if
+# that does not exist either, then perform a full checkout
 #######################################################################
 set (make_repo_copy_ "")
-if (NOT EXISTS "${CTEST_SOURCE_DIRECTORY}/.git")
+if (EXISTS "${PYCICLE_GIT_MIRROR}/HEAD")
+  message("Configuring src repo as shared clone of the repo mirror")
+  set (make_repo_copy_ "if [ ! -d ${CTEST_SOURCE_DIRECTORY}/.git ]; then ${CTEST_GIT_COMMAND} clone --shared --no-checkout ${PYCICLE_GIT_MIRROR} ${CTEST_SOURCE_DIRECTORY}; fi")
+elseif (NOT EXISTS "${CTEST_SOURCE_DIRECTORY}/.git")
   message("Configuring src repo copy from local repo cache")
   set (make_repo_copy_ "cp -r ${PYCICLE_LOCAL_GIT_COPY} ${CTEST_SOURCE_DIRECTORY}")
   if (NOT EXISTS "${PYCICLE_LOCAL_GIT_COPY}/.git")
@@ -174,6 +183,14 @@ if (NOT PYCICLE_PR STREQUAL "${PYCICLE_BASE}")
  #${CTEST_GIT_COMMAND} checkout ${PYCICLE_BASE};
  #                        ${CTEST_GIT_COMMAND} merge --no-edit -s recursive -X theirs origin/${PYCICLE_BRANCH};"
 
+  # the pull of the PR left its head in FETCH_HEAD
+  execute_process(
+    COMMAND ${CTEST_GIT_COMMAND} rev-parse FETCH_HEAD
+    WORKING_DIRECTORY "${CTEST_SOURCE_DIRECTORY}"
+    OUTPUT_VARIABLE PYCICLE_BUILT_SHA
+    OUTPUT_STRIP_TRAILING_WHITESPACE
+  )
+
   set(CTEST_UPDATE_OPTIONS "${CTEST_SOURCE_DIRECTORY} ${GIT_BRANCH}")
 else()
   set(CTEST_SUBMISSION_TRACK "${PYCICLE_BASE}")
@@ -185,7 +202,7 @@ else()
                        cd ${CTEST_SOURCE_DIRECTORY};
                        ${CTEST_GIT_COMMAND} checkout ${PYCICLE_BASE};
                        ${CTEST_GIT_COMMAND} fetch origin;
-                       ${CTEST_GIT_COMMAND} reset --hard;"
+                       ${CTEST_GIT_COMMAND} reset --hard origin/${PYCICLE_BASE};"
     WORKING_DIRECTORY "${WORK_DIR}"
     OUTPUT_VARIABLE output
     ERROR_VARIABLE  error
@@ -198,20 +215,79 @@ else()
                        cd ${CTEST_SOURCE_DIRECTORY};
                        ${CTEST_GIT_COMMAND} checkout ${PYCICLE_BASE};
                        ${CTEST_GIT_COMMAND} fetch origin;
-                       ${CTEST_GIT_COMMAND} reset --hard;"
+                       ${CTEST_GIT_COMMAND} reset --hard origin/${PYCICLE_BASE};"
       "Typical reasons : no access to github from the build location"
       "                  Some dirty files in the source tree prevents merge"
       "Output is ${output}"
       "Error is ${error}")
   endif ( failed EQUAL 1 )
+
+  execute_process(
+    COMMAND ${CTEST_GIT_COMMAND} rev-parse HEAD
+    WORKING_DIRECTORY "${CTEST_SOURCE_DIRECTORY}"
+    OUTPUT_VARIABLE PYCICLE_BUILT_SHA
+    OUTPUT_STRIP_TRAILING_WHITESPACE
+  )
 endif()
 
 #######################################################################
-# Wipe build dir when starting a new build
+# Wipe build dir when starting a new build,
+# unless incremental builds reuse the build dir of the previous push
 #######################################################################
 set(CTEST_BINARY_DIRECTORY "${PYCICLE_BINARY_DIRECTORY}")
-message("Wiping binary directory ${CTEST_BINARY_DIRECTORY}")
-ctest_empty_binary_directory(${CTEST_BINARY_DIRECTORY})
+if (PYCICLE_INCREMENTAL)
+  message("Reusing binary directory ${CTEST_BINARY_DIRECTORY}")
+else()
+  message("Wiping binary directory ${CTEST_BINARY_DIRECTORY}")
+  ctest_empty_binary_directory(${CTEST_BINARY_DIRECTORY})
+endif()
+
+#######################################################################
+# Incremental builds compile through ccache, one cache per machine and
+# build stamp (compiler/options), shared by all PRs. The cache size is
+# limited by pycicle. Paths are made relative to PYCICLE_ROOT so that
+# the same file in the src tree of another PR is a cache hit.
+#######################################################################
+set(PYCICLE_CCACHE_STATS "")
+if (PYCICLE_INCREMENTAL)
+  find_program(PYCICLE_CCACHE ccache)
+  if (PYCICLE_CCACHE)
+    set(ENV{CCACHE_DIR}       "${PYCICLE_ROOT}/ccache/${PYCICLE_HOST}-${PYCICLE_BUILD_STAMP}")
+    set(ENV{CCACHE_BASEDIR}   "${PYCICLE_ROOT}")
+    set(ENV{CCACHE_NOHASHDIR} "true")
+    file(MAKE_DIRECTORY "$ENV{CCACHE_DIR}")
+    set(PYCICLE_CCACHE_STATS "${PYCICLE_CCACHE} --print-stats 2>/dev/null || ${PYCICLE_CCACHE} -s")
+  else()
+    message("ccache not found, incremental build without compiler cache")
+  endif()
+endif()
+
+#######################################################################
+# pycicle_summary.py summarizes the results of each stage for pycicle,
+# without python only the final result is written (see the end)
+#######################################################################
+find_program(PYCICLE_PYTHON NAMES python3 python)
+if (PYCICLE_FAIL_FAST AND NOT PYCICLE_PYTHON)
+  message("python not found, the summary can not report skipped stages, fail fast disabled")
+  set(PYCICLE_FAIL_FAST OFF)
+endif()
+
+#######################################################################
+# a macro that writes the pycicle-stage-<stage>.txt marker once a stage
+# has finished, pycicle publishes it while the build carries on
+#######################################################################
+macro(pycicle_stage stage)
+  if (PYCICLE_PYTHON)
+    execute_process(
+      COMMAND ${PYCICLE_PYTHON} ${PYCICLE_ROOT}/pycicle/pycicle_summary.py ${PYCICLE_BINARY_DIRECTORY} --stage ${stage}
+              ${PYCICLE_BUILT_ARGS}
+      WORKING_DIRECTORY "${PYCICLE_BINARY_DIRECTORY}"
+      OUTPUT_VARIABLE output
+      ERROR_VARIABLE  error
+      RESULT_VARIABLE failed
+    )
+  endif()
+endmacro()
 
 #######################################################################
 # Dashboard model : use Experimental unless problems arise
@@ -249,7 +325,11 @@ set(CTEST_BINARY_DIRECTORY "${PYCICLE_BINARY_DIRECTORY}")
 # Erase any test complete status before starting new dashboard run
 # (this should have been wiped anyway by ctest_empty_binary_directory)
 #######################################################################
-file(REMOVE "${CTEST_BINARY_DIRECTORY}/pycicle-TAG.txt")
+file(REMOVE "${CTEST_BINARY_DIRECTORY}/pycicle-TAG.txt"
+            "${CTEST_BINARY_DIRECTORY}/pycicle-stage-configure.txt"
+            "${CTEST_BINARY_DIRECTORY}/pycicle-stage-build.txt"
+            "${CTEST_BINARY_DIRECTORY}/ccache-before.txt"
+            "${CTEST_BINARY_DIRECTORY}/ccache-after.txt")
 
 #######################################################################
 # START dashboard
@@ -261,6 +341,11 @@ ctest_start(${CTEST_MODEL}
     "${CTEST_BINARY_DIRECTORY}"
 )
 
+if (PYCICLE_CCACHE_STATS)
+  set(CTEST_BUILD_OPTIONS
+    "${CTEST_BUILD_OPTIONS} -DCMAKE_C_COMPILER_LAUNCHER=${PYCICLE_CCACHE} -DCMAKE_CXX_COMPILER_LAUNCHER=${PYCICLE_CCACHE} ")
+endif()
+
 string(CONCAT CTEST_CONFIGURE_COMMAND
   " ${CMAKE_COMMAND} -DCMAKE_BUILD_TYPE=${PYCICLE_BUILD_TYPE} "
   " ${CTEST_BUILD_OPTIONS}"
@@ -275,20 +360,74 @@ message("CTEST_UPDATE_COMMAND:${CTEST_UPDATE_COMMAND}")
 message("CTEST_UPDATE_OPTIONS:${CTEST_UPDATE_OPTIONS}")
 ctest_update(RETURN_VALUE NB_CHANGED_FILES)
 message("Found ${NB_CHANGED_FILES} changed file(s)")
+
+# the head SHA and the tree of the merged sources go into the summary,
+# pycicle drops a result that is not from the build it is waiting for
+# and keys the result cache on the tree
+execute_process(
+  COMMAND ${CTEST_GIT_COMMAND} rev-parse HEAD^{tree}
+  WORKING_DIRECTORY "${CTEST_SOURCE_DIRECTORY}"
+  OUTPUT_VARIABLE PYCICLE_BUILT_TREE
+  OUTPUT_STRIP_TRAILING_WHITESPACE
+)
+set(PYCICLE_BUILT_ARGS "")
+if (PYCICLE_BUILT_SHA)
+  list(APPEND PYCICLE_BUILT_ARGS --sha ${PYCICLE_BUILT_SHA})
+endif()
+if (PYCICLE_BUILT_TREE)
+  list(APPEND PYCICLE_BUILT_ARGS --tree ${PYCICLE_BUILT_TREE})
+endif()
 message("CTEST_CONFIGURE_COMMAND is\n${CTEST_CONFIGURE_COMMAND}")
 
 message("Configure...")
-ctest_configure()
+ctest_configure(RETURN_VALUE configure_result_)
 pycicle_submit(PARTS Update Configure)
+pycicle_stage(configure)
+
+# with fail fast a failed stage ends the build, freeing the node
+set(PYCICLE_ABORTED "")
+if (PYCICLE_FAIL_FAST AND NOT configure_result_ EQUAL 0)
+  message("Configure failed, skipping build and tests")
+  set(PYCICLE_ABORTED "configure")
+endif()
 
+if (NOT PYCICLE_ABORTED)
 message("Build...")
+# cache statistics before/after the build give the hits of this build
+# (approximately, other builds may use the same cache at the same time)
+if (PYCICLE_CCACHE_STATS)
+  execute_process(COMMAND bash "-c" "${PYCICLE_CCACHE_STATS} > ${PYCICLE_BINARY_DIRECTORY}/ccache-before.txt")
+endif()
 set(CTEST_BUILD_FLAGS "-j ${BUILD_PARALLELISM}")
-ctest_build(TARGET ${PYCICLE_CTEST_BUILD_TARGET} )
+ctest_build(TARGET ${PYCICLE_CTEST_BUILD_TARGET} NUMBER_ERRORS build_errors_)
 pycicle_submit(PARTS Build)
+if (PYCICLE_CCACHE_STATS)
+  execute_process(COMMAND bash "-c" "${PYCICLE_CCACHE_STATS} > ${PYCICLE_BINARY_DIRECTORY}/ccache-after.txt")
+endif()
+pycicle_stage(build)
+
+if (PYCICLE_FAIL_FAST AND build_errors_ GREATER 0)
+  message("Build failed, skipping tests")
+  set(PYCICLE_ABORTED "build")
+endif()
+endif()
 
+if (NOT PYCICLE_ABORTED)
 message("Test...")
-ctest_test(RETURN_VALUE test_result_ EXCLUDE "compile")
-pycicle_submit(PARTS Test)
+# pycicle may select the tests covering the files changed by the PR
+if (PYCICLE_TEST_INCLUDE_LABEL)
+  message("Only running tests with labels matching ${PYCICLE_TEST_INCLUDE_LABEL}")
+  ctest_test(RETURN_VALUE test_result_ EXCLUDE "compile" INCLUDE_LABEL "${PYCICLE_TEST_INCLUDE_LABEL}")
+else()
+  ctest_test(RETURN_VALUE test_result_ EXCLUDE "compile")
+endif()
+# the CDash build id lets pycicle link straight to the results
+if (NOT CMAKE_VERSION VERSION_LESS 3.14)
+  pycicle_submit(PARTS Test BUILD_ID PYCICLE_CDASH_BUILD_ID)
+else()
+  pycicle_submit(PARTS Test)
+endif()
+endif()
 
 if (WITH_COVERAGE AND CTEST_COVERAGE_COMMAND)
   ctest_coverage()
@@ -298,18 +437,37 @@ if (WITH_MEMCHECK AND CTEST_MEMORYCHECK_COMMAND)
 endif (WITH_MEMCHECK AND CTEST_MEMORYCHECK_COMMAND)
 
 # Create a file when this build has finished so that pycicle can scrape the most
-# recent results and use them to update the github  pull request status
-# we will get the TAG from ctest and use it to find the correct XML files
-# with our Configure/Build/Test errors/warnings
-execute_process(
-  COMMAND bash "-c"
+# recent results and use them to update the github  pull request status.
+# pycicle_summary.py reads the Configure/Build/Test xml of the ctest TAG in
+# one pass and writes a json summary (errors, warnings, failed tests, times).
+# Without python fall back to the original counts of error lines.
+if (PYCICLE_PYTHON)
+  set(summary_command_ "${PYCICLE_PYTHON} ${PYCICLE_ROOT}/pycicle/pycicle_summary.py ${PYCICLE_BINARY_DIRECTORY}")
+  if (PYCICLE_CDASH_BUILD_ID)
+    set(summary_command_ "${summary_command_} --build-id ${PYCICLE_CDASH_BUILD_ID}")
+  endif()
+  if (PYCICLE_TEST_INCLUDE_LABEL)
+    set(summary_command_ "${summary_command_} --include-label '${PYCICLE_TEST_INCLUDE_LABEL}'")
+  endif()
+  if (PYCICLE_ABORTED)
+    set(summary_command_ "${summary_command_} --aborted ${PYCICLE_ABORTED}")
+  endif()
+  if (PYCICLE_BUILT_ARGS)
+    string(REPLACE ";" " " built_args_ "${PYCICLE_BUILT_ARGS}")
+    set(summary_command_ "${summary_command_} ${built_args_}")
+  endif()
+else()
+  set(summary_command_
     "TEMP=$(head -n 1 ${PYCICLE_BINARY_DIRECTORY}/Testing/TAG);
     {
     grep '<Error>' ${PYCICLE_BINARY_DIRECTORY}/Testing/$TEMP/Configure.xml | wc -l
     grep '<Error>' ${PYCICLE_BINARY_DIRECTORY}/Testing/$TEMP/Build.xml | wc -l
     grep '<Test Status=\"failed\">' ${PYCICLE_BINARY_DIRECTORY}/Testing/$TEMP/Test.xml | wc -l
     echo $TEMP
-    } > ${PYCICLE_BINARY_DIRECTORY}/pycicle-TAG.txt"
+    } > ${PYCICLE_BINARY_DIRECTORY}/pycicle-TAG.txt")
+endif()
+execute_process(
+  COMMAND bash "-c" "${summary_command_}"
   WORKING_DIRECTORY "${PYCICLE_BINARY_DIRECTORY}"
   OUTPUT_VARIABLE output
   ERROR_VARIABLE  error
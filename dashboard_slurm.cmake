@@ -48,6 +48,9 @@ set(PYCICLE_JOB_SCRIPT_TEMPLATE ${PYCICLE_JOB_SCRIPT_TEMPLATE}
   "-DPYCICLE_COMPILER_TYPE=${PYCICLE_COMPILER_TYPE} "
   "-DPYCICLE_BOOST=${PYCICLE_BOOST} "
   "-DPYCICLE_BUILD_TYPE=${PYCICLE_BUILD_TYPE} "
+  "-DPYCICLE_INCREMENTAL=${PYCICLE_INCREMENTAL} "
+  "-DPYCICLE_FAIL_FAST=${PYCICLE_FAIL_FAST} "
+  "'-DPYCICLE_TEST_INCLUDE_LABEL=${PYCICLE_TEST_INCLUDE_LABEL}' "
   "-DPYCICLE_BASE=${PYCICLE_BASE} \n"
 )
 
@@ -59,6 +62,7 @@ file(WRITE "${PYCICLE_ROOT}/build/ctest-slurm-${PYCICLE_RANDOM}.sh" ${PYCICLE_JO
 # 1 Cancel any build using the same name as this one so that multiple
 #   pushes to the same branch are handled cleanly
 # 2 Spawn a new build
+# 3 Print the job id so that pycicle can follow the job
 #######################################################################
 message("sbatch \n"
     ${PYCICLE_ROOT}/build/ctest-slurm-${PYCICLE_RANDOM}.sh
@@ -66,8 +70,11 @@ message("sbatch \n"
 
 execute_process(
   COMMAND bash "-c" "scancel $(squeue -n ${PYCICLE_PROJECT_NAME}-${PYCICLE_PR}-${PYCICLE_BUILD_STAMP} -h -o %A) > /dev/null 2>&1;
-                     sbatch ${PYCICLE_ROOT}/build/ctest-slurm-${PYCICLE_RANDOM}.sh"
+                     sbatch --parsable ${PYCICLE_ROOT}/build/ctest-slurm-${PYCICLE_RANDOM}.sh"
+  OUTPUT_VARIABLE PYCICLE_JOB_ID
+  OUTPUT_STRIP_TRAILING_WHITESPACE
 )
+message("PYCICLE_JOB_ID=${PYCICLE_JOB_ID}")
 
 # wipe the temp file job script
 file(REMOVE "${PYCICLE_ROOT}/build/ctest-slurm-${PYCICLE_RANDOM}.sh")
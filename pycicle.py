@@ -12,18 +12,16 @@
 #--------------------------------------------------------------------------
 from __future__ import absolute_import, division, print_function, unicode_literals
 import github
-import ssl
 import os
-import subprocess
-import time
-import re
-import string
-import random
-import socket
-import datetime
+import asyncio
 import argparse
 
 from pycicle_params import PycicleParams
+from pycicle_github import GithubClient
+from pycicle_jobs import default_local_jobs
+from pycicle_cleanup import parse_size
+from pycicle_metrics import Metrics
+from pycicle_runner import PycicleRunner
 
 def get_command_line_args():
     #--------------------------------------------------------------------------
@@ -69,6 +67,8 @@ def get_command_line_args():
     #----------------------------------------------
     parser.add_argument('-a', '--access-control', dest='access_control', action='store_true',
                         help="On PRs whose last commit was authored by a org member or the user themselves will be built and tested.")
+    parser.add_argument('--access-ttl', dest='access_ttl', type=int, default=3600,
+                        help='Seconds before the org members/collaborators allowed to build are fetched again')
 
     #----------------------------------------------
     # set default path for pycicle work dir
@@ -91,13 +91,39 @@ def get_command_line_args():
     # use a space separated list of machine nicknames such as
     # -m greina daint jb-laptop
     # where the names corresond to the name.cmake files in the config dir
-    #
-    # TODO : add support for multiple machines and configs
+    # every PR is built on all of them. When not given, the PYCICLE_MACHINES
+    # setting of the project config is used (a cmake list "daint;greina")
     #--------------------------------------------------------------------------
-    machines = {os.environ.get('PYCICLE_MACHINES', 'greina')}
+    machines = os.environ.get('PYCICLE_MACHINES', '').split()
     parser.add_argument('-m', '--machines', dest='machines', nargs='+',
                         default=machines, help='list of machines to use for testing')
 
+    #--------------------------------------------------------------------------
+    # number of builds that may run at the same time on a 'local' machine
+    #--------------------------------------------------------------------------
+    parser.add_argument('--local-jobs', dest='local_jobs', type=int,
+                        default=default_local_jobs(),
+                        help='Concurrent builds on local machines (default from cores/memory)')
+
+    #--------------------------------------------------------------------------
+    # cap on builds in flight per machine, the rest wait in the build queue
+    #--------------------------------------------------------------------------
+    parser.add_argument('--max-jobs-per-machine', dest='max_jobs', type=int,
+                        default=10, help='Maximum builds in flight on each machine')
+
+    #--------------------------------------------------------------------------
+    # submit the builds a slurm/pbs machine launches together as one job array
+    #--------------------------------------------------------------------------
+    parser.add_argument('--job-arrays', dest='job_arrays', action='store_true',
+                        default=False, help='Submit the builds of a launch as one slurm/pbs job array')
+
+    #--------------------------------------------------------------------------
+    # cap on the PR builds queued by one pass over the open PRs
+    #--------------------------------------------------------------------------
+    parser.add_argument('--cycle-budget', dest='cycle_budget', type=int, default=0,
+                        help='Maximum PR builds queued per github check, the other PRs wait '
+                             'for the next check (default 0, no limit)')
+
     #--------------------------------------------------------------------------
     # CMake build type
     #--------------------------------------------------------------------------
@@ -122,6 +148,81 @@ def get_command_line_args():
     parser.add_argument('-c', '--scrape-only', dest='scrape_only', action='store_true',
                         default=False, help="Only scrape results and set github status (no building)")
 
+    #--------------------------------------------------------------------------
+    # intervals of the runner tasks
+    #--------------------------------------------------------------------------
+    parser.add_argument('--poll-time', dest='poll_time', type=int, default=60,
+                        help='Seconds between checks of github, of the build queue and of scheduler jobs')
+
+    parser.add_argument('--scrape-time', dest='scrape_time', type=int, default=10*60,
+                        help='Seconds between scrapes of results (when not woken by a build ending) '
+                             'and cleanups of each machine')
+
+    #--------------------------------------------------------------------------
+    # metrics : served on http://localhost:PORT/metrics and logged as json
+    #--------------------------------------------------------------------------
+    parser.add_argument('--metrics-port', dest='metrics_port', type=int, default=0,
+                        help='Serve prometheus metrics on this (local) port, 0 to disable')
+
+    parser.add_argument('--metrics-interval', dest='metrics_interval', type=int, default=300,
+                        help='Seconds between json metric summaries in the log, 0 to disable')
+
+    #--------------------------------------------------------------------------
+    # webhook mode : listen for github events instead of polling every minute
+    #--------------------------------------------------------------------------
+    parser.add_argument('--listen', dest='listen_port', type=int, nargs='?',
+                        const=8080, default=0,
+                        help='Receive github webhooks on this port (default 8080), polling github '
+                             'only every --reconcile-time seconds as a safety net')
+
+    parser.add_argument('--reconcile-time', dest='reconcile_time', type=int,
+                        default=15*60, help='Seconds between full polls of github in --listen mode')
+
+    webhook_secret = os.environ.get('PYCICLE_WEBHOOK_SECRET', None)
+    parser.add_argument('--webhook-secret', dest='webhook_secret',
+                        default=webhook_secret, help='Secret used to sign webhook deliveries')
+
+    #--------------------------------------------------------------------------
+    # incremental builds : keep the build tree of a PR and use ccache
+    #--------------------------------------------------------------------------
+    parser.add_argument('--incremental', dest='incremental', action='store_true',
+                        default=False, help='Keep the src/build trees of open PRs between pushes '
+                                            'and compile through ccache')
+
+    parser.add_argument('--ccache-size', dest='ccache_size', default='20G',
+                        help='Size limit of each ccache directory in --incremental mode (default 20G)')
+
+    #--------------------------------------------------------------------------
+    # results are cached by the tree of the PR merged onto the base branch
+    #--------------------------------------------------------------------------
+    parser.add_argument('--no-result-cache', dest='result_cache', action='store_false',
+                        default=True, help='Build every new SHA, even when the merged tree '
+                                           'has already been tested')
+
+    #--------------------------------------------------------------------------
+    # stop a build after its configure or build stage fails
+    #--------------------------------------------------------------------------
+    parser.add_argument('--fail-fast', dest='fail_fast', action='store_true',
+                        default=False, help='Skip the build and tests after a configure failure, '
+                                            'and the tests after build errors')
+
+    #--------------------------------------------------------------------------
+    # cleanup of src/build trees on the build machines
+    #--------------------------------------------------------------------------
+    parser.add_argument('--disk-budget', dest='disk_budget', type=parse_size, default=None,
+                        help='Space the src/build trees may use on each machine (e.g. 500G), '
+                             'the least recently used are removed beyond it')
+
+    parser.add_argument('--max-age', dest='max_age', type=float, default=1,
+                        help='Days after which unused src/build trees are removed (default 1)')
+
+    #--------------------------------------------------------------------------
+    # also summarise the results of each commit in a github check run
+    #--------------------------------------------------------------------------
+    parser.add_argument('--checks', dest='checks', action='store_true',
+                        default=False, help='Publish a check run per commit as well as the statuses '
+                                            '(needs a token of a github app)')
+
     #--------------------------------------------------------------------------
     # CDash Server
     #--------------------------------------------------------------------------
@@ -132,8 +233,6 @@ def get_command_line_args():
     # print summary of parse args
     #----------------------------------------------
     args = parser.parse_args()
-    machine = args.machines[0]
-    build_type = args.build_type
     if args.config_path == '...':
         args.config_path = './config/'
     print('-' * 30)
@@ -148,8 +247,11 @@ def get_command_line_args():
     print('pycicle: token       :', args.user_token)
     print('pycicle: machines    :', args.machines)
     print('pycicle: PR          :', args.pull_request)
+    print('pycicle: listen      :', args.listen_port if args.listen_port else 'disabled (polling)')
     print('pycicle: build_type  :', args.build_type)
-    print('pycicle: machine     :', machine, '(only 1 supported currently)')
+    print('pycicle: local jobs  :', args.local_jobs)
+    print('pycicle: max jobs    :', args.max_jobs, 'per machine')
+    print('pycicle: metrics     :', args.metrics_port if args.metrics_port else 'not served')
     print('-' * 30)
 
     return args
@@ -163,312 +265,6 @@ def debug_print(*text):
         print(txt, end=' ')
     print()
 
-#--------------------------------------------------------------------------
-# launch a command that will start one build
-#--------------------------------------------------------------------------
-def launch_build(nickname, compiler_type, branch_id, branch_name) :
-    """ Calls the dashboard script, possibly remotely
-        pyc_p is a global PycicleParams object
-        ToDo: make pycicle runner into a class to get control of variable scope lifecycle
-    """
-    remote_ssh   = pyc_p.get_setting_for_machine(args.project, nickname, 'PYCICLE_MACHINE')
-    pycicle_path = pyc_p.get_setting_for_machine(args.project, nickname, 'PYCICLE_ROOT')
-    remote_http  = pyc_p.get_setting_for_machine(args.project, nickname, 'PYCICLE_HTTP')
-    job_type     = pyc_p.get_setting_for_machine(args.project, nickname, 'PYCICLE_JOB_LAUNCH')
-    pyc_p.debug_print('launching build', compiler_type, branch_id, branch_name, job_type)
-    # we are not yet using these as 'options'
-    boost = 'x.xx.x'
-
-    # This is a clumsy way to do this.
-    # implies local default, should be explicit somewhere
-    if job_type=='slurm':
-        pyc_p.debug_print("slurm build:", args.project)
-        script = 'dashboard_slurm.cmake'
-    elif job_type=='pbs':
-        pyc_p.debug_print("pbs build:", args.project)
-        script = 'dashboard_pbs.cmake'
-    else:
-        pyc_p.debug_print("direct build:", args.project)
-        script = 'dashboard_script.cmake'
-
-    config_path = 'unset_value_for_testing_only'
-    if 'local' not in remote_ssh:
-        # We need to setup the environment on the remote machine,
-        # often even cmake comes from a module or the like.
-        org_dir = '.'
-        cmd1 = []
-        if args.pre_ctest_commands:
-            cmd1.append(args.pre_ctest_commands)
-        cmd1.append('ctest')
-        cmd1 = ' '.join(cmd1)
-        cmd = ['ssh', remote_ssh, cmd1, '-S',
-               pycicle_path  + '/pycicle/' + script ]
-        print("HERE HERE HERE HERE HERE HERE HERE HERE HERE HERE HERE HERE HERE HERE HERE HERE ")
-        config_path = pycicle_path + pyc_p.remote_config_path
-    else:
-        # if we're local we assume the current context has the module setup
-        pyc_p.debug_print( "Local build working in:", os.getcwd())
-        cmd = ['ctest','-S', pycicle_path  + '/pycicle/' + script  ] #'./pycicle/'
-        config_path = pyc_p.config_path
-
-    build_type = pyc_p.get_setting_for_machine(args.project, nickname, 'PYCICLE_BUILD_TYPE')
-
-    if github_organisation:
-       cmd = cmd + [ '-DPYCICLE_GITHUB_ORGANISATION=' + github_organisation ]
-    if github_userlogin:
-       cmd = cmd + [ '-DPYCICLE_GITHUB_USER_LOGIN=' + github_userlogin ]
-
-    cmd = cmd + [ '-DPYCICLE_ROOT='                + pycicle_path,
-                  '-DPYCICLE_HOST='                + nickname,
-                  '-DPYCICLE_PROJECT_NAME='        + args.project,
-                  '-DPYCICLE_CONFIG_PATH='         + config_path,
-                  '-DPYCICLE_GITHUB_PROJECT_NAME=' + github_reponame,
-                  '-DPYCICLE_PR='                  + branch_id,
-                  '-DPYCICLE_BRANCH='              + branch_name,
-                  '-DPYCICLE_RANDOM='              + random_string(10),
-                  '-DPYCICLE_COMPILER_TYPE='       + compiler_type,
-                  '-DPYCICLE_BOOST='               + boost,
-                  '-DPYCICLE_BUILD_TYPE='          + build_type,
-                  '-DPYCICLE_BASE='              + github_base,
-                  # These are to quiet warnings from ctest about unset vars
-                  '-DCTEST_SOURCE_DIRECTORY=.',
-                  '-DCTEST_BINARY_DIRECTORY=.',
-                  '-DCTEST_COMMAND=":"' ]
-
-    if args.debug:
-        print('\n' + '-' * 20, 'Debug\n', subprocess.list2cmdline(cmd))
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
-        print('-' * 20 + '\n')
-        debug_out, _ = p.communicate()
-        print(debug_out)
-    else:
-        print('\n' + '-' * 20, 'Executing\n', subprocess.list2cmdline(cmd), '\n')
-        # if local then wait for the result
-        if 'local' in remote_ssh:
-            try:
-                result = subprocess.check_output(cmd).splitlines()
-                print('-' * 30)
-                print(result)
-            except Exception as ex:
-                print("Caught exception from subprocess.checkout:")
-                print(ex)
-        else:
-            p = subprocess.Popen(cmd)
-        print('-' * 20 + '\n')
-
-    # os.chdir(org_dir)
-    return None
-
-#--------------------------------------------------------------------------
-# launch one build from a list of options
-#--------------------------------------------------------------------------
-def choose_and_launch(project, machine, branch_id, branch_name, compiler_type) :
-    pyc_p.debug_print("Begin : choose_and_launch", project, machine, branch_id, branch_name)
-    if project=='hpx' and machine=='daint':
-        if bool(random.getrandbits(1)):
-            compiler_type = 'gcc'
-        else:
-            compiler_type = 'clang'
-    launch_build(machine, compiler_type, branch_id, branch_name)
-
-#--------------------------------------------------------------------------
-# Utility function to remove a file from a remote filesystem
-#--------------------------------------------------------------------------
-def erase_file(remote_ssh, file):
-    # erase the pycicle scrape file if we have set status corectly
-    try:
-        if 'local' not in remote_ssh:
-            cmd = ['ssh', remote_ssh ]
-        else:
-            cmd = []
-        cmd = cmd + [ 'rm', '-f', file]
-        result = subprocess.check_output(cmd).split()
-        print('File removed', file)
-    except Exception as ex:
-        print('File deletion failed', ex)
-
-#--------------------------------------------------------------------------
-# find all the PR build jobs submitted and from them the build dirs
-# that we can use to scrape results from
-#--------------------------------------------------------------------------
-def find_scrape_files(project, nickname) :
-    remote_ssh  = pyc_p.get_setting_for_machine(project, nickname, 'PYCICLE_MACHINE')
-    remote_path = pyc_p.get_setting_for_machine(project, nickname, 'PYCICLE_ROOT')
-
-    JobFiles   = []
-    PR_numbers = {}
-    #
-    try:
-        if 'local' not in remote_ssh:
-            cmd = ['ssh', remote_ssh ]
-        else:
-            cmd = []
-
-        search_path = remote_path + '/build/'
-        print("Scraping in {}.".format(search_path))
-        cmd = cmd + [ 'find', search_path,
-                      '-maxdepth',  '2',
-                      '-path', '\'' + search_path + project + '-*' + '\'',
-                      '-name', 'pycicle-TAG.txt']
-
-        pyc_p.debug_print('executing', cmd)
-        result = subprocess.check_output(cmd).splitlines()
-        pyc_p.debug_print('find pycicle-TAG using', cmd, 'gives :\n', result)
-        for s in result:
-            tagfile = s.decode('utf-8')
-            JobFiles.append(tagfile)
-            pyc_p.debug_print('#'*5, tagfile)
-            # for each build dir, return the PR number and results file
-            m = re.search(search_path + project + '-([0-9]+).*/pycicle-TAG.txt', tagfile)
-            if m:
-                PR_numbers[m.group(1)] = tagfile
-                pyc_p.debug_print('#'*5, 'Regex search pycicle-TAG gives PR:', m.group(1))
-
-    except Exception as e:
-        print("Exception", e, " : "
-            "find_scrape_files failed for {}".format(search_path))
-    return PR_numbers
-
-#--------------------------------------------------------------------------
-# collect test results so that we can update github PR status
-#--------------------------------------------------------------------------
-def scrape_testing_results(project, nickname, scrape_file, branch_id, branch_name, head_commit) :
-    remote_ssh  = pyc_p.get_setting_for_machine(project, nickname, 'PYCICLE_MACHINE')
-
-    if 'local' not in remote_ssh:
-        cmd = ['ssh', remote_ssh ]
-    else:
-        cmd = []
-    cmd = cmd + [ 'cat', scrape_file ]
-
-    Config_Errors = 0
-    Build_Errors  = 0
-    Test_Errors   = 0
-    Errors        = []
-
-    context = re.search(r'/build/'+project+'-.+?-(.+)/pycicle-TAG.txt', scrape_file)
-    if context:
-        origin = nickname + '-' + context.group(1)
-    else:
-        origin = 'unknown'
-
-    try:
-        result = subprocess.check_output(cmd).split()
-        for s in result: Errors.append(s.decode('utf-8'))
-        print('Config/Build/Test Errors are', Errors)
-
-        Config_Errors = int(Errors[0])
-        Build_Errors  = int(Errors[1])
-        Test_Errors   = int(Errors[2])
-        StatusValid   = True if len(Errors)>3 else False
-        if StatusValid:
-            DateStamp = Errors[3]
-            DateURL   = DateStamp[0:4]+'-'+DateStamp[4:6]+'-'+DateStamp[6:8]
-            print('Extracted date as', DateURL)
-
-            URL = ('{}://{}/{}/index.php?project='.format(cdash_drop_method, cdash_server, cdash_http_path) + cdash_project_name +
-                   '&date=' + DateURL +
-                   '&filtercount=1' +
-                   '&field1=buildname/string&compare1=63&value1=' +
-                   branch_id + '-' + branch_name)
-            print("URL:", URL)
-            if args.debug:
-                print('Debug github PR status', URL)
-            else:
-                head_commit.create_status(
-                    'success' if Config_Errors==0 else 'failure',
-                    target_url=URL,
-                    description='errors ' + Errors[0],
-                    context='pycicle ' + origin + ' Config')
-                head_commit.create_status(
-                    'success' if Build_Errors==0 else 'failure',
-                    target_url=URL,
-                    description='errors ' + Errors[1],
-                    context='pycicle ' + origin + ' Build')
-                head_commit.create_status(
-                    'success' if Test_Errors==0 else 'failure',
-                    target_url=URL,
-                    description='errors ' + Errors[2],
-                    context='pycicle ' + origin + ' Test')
-                print('Done setting github PR status for', origin)
-
-        erase_file(remote_ssh, scrape_file)
-        print('-' * 30)
-
-    except Exception as ex:
-        print('Scrape failed for PR', branch_id, ex)
-
-#--------------------------------------------------------------------------
-# random string of N chars
-#--------------------------------------------------------------------------
-def random_string(N):
-    return ''.join(random.choice(string.ascii_uppercase + string.digits)
-        for _ in range(N))
-
-#--------------------------------------------------------------------------
-# Check if a PR Needs and Update
-#--------------------------------------------------------------------------
-def needs_update(project_name, branch_id, branch_name, branch_sha, base_sha):
-    directory     = args.pycicle_dir + '/src/' + project_name + '-' + branch_id
-    status_file   = directory + '/last_pr_sha.txt'
-    update        = False
-    #
-    pyc_p.debug_print("Begin : needs_update", directory)
-    if os.path.exists(directory) == False:
-        os.makedirs(directory)
-        pyc_p.debug_print("Created ", directory)
-        update = True
-    else:
-        try:
-            f = open(status_file,'r')
-            lines = f.readlines()
-            if lines[0].strip() != branch_sha:
-                print(branch_id, branch_name, 'changed : trigger update')
-                update = True
-            elif (lines[1].strip() != base_sha):
-                print('base branch changed : trigger update')
-                update = True
-            f.close()
-        except:
-            print(branch_id, branch_name, 'status error : trigger update')
-            update = True
-    #
-    if update:
-        f = open(status_file,'w')
-        f.write(branch_sha + '\n')
-        f.write(base_sha + '\n')
-        f.close()
-    #
-    return update
-
-#--------------------------------------------------------------------------
-# Delete old build and src dirs from pycicle root
-#--------------------------------------------------------------------------
-def delete_old_files(nickname, path, days) :
-    remote_ssh  = pyc_p.get_setting_for_machine(args.project, nickname, 'PYCICLE_MACHINE')
-    remote_path = pyc_p.get_setting_for_machine(args.project, nickname, 'PYCICLE_ROOT')
-    directory   = remote_path + '/' + path
-    Dirs        = []
-
-    if 'local' not in remote_ssh:
-        cmd_transport = ['ssh', remote_ssh ]
-    else:
-        cmd_transport = []
-    cmd = cmd_transport + ['find', directory,
-        '-mindepth', '1', '-maxdepth', '1', '-type', 'd', '-mtime', '+' + str(days)]
-
-    pyc_p.debug_print('Cleanup find:', cmd)
-    try:
-        result = subprocess.check_output(cmd).split()
-        for s in result:
-            temp = s.decode('utf-8')
-            cmd = cmd_transport + [ 'rm', '-rf', temp]
-            print('Deleting old/stale directory : ', temp)
-            result = subprocess.check_output(cmd).split()
-    except Exception as ex:
-        print('Cleanup failed for ', nickname, ex)
-
-
 #--------------------------------------------------------------------------
 # main program starts here
 #--------------------------------------------------------------------------
@@ -487,8 +283,6 @@ if __name__ == "__main__":
         return unicode(s, "utf-8")
 
     args = get_command_line_args()
-    machine = args.machines[0]
-    build_type = args.build_type
 
     # Definitions:
     # args are what are passed in at the command line
@@ -504,44 +298,16 @@ if __name__ == "__main__":
     else:
         pyc_p = PycicleParams(args)
 
-    #--------------------------------------------------------------------------
-    # Create a Github instance:
-    #--------------------------------------------------------------------------
     github_reponame     = pyc_p.get_setting_for_machine(args.project, args.project, 'PYCICLE_GITHUB_PROJECT_NAME')
     github_organisation = pyc_p.get_setting_for_machine(args.project, args.project, 'PYCICLE_GITHUB_ORGANISATION')
-    github_userlogin = pyc_p.get_setting_for_machine(args.project, args.project, 'PYCICLE_GITHUB_USER_LOGIN')
-    github_base       = pyc_p.get_setting_for_machine(args.project, args.project, 'PYCICLE_GITHUB_BASE_BRANCH')
-    if args.cdash_server:
-        cdash_server = args.cdash_server
-    else:
-        cdash_server    = pyc_p.get_setting_for_machine(args.project, args.project, 'PYCICLE_CDASH_SERVER_NAME')
-    cdash_project_name  = pyc_p.get_setting_for_machine(args.project, args.project, 'PYCICLE_CDASH_PROJECT_NAME')
-    cdash_drop_method  = pyc_p.get_setting_for_machine(args.project, args.project, 'PYCICLE_CDASH_DROP_METHOD')
-    if not cdash_drop_method:
-        cdash_drop_method = "http"
-    compiler_type       = pyc_p.get_setting_for_machine(args.project, args.machines[0], 'PYCICLE_COMPILER_TYPE')
-    cdash_http_path     = pyc_p.get_setting_for_machine(args.project, args.project, 'PYCICLE_CDASH_HTTP_PATH')
-
-    print('-' * 30)
-    print('PYCICLE_GITHUB_PROJECT_NAME  =', github_reponame)
-    if github_organisation:
-        print('PYCICLE_GITHUB_ORGANISATION  =', github_organisation)
-    else:
-        print('PYCICLE_GITHUB_USER_LOGIN  =', github_userlogin)
-    print('PYCICLE_GITHUB_BASE_BRANCH   =', github_base)
-    print('PYCICLE_COMPILER_TYPE        =', compiler_type)
-    print('PYCICLE_CDASH_PROJECT_NAME   =', cdash_project_name)
-    print('PYCICLE_CDASH_SERVER_NAME    =', cdash_server)
-    print('PYCICLE_CDASH_HTTP_PATH      =', cdash_http_path)
-    print('-' * 30)
-
-    # @todo make these into options
-    # 60 seconds between polls.
-    poll_time   = 60
-    # 10 mins between checks for results and cleanups.
-    scrape_time = 10*60
+    github_userlogin    = pyc_p.get_setting_for_machine(args.project, args.project, 'PYCICLE_GITHUB_USER_LOGIN')
 
+    #--------------------------------------------------------------------------
+    # Create a Github instance:
+    #--------------------------------------------------------------------------
     org = None
+    # shared by the github client and the runner
+    metrics = Metrics()
 
     try:
         print("connecting to git hub with:")
@@ -570,145 +336,25 @@ if __name__ == "__main__":
         except Exception as ex:
             print("unexpected exception caught in github connect:",ex)
         print("Repo Fullname :", repo.full_name)
+        github_client = GithubClient(args.user_token, repo.full_name, pyc_p.debug_print,
+                                     cache_file=os.path.join(args.pycicle_dir, 'github-etags.json'),
+                                     metrics=metrics)
     except Exception as e:
         print(e, 'Failed to connect to github. Network down?')
+        raise
 
-    if github_base == '':
-        github_base = repo.default_branch
     #--------------------------------------------------------------------------
-    # Scrape-list : machine/build that we must check for status files
-    # This will need to support lots of build/machine combinations eventually
+    # everything else is done by the tasks of the runner
     #--------------------------------------------------------------------------
-    scrape_list = {"cadesCondo":"Debug"}
+    runner = PycicleRunner(args, pyc_p, github_client,
+                           org_login=org.login if org else None,
+                           default_branch=repo.default_branch,
+                           user_login=github_userlogin,
+                           metrics=metrics,
+                           debug_print=pyc_p.debug_print)
+    runner.print_settings()
+    try:
+        asyncio.run(runner.run())
+    except KeyboardInterrupt:
+        print('pycicle stopped')
 
-    pyc_p.debug_print("Before main polling routine github_base:",github_base)
-    #--------------------------------------------------------------------------
-    # main polling routine
-    #--------------------------------------------------------------------------
-    #
-    github_t1       = datetime.datetime.now()
-    scrape_t1       = github_t1 + datetime.timedelta(hours=-1)
-    scrape_tdiff    = 0
-    force           = args.force
-    #
-    random.seed(7)
-    #
-    while True:
-        #
-        try:
-            github_t2     = datetime.datetime.now()
-            github_tdiff  = github_t2 - github_t1
-            github_t1     = github_t2
-            print('-' * 30)
-            print('Checking github:', 'Time since last check:', github_tdiff.seconds, '(s)')
-            print('-' * 30)
-
-            base_branch = repo.get_branch(github_base) #should be PYCICLE_BASE
-            base_sha    = base_branch.commit.sha
-            pyc_p.debug_print(base_branch)
-            #
-            # just get a single PR if that was all that was asked for
-            if args.pull_request!=0:
-                pr = repo.get_pull(args.pull_request)
-                pyc_p.debug_print(pr)
-                pull_requests = [pr]
-                pyc_p.debug_print('Requested PR: ', pr)
-            # otherwise get all open PRs
-            else:
-                print("Getting open PR's for ",base_branch.name)
-                pull_requests = repo.get_pulls('open', base=base_branch.name)
-
-            pr_list = {}
-            #
-            for pr in pull_requests:
-                # find out if the PR is from a local branch or from a clone of the repo
-                try:
-                    pyc_p.debug_print('-' * 30)
-                    pyc_p.debug_print(pr)
-                    pyc_p.debug_print('Repo to merge from   :', pr.head.repo.owner.login)
-                    pyc_p.debug_print('Branch to merge from :', pr.head.ref)
-                    if pr.head.repo.owner.login==github_organisation:
-                        pyc_p.debug_print('Pull request is from branch local to repo')
-                    else:
-                        pyc_p.debug_print('Pull request is from branch of forked repo')
-                    pyc_p.debug_print('git pull https://github.com/' + pr.head.repo.owner.login
-                                      + '/' + github_reponame + '.git' + ' ' + pr.head.ref)
-                    pyc_p.debug_print('-' * 30)
-                except Exception as ex:
-                    pyc_p.debug_print('Could not get information about PR source repo:', ex)
-                    continue
-
-                branch_id   = str(pr.number)
-                branch_name = pr.head.label.rsplit(':',1)[1]
-                branch_sha  = pr.head.sha
-                # need details, including last commit on PR for setting status
-                last_pr_commit = pr.get_commits().reversed[0]
-                pr_list[branch_id] = [machine, branch_name, last_pr_commit]
-                #
-                if args.pull_request!=0 and pr.number!=args.pull_request:
-                    continue
-                if not pr.mergeable:
-                    continue
-                #
-                if not args.scrape_only:
-                    #minimal security, only if last commit by org members or owner is it updated or built.   
-                    commit_author = last_pr_commit.author
-                    update = force or needs_update(args.project, branch_id, branch_name, branch_sha, base_sha)
-                    if args.access_control:
-                        if org:
-                            if org.has_in_members(commit_author):
-                                if update:
-                                    choose_and_launch(args.project, machine, branch_id, branch_name, compiler_type)
-                            else:
-                                print("{} is not a member of the organisation, PR will not be built.".format(commit_author.login))
-                        else:
-                            permission = repo.get_collaborator_permission(commit_author)
-                            if 'push' in permission:
-                                if update:
-                                    choose_and_launch(args.project, machine, branch_id, branch_name, compiler_type)
-                            else:
-                                print("{} does not have push access, PR will not be built.".format(commit_author.login))
-                    else:
-                        choose_and_launch(args.project, machine, branch_id, branch_name, compiler_type)
-
-            print("The Open PRs:")
-            print(pr_list)
-            # also build the base branch if it has changed
-            if not args.scrape_only and args.pull_request==0:
-                if force or needs_update(args.project, github_base, github_base, base_sha, base_sha):
-                    choose_and_launch(args.project, machine, github_base, github_base, compiler_type)
-                    pr_list[github_base] = [machine, github_base, base_branch.commit, ""]
-
-            scrape_t2    = datetime.datetime.now()
-            scrape_tdiff = scrape_t2 - scrape_t1
-            if (scrape_tdiff.seconds > scrape_time):
-                scrape_t1 = scrape_t2
-                print('Scraping results:', 'Time since last check', scrape_tdiff.seconds, '(s)')
-                builds_done = find_scrape_files(args.project, machine)
-                print('scrape files for PRs', builds_done)
-                for branch_id in builds_done:
-                    if branch_id in pr_list:
-                        # nickname, scrape_file, branch_id, branch_name, head_commit
-                        scrape_testing_results(
-                            args.project,
-                            pr_list[branch_id][0], builds_done.get(branch_id),
-                            branch_id, pr_list[branch_id][1], pr_list[branch_id][2])
-                    else:
-                        # just delete the file, it is probably an old one
-                        erase_file(
-                            pyc_p.get_setting_for_machine(args.project, machine, 'PYCICLE_MACHINE'),
-                            builds_done.get(branch_id))
-
-                # cleanup old files that need to be purged every N days
-                delete_old_files(machine, 'src',   1)
-                delete_old_files(machine, 'build', 1)
-
-        except (github.GithubException, socket.timeout, ssl.SSLError) as ex:
-            # github might be down, or there may be a network issue,
-            # just go to the sleep statement and try again in a minute
-            print('Github/Socket exception :', ex)
-
-        # Sleep for a while before polling github again
-        time.sleep(poll_time)
-        # force option should only have effect on the first iteration
-        force = False
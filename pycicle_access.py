@@ -0,0 +1,100 @@
+#  Copyright (c) 2017-2019 John Biddiscombe
+#
+#  Distributed under the Boost Software License, Version 1.0. (See accompanying
+#  file LICENSE_1_0.txt or copy at http://www.boost.org/LICENSE_1_0.txt)
+#--------------------------------------------------------------------------
+# Access control (--access-control) : only PRs whose last commit is by a
+# member of the organisation (or, for a user repository, by a collaborator
+# with push access) are built.
+# Rather than asking github about the author of every PR on every poll,
+# the members/collaborators are fetched in bulk, kept in the store (so a
+# restart does not fetch them again) and refreshed in the background once
+# they are older than the ttl. Authors not in the list are still asked
+# about one by one, in case they joined since the last refresh.
+# The decision for an author and head SHA is stored too and never taken
+# again, a new push to the PR has a new SHA. A query github could not
+# answer is not a decision, the author is asked about again next pass.
+#--------------------------------------------------------------------------
+from __future__ import absolute_import, division, print_function, unicode_literals
+import time
+import threading
+
+from pycicle_params import PycicleParamsHelper
+from pycicle_github import GithubError
+from pycicle_metrics import Metrics
+
+class AccessResolver:
+    def __init__(self, github_client, store, org_login=None, ttl=3600, metrics=None,
+                 debug_print=PycicleParamsHelper.no_op):
+        """org_login : organisation whose members may build, None for the push collaborators
+        ttl       : seconds after which the list of logins is fetched again
+        """
+        self.github_client = github_client
+        self.store       = store
+        self.org_login   = org_login
+        self.ttl         = ttl
+        self.metrics     = metrics or Metrics()
+        self.debug_print = debug_print
+        self.lock        = threading.Lock()
+        if org_login:
+            self.list_name = 'members ' + org_login
+        else:
+            self.list_name = 'collaborators ' + github_client.full_name
+        self.logins, self.fetched = store.access_list(self.list_name) or (None, 0)
+
+    def expired(self):
+        return self.logins is None or time.time() - self.fetched >= self.ttl
+
+    def refresh(self):
+        """Fetch the list of logins (blocking), the old one is kept if that fails"""
+        try:
+            if self.org_login:
+                logins = self.github_client.org_members(self.org_login)
+            else:
+                logins = self.github_client.push_collaborators()
+        except GithubError as ex:
+            print('Refreshing the access list failed :', ex)
+            return False
+        with self.lock:
+            self.logins, self.fetched = logins, time.time()
+        self.store.set_access_list(self.list_name, logins)
+        print('Access list', self.list_name, ':', len(logins), 'logins')
+        return True
+
+    def allowed(self, author, sha):
+        """True if PRs with head sha, last committed by author, may be built"""
+        if not author:
+            return False
+        decision = self.store.access_decision(author, sha)
+        if decision is not None:
+            self.metrics.inc('pycicle_access_checks_total', source='memo')
+            return decision
+        if self.logins is None:
+            self.refresh()
+        with self.lock:
+            listed = self.logins is not None and author in self.logins
+        if listed:
+            allowed, source = True, 'list'
+        else:
+            try:
+                if self.org_login:
+                    allowed = self.github_client.is_org_member(self.org_login, author)
+                else:
+                    allowed = self.github_client.has_push_access(author)
+            except GithubError as ex:
+                print('Access query for', author, 'failed :', ex)
+                allowed = None
+            source = 'query'
+            if allowed is None:
+                print('Access of', author, 'unknown, asked again next pass')
+                self.metrics.inc('pycicle_access_checks_total', source='failed')
+                return False
+            # joined since the last refresh, no need to ask again before the next
+            if allowed:
+                with self.lock:
+                    if self.logins is not None:
+                        self.logins.add(author)
+        self.debug_print('access', author, sha, allowed, source)
+        self.metrics.inc('pycicle_access_checks_total', source=source)
+        self.store.set_access_decision(author, sha, allowed)
+        return allowed
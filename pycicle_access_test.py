@@ -0,0 +1,102 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from pycicle_access import AccessResolver
+from pycicle_github import GithubClient, GithubError
+from pycicle_store import PycicleStore
+
+class FakeGithub(GithubClient):
+    """An organisation with a list of members, the calls are counted"""
+    def __init__(self, members):
+        GithubClient.__init__(self, 'token', 'org/repo')
+        self.members = set(members)
+        self.calls   = []
+
+    def org_members(self, org):
+        self.calls.append(('list', org))
+        if self.members is None:
+            raise GithubError('GET /orgs/org/members failed (502)')
+        return set(self.members)
+
+    def is_org_member(self, org, login):
+        self.calls.append(('query', login))
+        return login in (self.members or ())
+
+class StatusGithub(GithubClient):
+    """Answers the single membership queries with the given statuses"""
+    def __init__(self, statuses):
+        GithubClient.__init__(self, 'token', 'org/repo')
+        self.statuses = list(statuses)
+
+    def org_members(self, org):
+        return set()
+
+    def request(self, method, path, data=None, headers=None):
+        status = self.statuses.pop(0)
+        if status is None:
+            raise GithubError('GET {} failed : timed out'.format(path))
+        return status, {}, None
+
+class AccessResolverTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.db  = os.path.join(self.tmp, 'pycicle.db')
+
+    def test_bulk_list_and_memo(self):
+        github = FakeGithub(['alice'])
+        access = AccessResolver(github, PycicleStore(self.db), 'org')
+        self.assertTrue(access.allowed('alice', 'sha1'))
+        self.assertFalse(access.allowed('mallory', 'sha2'))
+        self.assertFalse(access.allowed(None, 'sha3'))
+        self.assertEqual(github.calls, [('list', 'org'), ('query', 'mallory')])
+        # decided once per author and SHA
+        github.calls = []
+        self.assertTrue(access.allowed('alice', 'sha1'))
+        self.assertFalse(access.allowed('mallory', 'sha2'))
+        self.assertEqual(github.calls, [])
+        self.assertEqual(access.metrics.get('pycicle_access_checks_total', source='memo'), 2)
+        # joined since the list was fetched, asked about only once
+        github.members.add('bob')
+        self.assertTrue(access.allowed('bob', 'sha4'))
+        self.assertTrue(access.allowed('bob', 'sha5'))
+        self.assertEqual(github.calls, [('query', 'bob')])
+
+    def test_persistent_and_ttl(self):
+        AccessResolver(FakeGithub(['alice']), PycicleStore(self.db), 'org').allowed('alice', 'sha1')
+        # a restart uses the stored list
+        github = FakeGithub([])
+        access = AccessResolver(github, PycicleStore(self.db), 'org', ttl=3600)
+        self.assertFalse(access.expired())
+        self.assertTrue(access.allowed('alice', 'sha2'))
+        self.assertEqual(github.calls, [])
+        # too old, a failed refresh keeps the list
+        access.fetched = time.time() - 3600
+        self.assertTrue(access.expired())
+        github.members = None
+        self.assertFalse(access.refresh())
+        self.assertTrue(access.allowed('alice', 'sha3'))
+        github.members = {'carol'}
+        self.assertTrue(access.refresh())
+        self.assertFalse(access.expired())
+        self.assertFalse(access.allowed('alice', 'sha4'))
+
+    def test_failed_query(self):
+        github = StatusGithub([502, None, 204, 404])
+        access = AccessResolver(github, PycicleStore(self.db), 'org')
+        # no answer from github is not a decision, asked again
+        self.assertFalse(access.allowed('alice', 'sha1'))
+        self.assertFalse(access.allowed('alice', 'sha1'))
+        self.assertIsNone(access.store.access_decision('alice', 'sha1'))
+        self.assertTrue(access.allowed('alice', 'sha1'))
+        self.assertTrue(access.allowed('alice', 'sha1'))
+        self.assertEqual(access.metrics.get('pycicle_access_checks_total', source='failed'), 2)
+        # a 404 is a definite no
+        self.assertFalse(access.allowed('mallory', 'sha2'))
+        self.assertIs(access.store.access_decision('mallory', 'sha2'), False)
+
+if __name__ == "__main__":
+    unittest.main()
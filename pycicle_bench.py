@@ -0,0 +1,305 @@
+#  Copyright (c) 2017-2019 John Biddiscombe
+#
+#  Distributed under the Boost Software License, Version 1.0. (See accompanying
+#  file LICENSE_1_0.txt or copy at http://www.boost.org/LICENSE_1_0.txt)
+#--------------------------------------------------------------------------
+# Benchmark of pycicle's own overhead.
+#   python pycicle_bench.py --prs 500 --cycles 10 --churn 0.05 --machines 2
+# runs the real runner (github poll -> needs_update -> launch -> scrape ->
+# status) against a fake github with N open PRs, of which a fraction get
+# a new commit every cycle, and fake build machines that answer commands
+# in process after a simulated ssh latency. Builds end straight away, so
+# their results are scraped in the same cycle.
+# Per cycle it reports the time taken, the github requests and machine
+# commands made, statuses published, builds queued/running and the memory
+# used by python (tracemalloc).
+#--------------------------------------------------------------------------
+from __future__ import absolute_import, division, print_function, unicode_literals
+import os
+import re
+import sys
+import json
+import time
+import shlex
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+import threading
+import contextlib
+import collections
+import tracemalloc
+
+from pycicle_github import GithubClient, PullRequestInfo
+from pycicle_params import PycicleParams
+from pycicle_runner import PycicleRunner
+from pycicle_transport import Transport
+from pycicle_metrics import Metrics
+
+#--------------------------------------------------------------------------
+# github with N open PRs, some of which are pushed to before each cycle
+#--------------------------------------------------------------------------
+class FakeGithub(GithubClient):
+    def __init__(self, prs, seed=7):
+        GithubClient.__init__(self, 'token', 'bench/proj')
+        self.random   = random.Random(seed)
+        self.base_sha = self.sha()
+        self.pulls    = dict((n, PullRequestInfo(n, 'branch-{}'.format(n), self.sha(), True,
+                                                 'dev', 'bench', None))
+                             for n in range(1, prs + 1))
+        self.changed  = True
+        self.lock     = threading.Lock()
+        self.calls    = collections.Counter()
+
+    def sha(self):
+        return '{:040x}'.format(self.random.getrandbits(160))
+
+    def push(self, churn, base=False):
+        """New head commits on a fraction of the PRs (and the base branch)"""
+        count = int(round(churn * len(self.pulls)))
+        for number in self.random.sample(sorted(self.pulls), count):
+            self.pulls[number] = self.pulls[number]._replace(head_sha=self.sha())
+        if base:
+            self.base_sha = self.sha()
+        self.changed = self.changed or count > 0 or base
+
+    def count(self, kind, n=1):
+        with self.lock:
+            self.calls[kind] += n
+
+    def base_or_pulls_changed(self, base):
+        # the two conditional requests
+        self.count('conditional', 2)
+        changed, self.changed = self.changed, False
+        return changed
+
+    def get_pull_requests(self, base, number=0):
+        pulls = [p for n, p in sorted(self.pulls.items()) if number in (0, n)]
+        # one graphql query per 100 PRs
+        self.count('graphql', max(1, (len(pulls) + 99) // 100))
+        return self.base_sha, pulls
+
+    def request(self, method, path, data=None, headers=None):
+        self.count(self.endpoint(self.api_url + path))
+        return 201, {}, {}
+
+#--------------------------------------------------------------------------
+# a build machine that answers pycicle's commands in process
+#--------------------------------------------------------------------------
+class FakeProcess:
+    returncode = 0
+
+    async def wait(self):
+        return 0
+
+class FakeMachine(Transport):
+    is_local = False
+
+    def __init__(self, nickname, root, latency=0.0, failure_rate=0.0, seed=7, metrics=None):
+        Transport.__init__(self, nickname, metrics=metrics)
+        self.root     = root
+        self.latency  = latency
+        self.failure_rate = failure_rate
+        self.random   = random.Random(seed)
+        self.results  = {}
+        self.calls    = collections.Counter()
+
+    def command(self, script):
+        return ['fake', self.nickname, script]
+
+    def execute(self, script):
+        if 'ctest -S' in script:
+            self.calls['launch'] += 1
+            self.build(shlex.split(script))
+            return b''
+        if 'pycicle-*.txt' in script:
+            self.calls['scrape'] += 1
+            return ''.join(json.dumps({'path': path, 'content': content}) + '\n'
+                           for path, content in sorted(self.results.items())).encode('utf-8')
+        if script.startswith('rm -f '):
+            self.calls['erase'] += 1
+            for path in shlex.split(script)[2:]:
+                self.results.pop(path, None)
+            return b''
+        if 'du -sk' in script:
+            self.calls['usage'] += 1
+            return b''
+        if 'merge-tree' in script:
+            # no merged trees, every SHA is built
+            self.calls['trees'] += 1
+            return b''
+        if 'git' in script:
+            self.calls['mirror'] += 1
+            return b''
+        self.calls['other'] += 1
+        return b''
+
+    def build(self, argv):
+        """A build that ends at once, leaving its result file"""
+        defines = dict(a[2:].split('=', 1) for a in argv if a.startswith('-D') and '=' in a)
+        build_dir = '{}/build/{}-{}-{}-{}'.format(self.root, defines['PYCICLE_PROJECT_NAME'],
+                                                  defines['PYCICLE_PR'], defines['PYCICLE_COMPILER_TYPE'],
+                                                  defines['PYCICLE_BUILD_TYPE'])
+        failed = 1 if self.random.random() < self.failure_rate else 0
+        summary = {'version': 1, 'tag': '20190311-0100', 'build_id': self.random.randint(1, 10**6),
+                   'configure': {'errors': 0, 'warnings': 0, 'minutes': 1.0},
+                   'build': {'errors': 0, 'warnings': 3, 'minutes': 20.0},
+                   'test': {'passed': 100 - failed, 'failed': failed, 'not_run': 0, 'minutes': 5.0,
+                            'failed_tests': ['tests.unit.flaky'] if failed else []}}
+        self.results[build_dir + '/pycicle-TAG.txt'] = json.dumps(summary)
+
+    def run(self, script):
+        with self.timed():
+            time.sleep(self.latency)
+            return self.execute(script)
+
+    async def run_async(self, script, timeout=None, merge_stderr=False):
+        with self.timed():
+            await asyncio.sleep(self.latency)
+            return self.execute(script)
+
+    async def start_async(self, script):
+        await asyncio.sleep(self.latency)
+        self.execute(script)
+        return FakeProcess()
+
+class FakeMachines:
+    """Stands in for the TransportPool"""
+    def __init__(self, machines):
+        self.machines = machines
+
+    def get(self, nickname, remote_ssh):
+        return self.machines[nickname]
+
+#--------------------------------------------------------------------------
+# the options pycicle would be started with
+#--------------------------------------------------------------------------
+def bench_args(config_path, pycicle_dir, machines, max_jobs):
+    return argparse.Namespace(
+        project='bench', config_path=config_path, pycicle_dir=pycicle_dir, machines=machines,
+        debug=False, force=False, access_control=False, pull_request=0, scrape_only=False,
+        pre_ctest_commands=None, local_jobs=1, max_jobs=max_jobs, cdash_server=None, checks=False,
+        incremental=False, ccache_size='20G', disk_budget=None, max_age=1,
+        fail_fast=False, result_cache=True,
+        job_arrays=False, cycle_budget=0, listen_port=0, reconcile_time=900, webhook_secret=None,
+        poll_time=60, scrape_time=600,
+        metrics_port=0, metrics_interval=0, access_ttl=3600)
+
+def write_config(config_path, machines):
+    with open(os.path.join(config_path, 'bench.cmake'), 'w') as f:
+        f.write('set(PYCICLE_GITHUB_PROJECT_NAME "proj")\n'
+                'set(PYCICLE_GITHUB_ORGANISATION "bench")\n'
+                'set(PYCICLE_GITHUB_BASE_BRANCH "master")\n'
+                'set(PYCICLE_CDASH_SERVER_NAME "cdash.example.org")\n'
+                'set(PYCICLE_CDASH_PROJECT_NAME "bench")\n'
+                'set(PYCICLE_CDASH_HTTP_PATH "cdash")\n')
+    for nickname in machines:
+        with open(os.path.join(config_path, nickname + '.cmake'), 'w') as f:
+            f.write('set(PYCICLE_MACHINE "{}.example.org")\n'
+                    'set(PYCICLE_ROOT "/scratch/pycicle")\n'
+                    'set(PYCICLE_JOB_LAUNCH "direct")\n'
+                    'set(PYCICLE_COMPILER_TYPE "gcc")\n'
+                    'set(PYCICLE_BUILD_TYPE "Release")\n'.format(nickname))
+
+def _delta(after, before):
+    return dict((k, v - before.get(k, 0)) for k, v in after.items() if v - before.get(k, 0))
+
+def run_benchmark(prs=100, cycles=5, churn=0.05, base_every=0, machines=2, latency=0.0,
+                  max_jobs=10, failure_rate=0.1, seed=7, verbose=False):
+    """Returns {'cycles': [per cycle results], 'summary': {...}}"""
+    tmp = tempfile.mkdtemp(prefix='pycicle-bench-')
+    try:
+        config_path = os.path.join(tmp, 'config')
+        os.makedirs(config_path)
+        names = ['machine{}'.format(i) for i in range(machines)]
+        write_config(config_path, names)
+        args    = bench_args(config_path, tmp, names, max_jobs)
+        metrics = Metrics()
+        github  = FakeGithub(prs, seed)
+        fakes   = dict((n, FakeMachine(n, '/scratch/pycicle', latency, failure_rate, seed + i, metrics))
+                       for i, n in enumerate(names))
+        output  = sys.stdout if verbose else open(os.devnull, 'w')
+        tracemalloc.start()
+        results = []
+        try:
+            with contextlib.redirect_stdout(output):
+                runner = PycicleRunner(args, PycicleParams(args), github,
+                                       transports=FakeMachines(fakes), metrics=metrics)
+            for cycle in range(cycles):
+                if cycle:
+                    github.push(churn, base=bool(base_every) and cycle % base_every == 0)
+                github_before  = dict(github.calls)
+                command_before = dict(sum((m.calls for m in fakes.values()), collections.Counter()))
+                start = time.time()
+                with contextlib.redirect_stdout(output):
+                    asyncio.run(runner.run_once())
+                seconds = time.time() - start
+                current, peak = tracemalloc.get_traced_memory()
+                if hasattr(tracemalloc, 'reset_peak'):
+                    tracemalloc.reset_peak()
+                commands = dict(sum((m.calls for m in fakes.values()), collections.Counter()))
+                results.append({
+                    'cycle'    : cycle,
+                    'seconds'  : round(seconds, 4),
+                    'github'   : _delta(dict(github.calls), github_before),
+                    'commands' : _delta(commands, command_before),
+                    'pending'  : runner.build_queue.depth(),
+                    'running'  : runner.build_queue.depth(state='running'),
+                    'memory_kb': current // 1024,
+                    'peak_kb'  : peak // 1024})
+        finally:
+            tracemalloc.stop()
+            if output is not sys.stdout:
+                output.close()
+        times = sorted(r['seconds'] for r in results)
+        summary = {
+            'prs': prs, 'cycles': cycles, 'churn': churn, 'machines': machines, 'latency': latency,
+            'mean_seconds': round(sum(times) / len(times), 4) if times else None,
+            'max_seconds' : times[-1] if times else None,
+            'github'      : dict(github.calls),
+            'commands'    : dict(sum((m.calls for m in fakes.values()), collections.Counter())),
+            'statuses'    : metrics.get('pycicle_statuses_published_total') or 0,
+            'peak_kb'     : max(r['peak_kb'] for r in results) if results else None}
+        return {'cycles': results, 'summary': summary}
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def print_report(report):
+    print('{:>5} {:>9} {:>8} {:>8} {:>8} {:>8} {:>10} {:>10}'.format(
+        'cycle', 'seconds', 'github', 'commands', 'pending', 'running', 'memory_kb', 'peak_kb'))
+    for r in report['cycles']:
+        print('{:>5} {:>9.4f} {:>8} {:>8} {:>8} {:>8} {:>10} {:>10}'.format(
+            r['cycle'], r['seconds'], sum(r['github'].values()), sum(r['commands'].values()),
+            r['pending'], r['running'], r['memory_kb'], r['peak_kb']))
+    print(json.dumps(report['summary'], sort_keys=True, indent=2))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark pycicle against a fake github and machines')
+    parser.add_argument('--prs', type=int, default=100, help='open PRs (default 100)')
+    parser.add_argument('--cycles', type=int, default=5, help='poll cycles to run (default 5)')
+    parser.add_argument('--churn', type=float, default=0.05,
+                        help='fraction of PRs pushed to before each cycle (default 0.05)')
+    parser.add_argument('--base-every', dest='base_every', type=int, default=0,
+                        help='push to the base branch every N cycles (default never)')
+    parser.add_argument('--machines', type=int, default=2, help='build machines (default 2)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds each machine command takes, to model ssh (default 0)')
+    parser.add_argument('--max-jobs', dest='max_jobs', type=int, default=10,
+                        help='builds in flight per machine (default 10)')
+    parser.add_argument('--failure-rate', dest='failure_rate', type=float, default=0.1,
+                        help='fraction of builds with a failing test (default 0.1)')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--json', action='store_true', help='print the full report as json')
+    parser.add_argument('-v', '--verbose', action='store_true', help='show the output of pycicle')
+    args = parser.parse_args(argv)
+    report = run_benchmark(args.prs, args.cycles, args.churn, args.base_every, args.machines,
+                           args.latency, args.max_jobs, args.failure_rate, args.seed, args.verbose)
+    if args.json:
+        print(json.dumps(report, sort_keys=True, indent=2))
+    else:
+        print_report(report)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+import io
+import json
+import unittest
+import contextlib
+
+from pycicle_bench import run_benchmark, main
+
+class BenchTestCase(unittest.TestCase):
+    def test_cycles(self):
+        report = run_benchmark(prs=20, cycles=3, churn=0.1, machines=2, max_jobs=50)
+        cycles, summary = report['cycles'], report['summary']
+        self.assertEqual([c['cycle'] for c in cycles], [0, 1, 2])
+        # the base branch and every PR are built on both machines at once
+        self.assertEqual(cycles[0]['commands']['launch'], 42)
+        self.assertEqual((cycles[0]['pending'], cycles[0]['running']), (0, 0))
+        # the two PRs pushed to are rebuilt
+        self.assertEqual(cycles[1]['commands']['launch'], 4)
+        self.assertEqual(summary['github']['graphql'], 3)
+        self.assertEqual(summary['github']['statuses'], summary['statuses'])
+        self.assertGreater(summary['statuses'], 42 * 2)
+        self.assertGreater(summary['peak_kb'], 0)
+
+    def test_no_churn(self):
+        report = run_benchmark(prs=5, cycles=2, churn=0, machines=1)
+        # nothing changed on github, nothing is fetched, built or published
+        second = report['cycles'][1]
+        self.assertEqual(second['github'], {'conditional': 2})
+        self.assertNotIn('launch', second['commands'])
+
+    def test_main_json(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            main(['--prs', '3', '--cycles', '1', '--json'])
+        self.assertEqual(json.loads(output.getvalue())['summary']['prs'], 3)
+
+if __name__ == "__main__":
+    unittest.main()
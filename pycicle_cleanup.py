@@ -0,0 +1,103 @@
+#  Copyright (c) 2017-2019 John Biddiscombe
+#
+#  Distributed under the Boost Software License, Version 1.0. (See accompanying
+#  file LICENSE_1_0.txt or copy at http://www.boost.org/LICENSE_1_0.txt)
+#--------------------------------------------------------------------------
+# Cleanup of the src/ and build/ trees on a build machine.
+# The size and last modification of every tree is measured by a single
+# remote `du` command. Trees of PRs that are queued or building are never
+# touched, trees of other open PRs are kept in incremental mode.
+# Everything else is removed once it is older than the age limit, and
+# when the trees use more than the disk budget the least recently used
+# ones go first (those of closed PRs before those of open PRs).
+# Removed trees are moved to trash/ and deleted there in the background
+# so that the command returns immediately.
+#--------------------------------------------------------------------------
+from __future__ import absolute_import, division, print_function, unicode_literals
+import re
+import time
+import collections
+
+from pycicle_transport import shell_command
+
+TreeUsage = collections.namedtuple('TreeUsage', ['path', 'branch_id', 'mtime', 'size'])
+
+_units = {'': 1, 'K': 2**10, 'M': 2**20, 'G': 2**30, 'T': 2**40}
+
+def parse_size(text):
+    """Bytes of a size like 500G, 2T or 1000000"""
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)B?\s*$', text.upper())
+    if not match:
+        raise ValueError('invalid size {}'.format(text))
+    return int(float(match.group(1)) * _units[match.group(2)])
+
+def usage_command(root, project):
+    """size (KB), latest mtime and path of every src/build tree, one per line"""
+    return ('find {} {} -mindepth 1 -maxdepth 1 -type d -name {} -print0 2>/dev/null | '
+            'xargs -0 -r du -sk --time --time-style=+%s; true'
+            .format(shell_command([root + '/src']), shell_command([root + '/build']),
+                    shell_command([project + '-*'])))
+
+#--------------------------------------------------------------------------
+# src/<project>-<PR> and build/<project>-<PR>-<stamp> belong to PR
+#--------------------------------------------------------------------------
+def branch_of_tree(path, project, base=None):
+    name = path.rstrip('/').rsplit('/', 1)[-1]
+    if not name.startswith(project + '-'):
+        return None
+    name = name[len(project) + 1:]
+    if base and (name == base or name.startswith(base + '-')):
+        return base
+    return name.split('-', 1)[0]
+
+def parse_usage_output(output, project, base=None):
+    if isinstance(output, bytes):
+        output = output.decode('utf-8', 'replace')
+    trees = []
+    for line in output.splitlines():
+        fields = line.split('\t', 2)
+        if len(fields) != 3 or not fields[0].isdigit() or not fields[1].isdigit():
+            continue
+        trees.append(TreeUsage(fields[2], branch_of_tree(fields[2], project, base),
+                               int(fields[1]), int(fields[0]) * 1024))
+    return trees
+
+#--------------------------------------------------------------------------
+# The trees to remove, oldest first
+#--------------------------------------------------------------------------
+def plan_cleanup(trees, in_flight, open_prs=(), budget=None, max_age=24*3600, now=None,
+                 keep_open=True):
+    """in_flight : PRs with builds queued or running, their trees are kept
+    open_prs  : open PRs, over the budget their trees are removed after the closed ones
+    budget    : bytes all trees may use, None for no limit
+    max_age   : seconds after which other trees are removed
+    keep_open : the trees of open PRs are kept however old (unless over the budget)
+    """
+    now     = time.time() if now is None else now
+    evict   = []
+    kept    = []
+    for tree in sorted(trees, key=lambda t: t.mtime):
+        if tree.branch_id in in_flight or (keep_open and tree.branch_id in open_prs):
+            kept.append(tree)
+        elif now - tree.mtime > max_age:
+            evict.append(tree)
+        else:
+            kept.append(tree)
+    if budget is not None:
+        used = sum(t.size for t in kept)
+        # closed PRs first, then open ones, least recently used first
+        candidates = ([t for t in kept if t.branch_id not in open_prs and t.branch_id not in in_flight] +
+                      [t for t in kept if t.branch_id in open_prs and t.branch_id not in in_flight])
+        for tree in candidates:
+            if used <= budget:
+                break
+            evict.append(tree)
+            used -= tree.size
+    return evict
+
+def remove_command(root, paths):
+    """Move the trees to trash/ and delete them (and any leftovers) in the background"""
+    trash = shell_command([root + '/trash'])
+    batch = shell_command([root + '/trash/' + str(int(time.time()))])
+    return ('mkdir -p {b} && mv {paths} {b}/ && (rm -rf {t}/* < /dev/null > /dev/null 2>&1 &)'
+            .format(t=trash, b=batch, paths=shell_command(paths)))
@@ -0,0 +1,64 @@
+import os
+import time
+import shutil
+import tempfile
+import unittest
+
+from pycicle_cleanup import (usage_command, parse_usage_output, plan_cleanup,
+                             remove_command, parse_size, TreeUsage)
+from pycicle_transport import LocalTransport
+
+day = 24 * 3600
+
+class CleanupTestCase(unittest.TestCase):
+    def test_parse_size(self):
+        self.assertEqual(parse_size('500G'), 500 * 2**30)
+        self.assertEqual(parse_size('1.5t'), int(1.5 * 2**40))
+        self.assertEqual(parse_size('1024'), 1024)
+        self.assertRaises(ValueError, parse_size, 'lots')
+
+    def test_usage_and_remove(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        for tree in ['src/hpx-12', 'build/hpx-12-gcc-Release', 'build/hpx-master-gcc-Release',
+                     'build/dca-13-gcc']:
+            os.makedirs(os.path.join(root, tree))
+            with open(os.path.join(root, tree, 'data'), 'wb') as f:
+                f.write(b'x' * 10000)
+        old = time.time() - 3 * day
+        for path in ['src/hpx-12/data', 'src/hpx-12']:
+            os.utime(os.path.join(root, path), (old, old))
+        transport = LocalTransport('local')
+        trees = parse_usage_output(transport.run(usage_command(root, 'hpx')), 'hpx', 'master')
+        self.assertEqual(sorted((t.path[len(root):], t.branch_id) for t in trees),
+                         [('/build/hpx-12-gcc-Release', '12'), ('/build/hpx-master-gcc-Release', 'master'),
+                          ('/src/hpx-12', '12')])
+        src = [t for t in trees if t.path.endswith('src/hpx-12')][0]
+        self.assertGreaterEqual(src.size, 10000)
+        self.assertAlmostEqual(src.mtime, old, delta=2)
+        transport.run(remove_command(root, [src.path]))
+        self.assertFalse(os.path.exists(src.path))
+
+    def test_plan(self):
+        now   = 100 * day
+        trees = [TreeUsage('build/hpx-1-gcc', '1', now - 3 * day, 40),
+                 TreeUsage('build/hpx-2-gcc', '2', now - 2 * day, 40),
+                 TreeUsage('build/hpx-3-gcc', '3', now - 3 * day, 40),
+                 TreeUsage('build/hpx-4-gcc', '4', now - 5 * 3600, 40),
+                 TreeUsage('build/hpx-5-gcc', '5', now - 1 * 3600, 40)]
+        # age only : running (1) and open (2) trees are kept
+        evict = plan_cleanup(trees, in_flight={'1'}, open_prs={'2'}, now=now)
+        self.assertEqual([t.branch_id for t in evict], ['3'])
+        # over budget : the oldest closed trees go next, then open ones
+        evict = plan_cleanup(trees, in_flight={'1'}, open_prs={'2', '5'}, budget=90, now=now)
+        self.assertEqual([t.branch_id for t in evict], ['3', '4', '2'])
+        # not incremental : old open trees go too, but over the budget still after closed ones
+        evict = plan_cleanup(trees, in_flight={'1'}, open_prs={'2', '4'}, budget=40, now=now,
+                             keep_open=False)
+        self.assertEqual([t.branch_id for t in evict], ['3', '2', '5', '4'])
+        # trees in use are never removed
+        evict = plan_cleanup(trees, in_flight={'1', '2', '3', '4', '5'}, budget=0, now=now)
+        self.assertEqual(evict, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,296 @@
+#  Copyright (c) 2017-2019 John Biddiscombe
+#
+#  Distributed under the Boost Software License, Version 1.0. (See accompanying
+#  file LICENSE_1_0.txt or copy at http://www.boost.org/LICENSE_1_0.txt)
+#--------------------------------------------------------------------------
+# Lightweight github access used on the polling path.
+# pygithub fetches attributes lazily, one http request at a time, which
+# makes a poll of N pull requests cost several round-trips per PR.
+# Here the information pycicle needs for every open PR is fetched with a
+# single graphql query (one request per 100 PRs).
+# Before that, conditional requests (ETag / If-None-Match) tell us if
+# anything changed at all since the last poll, a 304 costs no rate limit.
+#--------------------------------------------------------------------------
+from __future__ import absolute_import, division, print_function, unicode_literals
+import os
+import json
+import time
+import collections
+
+try:
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError, URLError
+except ImportError:
+    from urllib2 import Request, urlopen, HTTPError, URLError
+
+from pycicle_params import PycicleParamsHelper
+from pycicle_metrics import Metrics
+
+class GithubError(Exception):
+    pass
+
+#--------------------------------------------------------------------------
+# The state of one open PR as needed by the polling loop
+#--------------------------------------------------------------------------
+PullRequestInfo = collections.namedtuple('PullRequestInfo',
+    ['number', 'branch_name', 'head_sha', 'mergeable', 'author', 'owner', 'files'])
+
+_pr_fields = '''
+    number
+    headRefName
+    headRefOid
+    mergeable
+    headRepositoryOwner { login }
+    commits(last: 1) { nodes { commit { author { user { login } } } } }
+    files(first: 100) { totalCount nodes { path } }
+'''
+
+_open_prs_query = '''
+query($owner: String!, $name: String!, $base: String!, $after: String) {
+  repository(owner: $owner, name: $name) {
+    ref(qualifiedName: $base) { target { oid } }
+    pullRequests(states: OPEN, baseRefName: $base, first: 100, after: $after) {
+      pageInfo { hasNextPage endCursor }
+      nodes { %s }
+    }
+  }
+}''' % _pr_fields
+
+_single_pr_query = '''
+query($owner: String!, $name: String!, $base: String!, $number: Int!) {
+  repository(owner: $owner, name: $name) {
+    ref(qualifiedName: $base) { target { oid } }
+    pullRequest(number: $number) { %s }
+  }
+}''' % _pr_fields
+
+def _pr_info(node):
+    commits = node['commits']['nodes']
+    author  = None
+    if commits and commits[0]['commit']['author'] and commits[0]['commit']['author']['user']:
+        author = commits[0]['commit']['author']['user']['login']
+    owner = node['headRepositoryOwner']['login'] if node['headRepositoryOwner'] else None
+    # github reports UNKNOWN while it is still computing the merge state,
+    # treat that like pygithub's None so the PR is looked at next time
+    mergeable = {'MERGEABLE': True, 'CONFLICTING': False}.get(node['mergeable'])
+    # the changed paths, None when there are more than one page of them
+    files = None
+    if node.get('files') and node['files']['totalCount'] == len(node['files']['nodes']):
+        files = [f['path'] for f in node['files']['nodes']]
+    return PullRequestInfo(node['number'], node['headRefName'], node['headRefOid'],
+                           mergeable, author, owner, files)
+
+class GithubClient:
+    api_url = 'https://api.github.com'
+
+    def __init__(self, token, full_name, debug_print=PycicleParamsHelper.no_op, timeout=30,
+                 cache_file=None, metrics=None):
+        """full_name  : owner/repo of the repository being tested
+        cache_file : json file where ETags are kept between runs
+        metrics    : Metrics the requests are counted and timed in
+        """
+        self.token       = token
+        self.full_name   = full_name
+        self.owner, self.name = full_name.split('/', 1)
+        self.debug_print = debug_print
+        self.timeout     = timeout
+        self.cache_file  = cache_file
+        self.etags       = {}
+        self.new_etags   = {}
+        self.cache_hits   = 0
+        self.cache_misses = 0
+        self.rate_limit_remaining = None
+        self.metrics     = metrics or Metrics()
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'r') as f:
+                    self.etags = json.load(f)
+            except ValueError as ex:
+                print('Ignoring unreadable github cache', cache_file, ex)
+
+    #--------------------------------------------------------------------------
+    # a single authenticated request, returns (status, headers, decoded json)
+    #--------------------------------------------------------------------------
+    def request(self, method, path, data=None, headers=None):
+        url = path if path.startswith('http') else self.api_url + path
+        all_headers = {'Authorization': 'token ' + self.token,
+                       'Accept': 'application/vnd.github.v3+json',
+                       'User-Agent': 'pycicle'}
+        all_headers.update(headers or {})
+        body = None
+        if data is not None:
+            body = json.dumps(data).encode('utf-8')
+            all_headers['Content-Type'] = 'application/json'
+        self.debug_print('github', method, url)
+        req = Request(url, data=body, headers=all_headers)
+        req.get_method = lambda: method
+        endpoint = self.endpoint(url)
+        start    = time.time()
+        try:
+            response = urlopen(req, timeout=self.timeout)
+            status, response_headers, content = response.getcode(), response.info(), response.read()
+        except HTTPError as ex:
+            status, response_headers, content = ex.code, ex.info(), ex.read()
+        except URLError as ex:
+            self.metrics.inc('pycicle_github_requests_total', method=method, endpoint=endpoint,
+                             status='error')
+            raise GithubError('{} {} failed : {}'.format(method, url, ex.reason))
+        finally:
+            self.metrics.observe('pycicle_github_request_seconds', time.time() - start,
+                                 endpoint=endpoint)
+        self.metrics.inc('pycicle_github_requests_total', method=method, endpoint=endpoint,
+                         status=status)
+        remaining = response_headers.get('X-RateLimit-Remaining')
+        if remaining is not None:
+            self.rate_limit_remaining = int(remaining)
+            self.metrics.set('pycicle_github_rate_limit_remaining', self.rate_limit_remaining)
+        result = json.loads(content.decode('utf-8')) if content else None
+        return status, response_headers, result
+
+    def endpoint(self, url):
+        """The kind of request (graphql, statuses, pulls, ...) used as metric label"""
+        path = url[len(self.api_url):] if url.startswith(self.api_url) else url
+        parts = path.split('?')[0].strip('/').split('/')
+        if parts[0] == 'repos' and len(parts) > 3:
+            return parts[3]
+        return parts[0]
+
+    #--------------------------------------------------------------------------
+    # GET that only transfers the resource if it changed since the last call,
+    # returns True when it has changed (or was never seen before).
+    # The new validators are only kept by commit_etags, once the change has
+    # been handled, until then the resource keeps reporting the change.
+    #--------------------------------------------------------------------------
+    def conditional_get(self, path):
+        entry   = self.etags.get(path, {})
+        headers = {}
+        if 'etag' in entry:
+            headers['If-None-Match'] = entry['etag']
+        if 'last_modified' in entry:
+            headers['If-Modified-Since'] = entry['last_modified']
+        status, response_headers, _ = self.request('GET', path, headers=headers)
+        if status == 304:
+            self.cache_hits += 1
+            return False
+        if status != 200:
+            raise GithubError('GET {} failed ({})'.format(path, status))
+        self.cache_misses += 1
+        entry = {}
+        if response_headers.get('ETag'):
+            entry['etag'] = response_headers.get('ETag')
+        if response_headers.get('Last-Modified'):
+            entry['last_modified'] = response_headers.get('Last-Modified')
+        self.new_etags[path] = entry
+        return True
+
+    def commit_etags(self):
+        """Keep the validators of the changes seen, once they have been handled"""
+        if not self.new_etags:
+            return
+        self.etags.update(self.new_etags)
+        self.new_etags = {}
+        self.save_cache()
+
+    def save_cache(self):
+        if not self.cache_file:
+            return
+        temp_file = self.cache_file + '.tmp'
+        with open(temp_file, 'w') as f:
+            json.dump(self.etags, f)
+        os.rename(temp_file, self.cache_file)
+
+    #--------------------------------------------------------------------------
+    # True if the base branch or any open PR on it changed since last call.
+    # The PR list is sorted by update time so a push to any PR alters the
+    # first page, which is the only one we need to watch.
+    #--------------------------------------------------------------------------
+    def base_or_pulls_changed(self, base):
+        # both requests must be made, so that both ETags are kept current
+        branch_changed = self.conditional_get(
+            '/repos/{}/branches/{}'.format(self.full_name, base))
+        pulls_changed  = self.conditional_get(
+            '/repos/{}/pulls?state=open&base={}&sort=updated&direction=desc&per_page=100'.format(
+                self.full_name, base))
+        return branch_changed or pulls_changed
+
+    def stats(self):
+        return {'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses,
+                'rate_limit_remaining': self.rate_limit_remaining}
+
+    def graphql(self, query, variables):
+        status, _, result = self.request('POST', '/graphql',
+                                         {'query': query, 'variables': variables})
+        if status != 200 or not result or result.get('errors'):
+            raise GithubError('graphql query failed ({}) : {}'.format(
+                status, result.get('errors') if result else None))
+        return result['data']
+
+    #--------------------------------------------------------------------------
+    # Return (base_sha, [PullRequestInfo]) for all open PRs on base,
+    # or just for the given PR number when one is requested
+    #--------------------------------------------------------------------------
+    def get_pull_requests(self, base, number=0):
+        variables = {'owner': self.owner, 'name': self.name, 'base': base}
+        if number:
+            variables['number'] = number
+            repository = self.graphql(_single_pr_query, variables)['repository']
+            nodes = [repository['pullRequest']] if repository['pullRequest'] else []
+        else:
+            nodes = []
+            variables['after'] = None
+            while True:
+                repository = self.graphql(_open_prs_query, variables)['repository']
+                page = repository['pullRequests']
+                nodes.extend(page['nodes'])
+                if not page['pageInfo']['hasNextPage']:
+                    break
+                variables['after'] = page['pageInfo']['endCursor']
+        if not repository['ref']:
+            raise GithubError('base branch {} not found in {}'.format(base, self.full_name))
+        base_sha = repository['ref']['target']['oid']
+        return base_sha, [_pr_info(node) for node in nodes]
+
+    #--------------------------------------------------------------------------
+    # GET every page of a list, following the Link: <url>; rel="next" headers
+    #--------------------------------------------------------------------------
+    def get_all(self, path):
+        items = []
+        while path:
+            status, headers, result = self.request('GET', path)
+            if status != 200:
+                raise GithubError('GET {} failed ({})'.format(path, status))
+            items.extend(result)
+            path = None
+            for link in (headers.get('Link') or '').split(','):
+                url, _, rel = link.partition(';')
+                if rel.strip() == 'rel="next"':
+                    path = url.strip().strip('<>')
+        return items
+
+    #--------------------------------------------------------------------------
+    # access control queries for the author of a PR commit, the lists are
+    # fetched in bulk and the single queries are for logins not in them.
+    # The single queries return None when github gave no definite answer
+    # (5xx, rate limit, ...), only a 404 means no access.
+    #--------------------------------------------------------------------------
+    def org_members(self, org):
+        return set(m['login'] for m in self.get_all('/orgs/{}/members?per_page=100'.format(org)))
+
+    def push_collaborators(self):
+        return set(c['login'] for c in self.get_all(
+                       '/repos/{}/collaborators?per_page=100'.format(self.full_name))
+                   if c.get('permissions', {}).get('push'))
+
+    def is_org_member(self, org, login):
+        status, _, _ = self.request('GET', '/orgs/{}/members/{}'.format(org, login))
+        if status == 204:
+            return True
+        return False if status == 404 else None
+
+    def has_push_access(self, login):
+        status, _, result = self.request(
+            'GET', '/repos/{}/collaborators/{}/permission'.format(self.full_name, login))
+        if status == 200:
+            return result['permission'] in ('admin', 'maintain', 'write')
+        return False if status == 404 else None
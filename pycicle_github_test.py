@@ -0,0 +1,137 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pycicle_github import GithubClient, GithubError
+
+def pr_node(number, mergeable='MERGEABLE', author='someone', files=('src/a.cpp',), total=None):
+    return {'number': number,
+            'headRefName': 'branch-{}'.format(number),
+            'headRefOid': 'sha{}'.format(number),
+            'mergeable': mergeable,
+            'headRepositoryOwner': {'login': 'fork-owner'},
+            'commits': {'nodes': [{'commit': {'author': {'user': {'login': author} if author else None}}}]},
+            'files': {'totalCount': len(files) if total is None else total,
+                      'nodes': [{'path': f} for f in files]}}
+
+class FakeGithubClient(GithubClient):
+    """Answers graphql queries from a list of canned pages"""
+    def __init__(self, pages):
+        GithubClient.__init__(self, 'token', 'org/repo')
+        self.pages    = pages
+        self.requests = []
+
+    def request(self, method, path, data=None, headers=None):
+        self.requests.append((method, path, data))
+        page = self.pages[len(self.requests) - 1]
+        return 200, {}, {'data': {'repository': page}}
+
+def page(nodes, cursor=None):
+    return {'ref': {'target': {'oid': 'basesha'}},
+            'pullRequests': {'pageInfo': {'hasNextPage': cursor is not None, 'endCursor': cursor},
+                             'nodes': nodes}}
+
+class PullRequestPollTestCase(unittest.TestCase):
+    def test_batched_pages(self):
+        client = FakeGithubClient([page([pr_node(n) for n in range(100)], 'c1'),
+                                   page([pr_node(100, 'UNKNOWN', None), pr_node(101, 'CONFLICTING', total=300)])])
+        base_sha, prs = client.get_pull_requests('master')
+        self.assertEqual(base_sha, 'basesha')
+        self.assertEqual(len(prs), 102)
+        # two round trips for 102 PRs, second one continues from the cursor
+        self.assertEqual(len(client.requests), 2)
+        self.assertEqual(client.requests[1][2]['variables']['after'], 'c1')
+        self.assertEqual(prs[0].head_sha, 'sha0')
+        self.assertEqual(prs[0].branch_name, 'branch-0')
+        self.assertEqual(prs[0].owner, 'fork-owner')
+        self.assertEqual(prs[0].author, 'someone')
+        self.assertTrue(prs[0].mergeable)
+        self.assertIsNone(prs[100].mergeable)
+        self.assertIsNone(prs[100].author)
+        self.assertFalse(prs[101].mergeable)
+        self.assertEqual(prs[0].files, ['src/a.cpp'])
+        # a truncated list of files is no list
+        self.assertIsNone(prs[101].files)
+
+    def test_missing_base(self):
+        missing = page([])
+        missing['ref'] = None
+        client = FakeGithubClient([missing])
+        self.assertRaises(GithubError, client.get_pull_requests, 'nope')
+
+class EtagClient(GithubClient):
+    """Behaves like github for conditional requests, with a fixed ETag per path"""
+    def __init__(self, cache_file, etags):
+        GithubClient.__init__(self, 'token', 'org/repo', cache_file=cache_file)
+        self.server_etags = etags
+        self.sent_headers = []
+
+    def request(self, method, path, data=None, headers=None):
+        self.sent_headers.append(headers)
+        self.rate_limit_remaining = 4999
+        if headers.get('If-None-Match') == self.server_etags[path]:
+            return 304, {}, None
+        return 200, {'ETag': self.server_etags[path]}, []
+
+class ConditionalRequestTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.cache_file = os.path.join(self.tmp, 'etags.json')
+        self.branch = '/repos/org/repo/branches/master'
+        self.pulls  = '/repos/org/repo/pulls?state=open&base=master&sort=updated&direction=desc&per_page=100'
+
+    def test_not_modified(self):
+        client = EtagClient(self.cache_file, {self.branch: '"b1"', self.pulls: '"p1"'})
+        self.assertTrue(client.base_or_pulls_changed('master'))
+        # the change is reported until it has been handled
+        self.assertTrue(client.base_or_pulls_changed('master'))
+        client.commit_etags()
+        self.assertFalse(client.base_or_pulls_changed('master'))
+        self.assertEqual(client.stats(), {'cache_hits': 2, 'cache_misses': 4,
+                                          'rate_limit_remaining': 4999})
+        # a push to a PR changes the list ETag
+        client.server_etags[self.pulls] = '"p2"'
+        self.assertTrue(client.base_or_pulls_changed('master'))
+
+    def test_persistent(self):
+        etags  = {self.branch: '"b1"', self.pulls: '"p1"'}
+        client = EtagClient(self.cache_file, etags)
+        client.base_or_pulls_changed('master')
+        client.commit_etags()
+        client = EtagClient(self.cache_file, etags)
+        self.assertFalse(client.base_or_pulls_changed('master'))
+        self.assertEqual(client.sent_headers[0], {'If-None-Match': '"b1"'})
+
+class PagedClient(GithubClient):
+    """Two pages of collaborators linked by a Link header"""
+    def __init__(self):
+        GithubClient.__init__(self, 'token', 'org/repo')
+        self.paths = []
+
+    def request(self, method, path, data=None, headers=None):
+        self.paths.append(path)
+        if 'page=2' in path:
+            return 200, {}, [{'login': 'reader', 'permissions': {'push': False}}]
+        return 200, {'Link': '<https://api.github.com/repos/org/repo/collaborators?page=2>; rel="next", '
+                             '<https://api.github.com/repos/org/repo/collaborators?page=2>; rel="last"'}, \
+               [{'login': 'writer', 'permissions': {'push': True}}]
+
+class AccessListTestCase(unittest.TestCase):
+    def test_pages(self):
+        client = PagedClient()
+        self.assertEqual(client.push_collaborators(), {'writer'})
+        self.assertEqual(client.paths, ['/repos/org/repo/collaborators?per_page=100',
+                                        'https://api.github.com/repos/org/repo/collaborators?page=2'])
+
+class EndpointTestCase(unittest.TestCase):
+    def test_endpoint(self):
+        client = GithubClient('token', 'org/repo')
+        self.assertEqual(client.endpoint(client.api_url + '/graphql'), 'graphql')
+        self.assertEqual(client.endpoint(client.api_url + '/repos/org/repo/statuses/abc'), 'statuses')
+        self.assertEqual(client.endpoint(client.api_url + '/repos/org/repo/pulls?state=open'), 'pulls')
+        self.assertEqual(client.endpoint(client.api_url + '/orgs/org/members/dev'), 'orgs')
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,116 @@
+#  Copyright (c) 2017-2019 John Biddiscombe
+#
+#  Distributed under the Boost Software License, Version 1.0. (See accompanying
+#  file LICENSE_1_0.txt or copy at http://www.boost.org/LICENSE_1_0.txt)
+#--------------------------------------------------------------------------
+# Builds on 'local' machines run the whole configure/build/test in the
+# ctest process, so they are run by a bounded pool of workers in the
+# background with their output sent to one log file per build.
+#--------------------------------------------------------------------------
+from __future__ import absolute_import, division, print_function, unicode_literals
+import os
+import time
+import signal
+import threading
+import subprocess
+import concurrent.futures
+
+from pycicle_params import PycicleParamsHelper
+
+#--------------------------------------------------------------------------
+# A sensible number of concurrent local builds for this machine,
+# each build is itself parallel so allow one per 8 cores / 16GB of memory
+#--------------------------------------------------------------------------
+def default_local_jobs():
+    cores = os.cpu_count() or 1
+    try:
+        memory_gb = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // 2**30
+    except (ValueError, OSError, AttributeError):
+        memory_gb = 16 * cores
+    return max(1, min(cores // 8, memory_gb // 16))
+
+class LocalBuild:
+    def __init__(self, name, log_file, tag=None):
+        self.name       = name
+        self.log_file   = log_file
+        self.tag        = tag
+        self.state      = 'queued'
+        self.returncode = None
+        self.start_time = None
+        self.end_time   = None
+        self.process    = None
+        self.future     = None
+
+    def __repr__(self):
+        return 'LocalBuild({}, {}, {})'.format(self.name, self.state, self.returncode)
+
+class LocalBuildPool:
+    def __init__(self, jobs, log_dir, debug_print=PycicleParamsHelper.no_op):
+        """jobs    : maximum number of builds running at the same time
+        log_dir : directory where the <name>.log output files are written
+        """
+        self.jobs        = jobs
+        self.log_dir     = log_dir
+        self.debug_print = debug_print
+        self.lock        = threading.Lock()
+        self.builds      = {}
+        self.finished    = []
+        self.executor    = concurrent.futures.ThreadPoolExecutor(jobs)
+        if not os.path.exists(log_dir):
+            os.makedirs(log_dir)
+
+    def submit(self, name, transport, script, tag=None):
+        """Queue script to run on transport, a build of the same name that is
+        still queued or running is cancelled first. tag is kept with the build
+        for the caller to identify it when it completes"""
+        self.cancel(name)
+        build = LocalBuild(name, os.path.join(self.log_dir, name + '.log'), tag)
+        with self.lock:
+            self.builds[name] = build
+        build.future = self.executor.submit(self._run, build, transport, script)
+        print('Queued local build', name, 'log in', build.log_file)
+        return build
+
+    def _run(self, build, transport, script):
+        with self.lock:
+            if build.state != 'queued':
+                return
+            build.state      = 'running'
+            build.start_time = time.time()
+            with open(build.log_file, 'wb') as log:
+                # own process group, so that cancel stops ctest and the build too
+                build.process = transport.popen(script, stdout=log, stderr=subprocess.STDOUT,
+                                                start_new_session=True)
+        build.returncode = build.process.wait()
+        with self.lock:
+            build.end_time = time.time()
+            if build.state == 'running':
+                build.state = 'done' if build.returncode == 0 else 'failed'
+            self.finished.append(build)
+            if self.builds.get(build.name) is build:
+                del self.builds[build.name]
+
+    def cancel(self, name):
+        with self.lock:
+            build = self.builds.pop(name, None)
+            if build is None:
+                return False
+            if build.state == 'running':
+                os.killpg(build.process.pid, signal.SIGTERM)
+            build.state = 'cancelled'
+        self.debug_print('cancelled local build', name)
+        return True
+
+    def running(self):
+        with self.lock:
+            return [b for b in self.builds.values() if b.state == 'running']
+
+    def queued(self):
+        with self.lock:
+            return [b for b in self.builds.values() if b.state == 'queued']
+
+    def poll(self):
+        """Builds that completed since the last call"""
+        with self.lock:
+            finished, self.finished = self.finished, []
+        return finished
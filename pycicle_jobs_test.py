@@ -0,0 +1,57 @@
+import shutil
+import tempfile
+import time
+import unittest
+
+from pycicle_jobs import LocalBuildPool, default_local_jobs
+from pycicle_transport import LocalTransport
+
+def wait_for(pool, count, timeout=10):
+    finished = []
+    end = time.time() + timeout
+    while len(finished) < count and time.time() < end:
+        finished.extend(pool.poll())
+        time.sleep(0.05)
+    return finished
+
+class LocalBuildPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.log_dir)
+        self.transport = LocalTransport('local')
+
+    def test_logs_and_status(self):
+        pool = LocalBuildPool(2, self.log_dir)
+        pool.submit('good', self.transport, 'echo building')
+        pool.submit('bad', self.transport, 'echo oops >&2; exit 2')
+        finished = dict((b.name, b) for b in wait_for(pool, 2))
+        self.assertEqual(finished['good'].state, 'done')
+        self.assertEqual(finished['bad'].state, 'failed')
+        self.assertEqual(finished['bad'].returncode, 2)
+        with open(finished['good'].log_file) as f:
+            self.assertEqual(f.read(), 'building\n')
+        with open(finished['bad'].log_file) as f:
+            self.assertEqual(f.read(), 'oops\n')
+
+    def test_bounded(self):
+        pool = LocalBuildPool(1, self.log_dir)
+        pool.submit('first', self.transport, 'sleep 0.5')
+        pool.submit('second', self.transport, 'true')
+        time.sleep(0.2)
+        self.assertEqual([b.name for b in pool.running()], ['first'])
+        self.assertEqual([b.name for b in pool.queued()], ['second'])
+        self.assertEqual(len(wait_for(pool, 2)), 2)
+
+    def test_resubmit_cancels(self):
+        pool = LocalBuildPool(1, self.log_dir)
+        pool.submit('pr', self.transport, 'sleep 30')
+        time.sleep(0.2)
+        pool.submit('pr', self.transport, 'true')
+        states = sorted(b.state for b in wait_for(pool, 2))
+        self.assertEqual(states, ['cancelled', 'done'])
+
+    def test_default_jobs(self):
+        self.assertGreaterEqual(default_local_jobs(), 1)
+
+if __name__ == "__main__":
+    unittest.main()
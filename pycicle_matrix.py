@@ -0,0 +1,37 @@
+#  Copyright (c) 2017-2019 John Biddiscombe
+#
+#  Distributed under the Boost Software License, Version 1.0. (See accompanying
+#  file LICENSE_1_0.txt or copy at http://www.boost.org/LICENSE_1_0.txt)
+#--------------------------------------------------------------------------
+# The compiler/build type matrix of a machine.
+#   set(PYCICLE_COMPILERS "gcc;clang")
+#   set(PYCICLE_BUILD_TYPES "Release;Debug")
+# in the config of a machine (or of the project) give the combinations a
+# machine can build, without them it builds PYCICLE_COMPILER_TYPE and
+# PYCICLE_BUILD_TYPE only.
+# The base branch is built with every combination. A PR is built with one
+# combination per machine, the store remembers which ones each head SHA
+# was built with, and the next build of the PR picks a combination not
+# yet built for its SHA, the one least recently built for the PR first.
+# Over a few pushes a PR is so built with all of them.
+#--------------------------------------------------------------------------
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+def cmake_list(value):
+    """The items of a cmake list "a;b;c", [] for None"""
+    return [v.strip() for v in value.split(';') if v.strip()] if value else []
+
+def build_matrix(compilers, build_types):
+    """(compiler, build_type) combinations, in the order of the config"""
+    return [(c, b) for c in (compilers or [None]) for b in (build_types or [None])]
+
+def next_combination(combinations, history, sha):
+    """The combination to build sha with
+    history : [(sha, compiler, build_type, time)] of the earlier builds of the PR
+    """
+    built_sha = set((c, b) for s, c, b, t in history if s == sha)
+    last = {}
+    for s, c, b, t in history:
+        last[(c, b)] = max(last.get((c, b), 0), t)
+    candidates = [x for x in combinations if x not in built_sha] or combinations
+    return min(candidates, key=lambda x: (last.get(x, 0), combinations.index(x)))
@@ -0,0 +1,28 @@
+import unittest
+
+from pycicle_matrix import cmake_list, build_matrix, next_combination
+
+class MatrixTestCase(unittest.TestCase):
+    def test_matrix(self):
+        self.assertEqual(cmake_list('gcc; clang;'), ['gcc', 'clang'])
+        self.assertEqual(cmake_list(None), [])
+        self.assertEqual(build_matrix(['gcc', 'clang'], ['Release']),
+                         [('gcc', 'Release'), ('clang', 'Release')])
+        self.assertEqual(build_matrix([], ['Debug']), [(None, 'Debug')])
+
+    def test_rotation(self):
+        combinations = build_matrix(['gcc', 'clang'], ['Release', 'Debug'])
+        history = []
+        # every push builds the combination built longest ago (or never)
+        for n in range(4):
+            sha = 'sha{}'.format(n)
+            chosen = next_combination(combinations, history, sha)
+            history.append((sha, chosen[0], chosen[1], n + 1))
+        self.assertEqual(sorted((c, b) for s, c, b, t in history), sorted(combinations))
+        self.assertEqual(next_combination(combinations, history, 'sha4'), ('gcc', 'Release'))
+        # a rebuild of the same SHA (the base branch moved) takes another one
+        history.append(('sha4', 'gcc', 'Release', 5))
+        self.assertEqual(next_combination(combinations, history, 'sha4'), ('gcc', 'Debug'))
+
+if __name__ == "__main__":
+    unittest.main()
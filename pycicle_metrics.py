@@ -0,0 +1,200 @@
+#  Copyright (c) 2017-2019 John Biddiscombe
+#
+#  Distributed under the Boost Software License, Version 1.0. (See accompanying
+#  file LICENSE_1_0.txt or copy at http://www.boost.org/LICENSE_1_0.txt)
+#--------------------------------------------------------------------------
+# Counters, gauges and histograms of what pycicle is doing.
+#   pycicle_github_requests_total / _seconds   github requests and latency
+#   pycicle_github_rate_limit_remaining        from the last response
+#   pycicle_command_seconds / _failures_total  commands run on each machine
+#   pycicle_task_seconds / _failures_total     runs of the runner tasks
+#   pycicle_queue_builds                       builds pending/running
+#   pycicle_queue_wait_seconds                 build queued -> build started
+#   pycicle_launch_to_status_seconds           build started -> status queued
+#   pycicle_statuses_published_total
+# They are served in the prometheus text format by a small http server
+# (GET /metrics) and summarised as json in the log from time to time.
+# Only the standard library is used.
+#--------------------------------------------------------------------------
+from __future__ import absolute_import, division, print_function, unicode_literals
+import time
+import threading
+import contextlib
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+# upper bounds (seconds) of the histogram buckets, from a fast github
+# request to a build that runs for hours
+default_buckets = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60,
+                   300, 600, 1800, 3600, 7200, 14400, 43200)
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"'))
+                          for k, v in items) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts  = [0] * len(buckets)
+        self.count   = 0
+        self.sum     = 0.0
+        self.max     = None
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum   += value
+        self.max    = value if self.max is None else max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q quantile"""
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+class Metrics:
+    def __init__(self, buckets=default_buckets):
+        self.buckets    = buckets
+        self.lock       = threading.Lock()
+        self.counters   = {}
+        self.gauges     = {}
+        self.histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            key    = _labels(labels)
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.gauges.setdefault(name, {})[_labels(labels)] = value
+
+    def observe(self, name, value, **labels):
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            key    = _labels(labels)
+            if key not in series:
+                series[key] = Histogram(self.buckets)
+            series[key].observe(value)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        """Observe the time spent in the with block (also when it raises)"""
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.observe(name, time.time() - start, **labels)
+
+    def get(self, name, **labels):
+        """Value of a counter or gauge, the Histogram of a histogram, None if unknown"""
+        key = _labels(labels)
+        with self.lock:
+            for table in (self.counters, self.gauges, self.histograms):
+                if name in table and key in table[name]:
+                    return table[name][key]
+        return None
+
+    #--------------------------------------------------------------------------
+    # prometheus text exposition format
+    #--------------------------------------------------------------------------
+    def render(self):
+        lines = []
+        with self.lock:
+            for kind, table in (('counter', self.counters), ('gauge', self.gauges)):
+                for name in sorted(table):
+                    lines.append('# TYPE {} {}'.format(name, kind))
+                    for key, value in sorted(table[name].items()):
+                        lines.append('{}{} {}'.format(name, _format_labels(key), _format_value(value)))
+            for name in sorted(self.histograms):
+                lines.append('# TYPE {} histogram'.format(name))
+                for key, histogram in sorted(self.histograms[name].items()):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append('{}_bucket{} {}'.format(
+                            name, _format_labels(key, [('le', _format_value(float(bound)))]), cumulative))
+                    lines.append('{}_bucket{} {}'.format(
+                        name, _format_labels(key, [('le', '+Inf')]), histogram.count))
+                    lines.append('{}_sum{} {}'.format(name, _format_labels(key), repr(histogram.sum)))
+                    lines.append('{}_count{} {}'.format(name, _format_labels(key), histogram.count))
+        return '\n'.join(lines) + '\n'
+
+    #--------------------------------------------------------------------------
+    # compact json friendly summary for the log
+    #--------------------------------------------------------------------------
+    def summary(self):
+        def series_name(name, key):
+            return name + (_format_labels(key) if key else '')
+        result = {}
+        with self.lock:
+            for table in (self.counters, self.gauges):
+                for name, series in table.items():
+                    for key, value in series.items():
+                        result[series_name(name, key)] = value
+            for name, series in self.histograms.items():
+                for key, h in series.items():
+                    result[series_name(name, key)] = {
+                        'count': h.count, 'mean': round(h.sum / h.count, 3) if h.count else None,
+                        'p50': h.quantile(0.5), 'p95': h.quantile(0.95),
+                        'max': round(h.max, 3) if h.max is not None else None}
+        return result
+
+#--------------------------------------------------------------------------
+# GET /metrics
+#--------------------------------------------------------------------------
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class MetricsServer:
+    def __init__(self, port, metrics, address='127.0.0.1'):
+        """port : port to listen on (0 picks a free one), local connections only by default"""
+        self.server = HTTPServer((address, port), _MetricsHandler)
+        self.server.metrics = metrics
+        self.port   = self.server.server_address[1]
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        print('Serving metrics on http://localhost:{}/metrics'.format(self.port))
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,60 @@
+import unittest
+
+try:
+    from urllib.request import urlopen
+    from urllib.error import HTTPError
+except ImportError:
+    from urllib2 import urlopen, HTTPError
+
+from pycicle_metrics import Metrics, MetricsServer
+
+class MetricsTestCase(unittest.TestCase):
+    def test_render(self):
+        metrics = Metrics(buckets=(0.1, 1))
+        metrics.inc('pycicle_github_requests_total', method='GET', status=304)
+        metrics.inc('pycicle_github_requests_total', method='GET', status=304)
+        metrics.set('pycicle_github_rate_limit_remaining', 4999)
+        for value in (0.05, 0.5, 5):
+            metrics.observe('pycicle_command_seconds', value, machine='daint')
+        self.assertEqual(metrics.get('pycicle_github_requests_total', status=304, method='GET'), 2)
+        self.assertIsNone(metrics.get('pycicle_github_requests_total', status=200, method='GET'))
+        self.assertEqual(metrics.render().splitlines(), [
+            '# TYPE pycicle_github_requests_total counter',
+            'pycicle_github_requests_total{method="GET",status="304"} 2',
+            '# TYPE pycicle_github_rate_limit_remaining gauge',
+            'pycicle_github_rate_limit_remaining 4999',
+            '# TYPE pycicle_command_seconds histogram',
+            'pycicle_command_seconds_bucket{machine="daint",le="0.1"} 1',
+            'pycicle_command_seconds_bucket{machine="daint",le="1.0"} 2',
+            'pycicle_command_seconds_bucket{machine="daint",le="+Inf"} 3',
+            'pycicle_command_seconds_sum{machine="daint"} 5.55',
+            'pycicle_command_seconds_count{machine="daint"} 3'])
+
+    def test_summary_and_timer(self):
+        metrics = Metrics()
+        with metrics.timer('pycicle_task_seconds', task='github'):
+            pass
+        try:
+            with metrics.timer('pycicle_task_seconds', task='github'):
+                raise ValueError('failed')
+        except ValueError:
+            pass
+        summary = metrics.summary()['pycicle_task_seconds{task="github"}']
+        self.assertEqual(summary['count'], 2)
+        self.assertEqual(summary['p50'], 0.01)
+
+    def test_server(self):
+        metrics = Metrics()
+        metrics.inc('pycicle_statuses_published_total', 3)
+        server = MetricsServer(0, metrics)
+        server.start()
+        self.addCleanup(server.stop)
+        url = 'http://127.0.0.1:{}'.format(server.port)
+        body = urlopen(url + '/metrics', timeout=10).read().decode('utf-8')
+        self.assertIn('pycicle_statuses_published_total 3\n', body)
+        with self.assertRaises(HTTPError) as context:
+            urlopen(url + '/other', timeout=10)
+        self.assertEqual(context.exception.code, 404)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+#  Copyright (c) 2017-2019 John Biddiscombe
+#
+#  Distributed under the Boost Software License, Version 1.0. (See accompanying
+#  file LICENSE_1_0.txt or copy at http://www.boost.org/LICENSE_1_0.txt)
+#--------------------------------------------------------------------------
+# A bare mirror of the project repository on each build machine, in
+# $PYCICLE_ROOT/repos/<name>.git. pycicle refreshes it once per poll
+# cycle and dashboard_script.cmake creates the source tree of each PR as
+# a `git clone --shared` of it, which takes seconds and a few MB since
+# the objects stay in the mirror.
+# A mirror also fetches refs/pull/*/head, so PRs are merged from it too.
+# Shared clones break if the mirror drops objects they use, so objects
+# in the mirror are never pruned.
+# The mirror also gives the tree of a PR merged onto the base branch
+# (git merge-tree, no checkout needed), which is what a build of the PR
+# tests, so results are cached against it.
+#--------------------------------------------------------------------------
+from __future__ import absolute_import, division, print_function, unicode_literals
+
+from pycicle_transport import shell_command
+
+def mirror_path(root, reponame):
+    return root + '/repos/' + reponame + '.git'
+
+def github_url(reponame, organisation=None, user=None):
+    return 'git@github.com:{}/{}.git'.format(organisation or user, reponame)
+
+def mirror_command(root, reponame, url):
+    """The shell command that creates (first time) and refreshes the mirror"""
+    mirror = shell_command([mirror_path(root, reponame)])
+    return ('if [ ! -d {m} ]; then '
+            'rm -rf {m}.tmp && mkdir -p {repos} && git clone --mirror --quiet {url} {m}.tmp && '
+            'git -C {m}.tmp config gc.pruneExpire never && '
+            'mv {m}.tmp {m}; '
+            'else git -C {m} fetch --prune --quiet origin; fi'
+            .format(m=mirror, repos=shell_command([root + '/repos']), url=shell_command([url])))
+
+def tree_command(root, reponame, base, shas):
+    """The shell command printing `<sha> <tree>` for each sha that merges
+    cleanly onto the base branch, the tree being that of the merge.
+    Needs git 2.38 (merge-tree --write-tree), older versions print nothing"""
+    mirror = shell_command([mirror_path(root, reponame)])
+    lines  = ['if t=$(git -C {} merge-tree --write-tree {} {} 2>/dev/null); then echo {} $t; fi'
+              .format(mirror, shell_command(['refs/heads/' + base]), shell_command([sha]),
+                      shell_command([sha]))
+              for sha in sorted(set(shas))]
+    return '; '.join(lines + ['true'])
+
+def parse_tree_output(output):
+    """{sha: tree} from the output of tree_command"""
+    if isinstance(output, bytes):
+        output = output.decode('utf-8', 'replace')
+    trees = {}
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) >= 2:
+            trees[fields[0]] = fields[1]
+    return trees
@@ -0,0 +1,86 @@
+import os
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+from pycicle_mirror import mirror_command, mirror_path, tree_command, parse_tree_output
+from pycicle_transport import LocalTransport
+
+def git(*args):
+    return subprocess.check_output(['git', '-c', 'user.name=pycicle', '-c', 'user.email=pycicle@test',
+                                    '-c', 'init.defaultBranch=master'] + list(args)).decode().strip()
+
+class MirrorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.upstream = os.path.join(self.tmp, 'upstream')
+        git('init', '-q', self.upstream)
+        self.commit('first')
+        # github keeps PR heads under refs/pull
+        git('-C', self.upstream, 'update-ref', 'refs/pull/12/head', 'HEAD')
+        self.root      = os.path.join(self.tmp, 'root')
+        self.transport = LocalTransport('local')
+
+    def commit(self, message):
+        git('-C', self.upstream, 'commit', '-q', '--allow-empty', '-m', message)
+        return git('-C', self.upstream, 'rev-parse', 'HEAD')
+
+    def test_create_and_refresh(self):
+        mirror = mirror_path(self.root, 'hpx')
+        self.transport.run(mirror_command(self.root, 'hpx', self.upstream))
+        self.assertEqual(git('-C', mirror, 'config', 'gc.pruneExpire'), 'never')
+        self.assertEqual(git('-C', mirror, 'rev-parse', 'pull/12/head'),
+                         git('-C', self.upstream, 'rev-parse', 'HEAD'))
+        sha = self.commit('second')
+        self.transport.run(mirror_command(self.root, 'hpx', self.upstream))
+        self.assertEqual(git('-C', mirror, 'rev-parse', 'master'), sha)
+        # PR source trees borrow the objects of the mirror
+        clone = os.path.join(self.tmp, 'src')
+        git('clone', '-q', '--shared', mirror, clone)
+        self.assertTrue(os.path.exists(os.path.join(clone, '.git', 'objects', 'info', 'alternates')))
+        self.assertEqual(git('-C', clone, 'rev-parse', 'HEAD'), sha)
+
+    def test_failed_clone_retried(self):
+        missing = os.path.join(self.tmp, 'missing')
+        with self.assertRaises(subprocess.CalledProcessError):
+            self.transport.run(mirror_command(self.root, 'hpx', missing) + ' 2>/dev/null')
+        self.assertFalse(os.path.exists(mirror_path(self.root, 'hpx')))
+        self.transport.run(mirror_command(self.root, 'hpx', self.upstream))
+        self.assertTrue(os.path.exists(mirror_path(self.root, 'hpx')))
+
+    def test_merged_trees(self):
+        upstream = self.upstream
+        with open(os.path.join(upstream, 'a.txt'), 'w') as f:
+            f.write('a\n')
+        git('-C', upstream, 'add', 'a.txt')
+        base = self.commit('base')
+        git('-C', upstream, 'checkout', '-q', '-b', 'pr')
+        with open(os.path.join(upstream, 'b.txt'), 'w') as f:
+            f.write('b\n')
+        git('-C', upstream, 'add', 'b.txt')
+        first = self.commit('pr')
+        # the same change pushed again with another message
+        git('-C', upstream, '-c', 'user.name=pycicle', '-c', 'user.email=pycicle@test',
+            'commit', '-q', '--amend', '-m', 'pr, reworded')
+        second = git('-C', upstream, 'rev-parse', 'HEAD')
+        # and one that conflicts with the base branch
+        git('-C', upstream, 'checkout', '-q', '-b', 'conflict', base)
+        with open(os.path.join(upstream, 'a.txt'), 'w') as f:
+            f.write('c\n')
+        git('-C', upstream, 'add', 'a.txt')
+        conflict = self.commit('conflict')
+        git('-C', upstream, 'checkout', '-q', 'master')
+        with open(os.path.join(upstream, 'a.txt'), 'w') as f:
+            f.write('d\n')
+        git('-C', upstream, 'add', 'a.txt')
+        self.commit('base moves on')
+        self.transport.run(mirror_command(self.root, 'hpx', upstream))
+        trees = parse_tree_output(self.transport.run(
+            tree_command(self.root, 'hpx', 'master', [first, second, conflict, 'f' * 40])))
+        self.assertEqual(sorted(trees), sorted([first, second]))
+        self.assertEqual(trees[first], trees[second])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,6 +14,57 @@ class PycicleParamsHelper:
     def no_op(self, *args, **kwargs):
         pass
 
+#--------------------------------------------------------------------------
+# tokenizer for the subset of cmake that pycicle config files use.
+# quoted strings and comments are matched as whole tokens so that
+# a set( inside a string (job templates) or comment is never picked up
+#--------------------------------------------------------------------------
+_cmake_token = re.compile(r'''
+      (?P<comment>\#[^\n]*)
+    | \bset\s*\(\s*(?P<name>PYCICLE_\w+)\s+
+        (?:"(?P<quoted>(?:[^"\\]|\\.)*)"|(?P<bare>[^\s()"]+))
+    | "(?:[^"\\]|\\.)*"
+    ''', re.VERBOSE | re.DOTALL)
+
+_cmake_escape = re.compile(r'\\(["\\])')
+
+def parse_cmake_settings(text):
+    """Return a dict of all set(PYCICLE_* value) entries in cmake text
+    Quoted values may span several lines (PYCICLE_COMPILER_SETUP etc).
+    When a setting appears more than once the first one wins, which is
+    what the line by line search this replaces returned.
+    """
+    settings = {}
+    for m in _cmake_token.finditer(text):
+        name = m.group('name')
+        if name is None or name in settings:
+            continue
+        if m.group('quoted') is not None:
+            settings[name] = _cmake_escape.sub(r'\1', m.group('quoted'))
+        else:
+            settings[name] = m.group('bare')
+    return settings
+
+class PycicleConfigCache:
+    """Parsed settings of each config file, keyed by path
+    A file is parsed the first time it is used and again only when its
+    mtime (or size) changes, so edits are picked up by a running pycicle.
+    """
+    def __init__(self, debug_print=PycicleParamsHelper.no_op):
+        self.debug_print = debug_print
+        self.files = {}
+
+    def get(self, config_file):
+        stat = os.stat(config_file)
+        stamp = (stat.st_mtime, stat.st_size)
+        entry = self.files.get(config_file)
+        if entry is None or entry[0] != stamp:
+            self.debug_print('parsing config file :', config_file)
+            with open(config_file, 'r') as f:
+                entry = (stamp, parse_cmake_settings(f.read()))
+            self.files[config_file] = entry
+        return entry[1]
+
 class PycicleParams:
     keys = ['PYCICLE_PROJECT_NAME',
             'PYCICLE_GITHUB_PROJECT_NAME',
@@ -48,7 +99,9 @@ class PycicleParams:
             'PYCICLE_CDASH_HTTP_PATH',
             'PYCICLE_CDASH_DROP_METHOD',
             'PYCICLE_BUILD_STAMP',
-            'PYCICLE_COMPILER_SETUP']
+            'PYCICLE_COMPILER_SETUP',
+            'PYCICLE_COMPILERS',
+            'PYCICLE_BUILD_TYPES']
     config_path = None
     remote_config_path = None
 
@@ -58,6 +111,7 @@ class PycicleParams:
         debug_print: function reference used for debug_print calls
         """
         self.debug_print = debug_print
+        self.config_cache = PycicleConfigCache(debug_print)
 
         # test for path relative to pycicle_params.py which we assume is in dir with pycicle.py
         config_path = args.config_path
@@ -72,9 +126,10 @@ class PycicleParams:
             self.config_path = os.path.join(current_path, config_path, args.project)
             self.debug_print("pycicle expects to "
                 "find local configs in {}".format(self.config_path))
-            self.remote_config_path = os.path.join('/pycicle/config/' , args.project)
-            self.debug_print("pycicle expects to "
-                "remote configs in {}".format(self.remote_config_path))
+        # remote machines use the configs of their own pycicle checkout
+        self.remote_config_path = os.path.join('/pycicle/config/' , args.project)
+        self.debug_print("pycicle expects to "
+            "remote configs in {}".format(self.remote_config_path))
 
     def get_setting_for_machine(self, project, machine, setting):
         if setting not in self.keys:
@@ -82,10 +137,7 @@ class PycicleParams:
         config_file = os.path.join(self.config_path, machine) + '.cmake'
         self.debug_print('looking for setting :', setting,
                          'in file', config_file)
-        with open(config_file, 'r') as f:
-            for line in f:
-                m = re.findall(setting + r"\s*\"(.*?)\"", line)
-                if m:
-                    self.debug_print('found setting       :', setting, '=', m[0])
-                    return m[0]
-            return None
+        value = self.config_cache.get(config_file).get(setting)
+        if value is not None:
+            self.debug_print('found setting       :', setting, '=', value)
+        return value
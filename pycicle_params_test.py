@@ -1,20 +1,68 @@
+import os
+import shutil
+import tempfile
 import unittest
 
-from pycicle_params import PycicleParams
+from pycicle_params import PycicleParams, parse_cmake_settings
 
 class MockArgs:
-    def __init__(self):
-        pass
+    config_path = 'test/'
+    project = 'test'
 
 class PycicleParamsTestCase(unittest.TestCase):
     def setUp(self):
-        self.pyc_p = PycicleParams(MockArgs, config_path='test/')
+        self.pyc_p = PycicleParams(MockArgs)
 
 class UnicodeRawTestCase(PycicleParamsTestCase):
     def runTest(self):
         test_setting = self.pyc_p.get_setting_for_machine('test', 'test_machine', 'PYCICLE_ROOT')
         self.assertIsNotNone(test_setting)
 
+class ConfigModelTestCase(PycicleParamsTestCase):
+    def test_settings(self):
+        get = self.pyc_p.get_setting_for_machine
+        self.assertEqual(get('test', 'test_machine', 'PYCICLE_MACHINE'), 'local')
+        self.assertEqual(get('test', 'test_machine', 'PYCICLE_COMPILER_TYPE'), 'gcc')
+        self.assertEqual(get('test', 'test_machine', 'PYCICLE_HTTP'), 'FALSE')
+        self.assertIsNone(get('test', 'test_machine', 'PYCICLE_CDASH_HTTP_PATH'))
+        self.assertRaises(ValueError, get, 'test', 'test_machine', 'NOT_A_KEY')
+
+    def test_multiline(self):
+        setup = self.pyc_p.get_setting_for_machine('test', 'test_machine', 'PYCICLE_COMPILER_SETUP')
+        self.assertIn('module load PE-gnu', setup)
+        self.assertIn('export CFLAGS="${CFLAGS}"', setup)
+        template = self.pyc_p.get_setting_for_machine('test', 'test_machine', 'PYCICLE_JOB_SCRIPT_TEMPLATE')
+        self.assertTrue(template.startswith('#!/bin/bash'))
+
+    def test_strings_and_comments_ignored(self):
+        settings = parse_cmake_settings(
+            '# set(PYCICLE_ROOT "commented")\n'
+            'message("set(PYCICLE_ROOT \\"quoted\\")")\n'
+            'set(PYCICLE_ROOT "/real")\n'
+            'set(PYCICLE_ROOT "/second")\n')
+        self.assertEqual(settings, {'PYCICLE_ROOT': '/real'})
+
+    def test_reload_on_change(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        self.pyc_p.config_path = tmp
+        config_file = os.path.join(tmp, 'm.cmake')
+        with open(config_file, 'w') as f:
+            f.write('set(PYCICLE_ROOT "/one")\n')
+        self.assertEqual(self.pyc_p.get_setting_for_machine('test', 'm', 'PYCICLE_ROOT'), '/one')
+        with open(config_file, 'w') as f:
+            f.write('set(PYCICLE_ROOT "/two/x")\n')
+        self.assertEqual(self.pyc_p.get_setting_for_machine('test', 'm', 'PYCICLE_ROOT'), '/two/x')
+
+    def test_remote_config_path(self):
+        self.assertEqual(self.pyc_p.remote_config_path, '/pycicle/config/test')
+        class AbsoluteArgs:
+            config_path = '/etc/pycicle'
+            project = 'test'
+        params = PycicleParams(AbsoluteArgs)
+        self.assertEqual(params.config_path, '/etc/pycicle')
+        self.assertEqual(params.remote_config_path, '/pycicle/config/test')
+
 if __name__ == "__main__":
     unittest.main()
     print("testing done")
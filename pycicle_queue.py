@@ -0,0 +1,209 @@
+#  Copyright (c) 2017-2019 John Biddiscombe
+#
+#  Distributed under the Boost Software License, Version 1.0. (See accompanying
+#  file LICENSE_1_0.txt or copy at http://www.boost.org/LICENSE_1_0.txt)
+#--------------------------------------------------------------------------
+# Queue of builds waiting to be launched, and of builds in flight, kept
+# in the PycicleStore so that it survives a restart.
+# There is at most one entry per (PR, machine, compiler, build type). A
+# newer SHA of a PR supersedes every older entry for that PR on the
+# machine, queued or running (running ones are returned so the caller can
+# cancel them).
+# Base branch builds go first, and the number of builds in flight on each
+# machine is capped. Builds of a PR on one machine share its src tree, so
+# they run one after the other.
+#--------------------------------------------------------------------------
+from __future__ import absolute_import, division, print_function, unicode_literals
+import time
+import threading
+
+from pycicle_params import PycicleParamsHelper
+
+# lower values are launched first
+BASE_PRIORITY = 0
+PR_PRIORITY   = 1
+
+class BuildEntry:
+    fields = ['pr', 'branch_name', 'machine', 'compiler', 'sha',
+              'priority', 'state', 'enqueued', 'started', 'job_id', 'include_label', 'build_type',
+              'tree']
+
+    def __init__(self, pr, branch_name, machine, compiler, sha, priority,
+                 state='pending', enqueued=None, started=None, job_id=None, include_label=None,
+                 build_type=None, tree=None):
+        self.pr          = pr
+        self.branch_name = branch_name
+        self.machine     = machine
+        self.compiler    = compiler
+        self.sha         = sha
+        self.priority    = priority
+        self.state       = state
+        self.enqueued    = enqueued if enqueued is not None else time.time()
+        self.started     = started
+        self.job_id      = job_id
+        self.include_label = include_label
+        self.build_type  = build_type
+        # the PR merged onto the base branch, results are cached against it
+        self.tree        = tree
+
+    @property
+    def key(self):
+        return (self.pr, self.machine, self.compiler, self.build_type)
+
+    def to_dict(self):
+        return dict((f, getattr(self, f)) for f in self.fields)
+
+    def __repr__(self):
+        return 'BuildEntry({}, {}, {}, {}, {})'.format(
+            self.pr, self.machine, '-'.join(str(c) for c in (self.compiler, self.build_type) if c),
+            self.sha[:8], self.state)
+
+class BuildQueue:
+    def __init__(self, store, max_running, max_running_time=24*3600,
+                 debug_print=PycicleParamsHelper.no_op):
+        """store            : PycicleStore the queue is kept in, None for no persistence
+        max_running      : maximum builds in flight per machine
+        max_running_time : seconds after which a build that never reported
+                           back is assumed lost and its slot is freed
+        """
+        self.store            = store
+        self.max_running      = max_running
+        self.max_running_time = max_running_time
+        self.debug_print      = debug_print
+        self.lock             = threading.RLock()
+        self.entries          = []
+        self.load()
+
+    def load(self):
+        if self.store:
+            self.entries = [BuildEntry(**e) for e in self.store.builds()]
+
+    # every change is written through to the store
+    def save(self, entry):
+        if self.store:
+            self.store.put_build(entry.to_dict())
+
+    def transaction(self):
+        """Several changes written to the store together"""
+        return self.store.transaction() if self.store else self.lock
+
+    def remove(self, entry):
+        self.entries.remove(entry)
+        if self.store:
+            self.store.delete_build(entry.pr, entry.machine, entry.compiler, entry.build_type)
+
+    #--------------------------------------------------------------------------
+    # Queue a build, returns the running entries it supersedes
+    #--------------------------------------------------------------------------
+    def add(self, pr, branch_name, machine, compiler, sha, priority=PR_PRIORITY, include_label=None,
+            build_type=None):
+        with self.lock, self.transaction():
+            superseded = []
+            for entry in list(self.entries):
+                if entry.pr != pr or entry.machine != machine:
+                    continue
+                if entry.sha == sha:
+                    if entry.compiler == compiler and entry.build_type == build_type:
+                        self.debug_print('already queued', entry)
+                        return []
+                    continue
+                print('Superseded', entry, 'by', sha[:8])
+                self.remove(entry)
+                if entry.state == 'running':
+                    superseded.append(entry)
+            entry = BuildEntry(pr, branch_name, machine, compiler, sha, priority,
+                               include_label=include_label, build_type=build_type)
+            self.entries.append(entry)
+            self.save(entry)
+            return superseded
+
+    #--------------------------------------------------------------------------
+    # Pending builds that can start now (on one machine, or all when None),
+    # they are marked as running
+    #--------------------------------------------------------------------------
+    def next_launches(self, machine=None):
+        with self.lock, self.transaction():
+            self.expire()
+            running = {}
+            busy    = set()
+            for entry in self.entries:
+                if entry.state == 'running':
+                    running[entry.machine] = running.get(entry.machine, 0) + 1
+                    busy.add((entry.pr, entry.machine))
+            launches = []
+            pending  = [e for e in self.entries if e.state == 'pending'
+                        and machine in (None, e.machine)]
+            for entry in sorted(pending, key=lambda e: (e.priority, e.enqueued)):
+                if running.get(entry.machine, 0) >= self.max_running:
+                    continue
+                if (entry.pr, entry.machine) in busy:
+                    continue
+                running[entry.machine] = running.get(entry.machine, 0) + 1
+                busy.add((entry.pr, entry.machine))
+                entry.state   = 'running'
+                entry.started = time.time()
+                self.save(entry)
+                launches.append(entry)
+            return launches
+
+    def expire(self):
+        now = time.time()
+        for entry in list(self.entries):
+            if entry.state == 'running' and now - entry.started > self.max_running_time:
+                print('No result from', entry, 'assuming it was lost')
+                self.remove(entry)
+
+    #--------------------------------------------------------------------------
+    # A build of the PR on the machine has completed (all compilers when None)
+    #--------------------------------------------------------------------------
+    def finish(self, pr, machine, compiler=None):
+        with self.lock, self.transaction():
+            done = [e for e in self.entries if e.state == 'running' and e.pr == pr
+                    and e.machine == machine and compiler in (None, e.compiler)]
+            for entry in done:
+                self.remove(entry)
+            return done
+
+    def release(self, entry):
+        """Drop a build that could not be launched, its slot is free again"""
+        with self.lock, self.transaction():
+            if entry in self.entries:
+                self.remove(entry)
+
+    #--------------------------------------------------------------------------
+    # scheduler jobs of running builds
+    #--------------------------------------------------------------------------
+    def set_job_id(self, entry, job_id):
+        with self.lock:
+            entry.job_id = job_id
+            # it may have been superseded while it was being submitted
+            if entry in self.entries:
+                self.save(entry)
+
+    def set_tree(self, entry, tree):
+        with self.lock:
+            entry.tree = tree
+            if entry in self.entries:
+                self.save(entry)
+
+    def jobs(self, machine):
+        """Running builds on the machine that have a scheduler job id"""
+        with self.lock:
+            return [e for e in self.entries if e.state == 'running'
+                    and e.machine == machine and e.job_id]
+
+    def running(self, pr, machine):
+        """Builds of the PR that are running on the machine"""
+        with self.lock:
+            return [e for e in self.entries if e.state == 'running'
+                    and e.pr == pr and e.machine == machine]
+
+    def branches(self, machine):
+        """PRs with builds queued or running on the machine"""
+        with self.lock:
+            return set(e.pr for e in self.entries if e.machine == machine)
+
+    def depth(self, machine=None, state='pending'):
+        with self.lock:
+            return len([e for e in self.entries if e.state == state
+                        and machine in (None, e.machine)])
@@ -0,0 +1,97 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pycicle_queue import BuildQueue, BASE_PRIORITY
+from pycicle_store import PycicleStore
+
+class BuildQueueTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.db_file = os.path.join(self.tmp, 'pycicle.db')
+        self.queue = BuildQueue(PycicleStore(self.db_file), max_running=2)
+
+    def test_deduplicate(self):
+        self.queue.add('12', 'fix', 'daint', 'gcc', 'sha1')
+        self.queue.add('12', 'fix', 'daint', 'gcc', 'sha1')
+        self.assertEqual(self.queue.depth(), 1)
+        # another compiler or machine is a separate build
+        self.queue.add('12', 'fix', 'daint', 'clang', 'sha1')
+        self.queue.add('12', 'fix', 'greina', 'gcc', 'sha1')
+        self.assertEqual(self.queue.depth(), 3)
+        self.queue.add('12', 'fix', 'daint', 'gcc', 'sha1', build_type='Debug')
+        self.assertEqual(self.queue.depth(), 4)
+
+    def test_one_build_per_pr_and_machine(self):
+        self.queue.add('master', 'master', 'daint', 'gcc', 'base', BASE_PRIORITY, build_type='Release')
+        self.queue.add('master', 'master', 'daint', 'gcc', 'base', BASE_PRIORITY, build_type='Debug')
+        self.queue.add('12', 'fix', 'daint', 'gcc', 'sha1')
+        # the second base build waits for the first, it shares the src tree
+        self.assertEqual([(e.pr, e.build_type) for e in self.queue.next_launches()],
+                         [('master', 'Release'), ('12', None)])
+        self.queue.finish('master', 'daint')
+        self.assertEqual([(e.pr, e.build_type) for e in self.queue.next_launches()],
+                         [('master', 'Debug')])
+
+    def test_supersede(self):
+        self.queue.add('12', 'fix', 'daint', 'gcc', 'sha1')
+        self.assertEqual(len(self.queue.next_launches()), 1)
+        self.queue.add('13', 'other', 'daint', 'gcc', 'shaX')
+        superseded = self.queue.add('12', 'fix', 'daint', 'clang', 'sha2')
+        # the running build of the old SHA must be cancelled by the caller
+        self.assertEqual([(e.sha, e.state) for e in superseded], [('sha1', 'running')])
+        superseded = self.queue.add('12', 'fix', 'daint', 'gcc', 'sha3')
+        self.assertEqual(superseded, [])
+        self.assertEqual(sorted((e.pr, e.sha) for e in self.queue.entries),
+                         [('12', 'sha3'), ('13', 'shaX')])
+
+    def test_priority_and_cap(self):
+        for pr in ['1', '2', '3']:
+            self.queue.add(pr, 'b', 'daint', 'gcc', 'sha' + pr)
+        self.queue.add('master', 'master', 'daint', 'gcc', 'base', BASE_PRIORITY)
+        self.queue.add('4', 'b', 'greina', 'gcc', 'sha4')
+        launched = [(e.pr, e.machine) for e in self.queue.next_launches()]
+        self.assertEqual(launched, [('master', 'daint'), ('1', 'daint'), ('4', 'greina')])
+        self.assertEqual(self.queue.next_launches(), [])
+        self.assertEqual([e.pr for e in self.queue.finish('1', 'daint')], ['1'])
+        self.assertEqual([e.pr for e in self.queue.next_launches()], ['2'])
+
+    def test_persistent(self):
+        self.queue.add('12', 'fix', 'daint', 'gcc', 'sha1')
+        self.queue.next_launches()
+        self.queue.add('13', 'fix', 'daint', 'gcc', 'sha2')
+        self.queue.add('14', 'fix', 'daint', None, 'sha3')
+        self.queue.add('14', 'fix', 'daint', None, 'sha4')
+        restored = BuildQueue(PycicleStore(self.db_file), max_running=2)
+        self.assertEqual(restored.depth(), 2)
+        self.assertEqual(restored.depth(state='running'), 1)
+        self.assertEqual(sorted((e.pr, e.sha) for e in restored.entries),
+                         [('12', 'sha1'), ('13', 'sha2'), ('14', 'sha4')])
+
+    def test_lost_builds_expire(self):
+        queue = BuildQueue(None, max_running=1, max_running_time=-1)
+        queue.add('12', 'fix', 'daint', 'gcc', 'sha1')
+        queue.add('13', 'fix', 'daint', 'gcc', 'sha2')
+        self.assertEqual(len(queue.next_launches()), 1)
+        # the first build never reported back, its slot is reused
+        self.assertEqual([e.pr for e in queue.next_launches()], ['13'])
+
+    def test_job_ids(self):
+        self.queue.add('12', 'fix', 'daint', 'gcc', 'sha1')
+        self.queue.add('13', 'fix', 'daint', 'gcc', 'sha2')
+        first, second = self.queue.next_launches()
+        self.queue.set_job_id(first, '101')
+        self.assertEqual(self.queue.jobs('daint'), [first])
+        self.assertEqual(self.queue.jobs('tave'), [])
+        restored = BuildQueue(PycicleStore(self.db_file), max_running=2)
+        self.assertEqual([e.job_id for e in restored.jobs('daint')], ['101'])
+        # superseded while it was submitted, it stays gone
+        self.queue.add('13', 'fix', 'daint', 'gcc', 'sha3')
+        self.queue.set_job_id(second, '102')
+        restored = BuildQueue(PycicleStore(self.db_file), max_running=2)
+        self.assertEqual([e.sha for e in restored.entries if e.pr == '13'], ['sha3'])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,1182 @@
+#  Copyright (c) 2019      Peter Doak
+#  Copyright (c) 2017-2019 John Biddiscombe
+#
+#  Distributed under the Boost Software License, Version 1.0. (See accompanying
+#  file LICENSE_1_0.txt or copy at http://www.boost.org/LICENSE_1_0.txt)
+#--------------------------------------------------------------------------
+# The pycicle runner.
+# Everything pycicle does is a task of the runner with its own interval
+# and timeout, run concurrently by asyncio
+#   github  : poll github (woken by webhooks), queue builds of changed PRs
+#   publish : send the queued statuses to github
+#   local   : collect the local builds that ended
+#   metrics : log a json summary of the metrics
+#   access  : refresh the logins allowed to build (--access-control)
+# and for each machine
+#   launch  : refresh the repository mirror and start queued builds
+#   jobs    : follow the slurm/pbs jobs of the machine
+#   stages  : wake the scrape while builds run, for their stage markers
+#   scrape  : collect build results and queue their github statuses
+#   cleanup : remove stale src/build trees, trim the ccache
+# so a slow machine or github only holds up its own tasks. Commands on the
+# machines are asyncio subprocesses, the github client (which blocks) is
+# called from worker threads.
+# Tasks wake each other when there is work, e.g. a job that ended wakes
+# the scrape of its machine, which wakes the launcher of the machine.
+#--------------------------------------------------------------------------
+from __future__ import absolute_import, division, print_function, unicode_literals
+import os
+import re
+import json
+import time
+import random
+import string
+import asyncio
+import concurrent.futures
+
+from pycicle_params import PycicleParamsHelper
+from pycicle_metrics import Metrics, MetricsServer
+from pycicle_webhook import WebhookListener
+from pycicle_transport import TransportPool, shell_command
+from pycicle_jobs import LocalBuildPool
+from pycicle_queue import BuildQueue, BASE_PRIORITY, PR_PRIORITY
+from pycicle_store import PycicleStore
+from pycicle_access import AccessResolver
+from pycicle_mirror import mirror_command, github_url, tree_command, parse_tree_output
+from pycicle_selection import load_test_selection, select_labels, label_regex
+from pycicle_matrix import cmake_list, build_matrix, next_combination
+from pycicle_cleanup import usage_command, parse_usage_output, plan_cleanup, remove_command
+from pycicle_scrape import scrape_command, erase_command, parse_scrape_output, stage_from_path
+from pycicle_summary import parse_result, result_statuses
+from pycicle_status import StatusPublisher
+from pycicle_scheduler import job_schedulers, parse_job_id, poll_command, parse_poll_output, cancel_command
+from pycicle_scheduler import array_task_ids, array_submit_command
+
+#--------------------------------------------------------------------------
+# A run that timed out stops waiting for its worker thread, but the thread
+# carries on, the next run is skipped until it has finished
+#--------------------------------------------------------------------------
+class TaskBusy(Exception):
+    pass
+
+#--------------------------------------------------------------------------
+# A coroutine run every interval seconds, or sooner when woken, and
+# abandoned when it takes longer than timeout seconds
+#--------------------------------------------------------------------------
+class PeriodicTask:
+    def __init__(self, name, func, interval, timeout, *args, **kwargs):
+        """kwargs : metrics, the Metrics the runs are timed in"""
+        self.name     = name
+        self.func     = func
+        self.args     = args
+        self.interval = interval
+        self.timeout  = timeout
+        self.metrics  = kwargs.get('metrics') or Metrics()
+        # task kind and machine, as metric labels
+        self.labels   = dict(zip(('task', 'machine'), name.split(' ', 1)))
+        self.wakeup   = asyncio.Event()
+        self.runs     = 0
+        self.failures = 0
+        self.duration = None
+
+    def wake(self):
+        self.wakeup.set()
+
+    async def run_once(self):
+        start = time.time()
+        try:
+            await asyncio.wait_for(self.func(*self.args), self.timeout)
+        except TaskBusy as ex:
+            self.metrics.inc('pycicle_task_skipped_total', **self.labels)
+            print('Task', self.name, 'skipped :', ex)
+        except asyncio.TimeoutError:
+            self.failures += 1
+            self.metrics.inc('pycicle_task_failures_total', reason='timeout', **self.labels)
+            print('Task', self.name, 'timed out after', self.timeout, '(s)')
+        except Exception as ex:
+            self.failures += 1
+            self.metrics.inc('pycicle_task_failures_total', reason='error', **self.labels)
+            print('Task', self.name, 'failed :', ex)
+        self.runs    += 1
+        self.duration = time.time() - start
+        self.metrics.observe('pycicle_task_seconds', self.duration, **self.labels)
+
+    async def run(self):
+        while True:
+            # a wake while running means there is more to do straight away
+            self.wakeup.clear()
+            await self.run_once()
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+
+class PycicleRunner:
+    # seconds between runs of each task, github/launch/jobs/stages use --poll-time
+    # and scrape/cleanup use --scrape-time
+    # and metrics uses --metrics-interval, access uses --access-ttl
+    intervals = {'github': 60, 'publish': 15, 'local': 10, 'metrics': 300, 'access': 3600,
+                 'launch': 60, 'jobs': 60, 'stages': 60, 'scrape': 600, 'cleanup': 600}
+    # seconds after which a run of the task is abandoned
+    timeouts  = {'github': 300, 'publish': 300, 'local': 60, 'metrics': 60, 'access': 300,
+                 'launch': 600, 'jobs': 120, 'stages': 60, 'scrape': 600, 'cleanup': 1200}
+
+    def __init__(self, args, params, github_client, org_login=None, default_branch=None,
+                 user_login=None, store=None, transports=None, local_builds=None,
+                 metrics=None, debug_print=PycicleParamsHelper.no_op):
+        """args           : parsed command line options
+        params         : PycicleParams giving the project/machine settings
+        github_client  : GithubClient of the repository
+        org_login      : github organisation (for access control), if any
+        default_branch : base branch when the project config has none
+        user_login     : github user when the project config has none
+        store, transports, local_builds : created from args when None
+        metrics        : Metrics shared with the github client, created when None
+        """
+        self.args          = args
+        self.params        = params
+        self.github_client = github_client
+        self.org_login     = org_login
+        self.debug_print   = debug_print
+        self.metrics       = metrics or Metrics()
+        project            = args.project
+
+        self.reponame      = params.get_setting_for_machine(project, project, 'PYCICLE_GITHUB_PROJECT_NAME')
+        self.organisation  = params.get_setting_for_machine(project, project, 'PYCICLE_GITHUB_ORGANISATION')
+        self.userlogin     = (params.get_setting_for_machine(project, project, 'PYCICLE_GITHUB_USER_LOGIN')
+                              or user_login)
+        self.base          = (params.get_setting_for_machine(project, project, 'PYCICLE_GITHUB_BASE_BRANCH')
+                              or default_branch)
+        self.cdash_server  = (args.cdash_server or
+                              params.get_setting_for_machine(project, project, 'PYCICLE_CDASH_SERVER_NAME'))
+        self.cdash_project = params.get_setting_for_machine(project, project, 'PYCICLE_CDASH_PROJECT_NAME')
+        self.cdash_method  = (params.get_setting_for_machine(project, project, 'PYCICLE_CDASH_DROP_METHOD')
+                              or 'http')
+        self.cdash_path    = params.get_setting_for_machine(project, project, 'PYCICLE_CDASH_HTTP_PATH')
+
+        # the machines every PR is built on
+        self.machines = args.machines
+        if not self.machines:
+            project_machines = params.get_setting_for_machine(project, project, 'PYCICLE_MACHINES')
+            self.machines = project_machines.split(';') if project_machines else ['greina']
+
+        # path -> test labels mapping used to test only what a PR changes
+        self.test_selection = load_test_selection(params.config_path)
+        if self.test_selection:
+            print('Test selection from', len(self.test_selection), 'path mappings')
+
+        # one (persistent) connection per build machine
+        self.transports = transports or TransportPool(debug_print=debug_print, metrics=self.metrics)
+        # builds on local machines run in the background, N at a time
+        self.local_builds = local_builds or LocalBuildPool(
+            args.local_jobs, os.path.join(args.pycicle_dir, 'logs'), debug_print)
+        # PR SHAs, build queue and published statuses survive restarts in one database
+        self.store = store or PycicleStore(os.path.join(args.pycicle_dir, 'pycicle.db'), debug_print)
+        # builds wait here until their machine has a free slot
+        self.build_queue = BuildQueue(self.store, args.max_jobs, debug_print=debug_print)
+        self.status_publisher = StatusPublisher(github_client, self.store.statuses(),
+                                                checks=args.checks, debug_print=debug_print)
+        # who may have their PRs built
+        self.access = None
+        if args.access_control:
+            self.access = AccessResolver(github_client, self.store, org_login, args.access_ttl,
+                                         self.metrics, debug_print)
+        # the blocking github calls
+        self.executor = concurrent.futures.ThreadPoolExecutor(4)
+        # the last worker thread of each blocking call, by name
+        self.threads  = {}
+
+        self.intervals = dict(self.intervals)
+        self.timeouts  = dict(self.timeouts)
+        for name in ('github', 'launch', 'jobs', 'stages'):
+            self.intervals[name] = args.poll_time
+        for name in ('scrape', 'cleanup'):
+            self.intervals[name] = args.scrape_time
+        self.intervals['metrics'] = args.metrics_interval
+        self.intervals['access']  = args.access_ttl
+        self.tasks = {}
+        self.loop  = None
+
+        # PRs known from the last full pass, at startup those of the previous run
+        # so that results which completed in the meantime are not thrown away
+        self.pr_list           = self.store.open_pull_requests()
+        self.first_pass        = True
+        self.force             = args.force
+        # true while github is still computing the mergeable state of some PR
+        self.mergeable_unknown = False
+        # PR builds queued by the current github pass, and whether some PRs
+        # were left for the next pass because of --cycle-budget
+        self.cycle_builds      = 0
+        self.budget_deferred   = False
+        # {branch_id: (sha, base_sha, machines)} of builds that could not be
+        # launched, the next full pass queues them again on those machines
+        self.failed_launches   = {}
+        self.github_checked    = 0
+        self.last_prune        = 0
+        # scheduler jobs that ended, by machine, finished by the next scrape
+        self.ended_jobs        = {}
+        # remote processes of direct builds, kept so they are reaped
+        self.background        = set()
+        self.webhooks          = None
+
+    def print_settings(self):
+        print('-' * 30)
+        print('PYCICLE_GITHUB_PROJECT_NAME  =', self.reponame)
+        if self.organisation:
+            print('PYCICLE_GITHUB_ORGANISATION  =', self.organisation)
+        else:
+            print('PYCICLE_GITHUB_USER_LOGIN  =', self.userlogin)
+        print('PYCICLE_GITHUB_BASE_BRANCH   =', self.base)
+        for nickname in self.machines:
+            print('PYCICLE_COMPILER_TYPE        =', nickname, self.setting(nickname, 'PYCICLE_COMPILER_TYPE'))
+        print('PYCICLE_CDASH_PROJECT_NAME   =', self.cdash_project)
+        print('PYCICLE_CDASH_SERVER_NAME    =', self.cdash_server)
+        print('PYCICLE_CDASH_HTTP_PATH      =', self.cdash_path)
+        print('-' * 30)
+
+    def setting(self, nickname, name):
+        return self.params.get_setting_for_machine(self.args.project, nickname, name)
+
+    #--------------------------------------------------------------------------
+    # the transport (ssh or local shell) used to run commands on a machine
+    #--------------------------------------------------------------------------
+    def machine_transport(self, nickname):
+        return self.transports.get(nickname, self.setting(nickname, 'PYCICLE_MACHINE'))
+
+    def in_thread(self, func, *args):
+        """Run a blocking call in a worker thread, raises TaskBusy while the
+        same call of a run that timed out is still going"""
+        name     = getattr(func, '__qualname__', repr(func))
+        previous = self.threads.get(name)
+        if previous is not None and not previous.done():
+            raise TaskBusy('{} of a previous run is still running'.format(name))
+        future = self.executor.submit(func, *args)
+        self.threads[name] = future
+        return asyncio.wrap_future(future)
+
+    #--------------------------------------------------------------------------
+    # tasks
+    #--------------------------------------------------------------------------
+    def add_task(self, kind, func, *args):
+        name = ' '.join((kind,) + args)
+        self.tasks[name] = PeriodicTask(name, func, self.intervals[kind], self.timeouts[kind], *args,
+                                        metrics=self.metrics)
+
+    def create_tasks(self):
+        self.tasks = {}
+        self.add_task('github', self.check_github)
+        self.add_task('publish', self.publish)
+        self.add_task('local', self.poll_local_builds)
+        if self.intervals['metrics']:
+            self.add_task('metrics', self.log_metrics)
+        if self.access:
+            self.add_task('access', self.refresh_access)
+        for nickname in self.machines:
+            if not self.args.scrape_only:
+                self.add_task('launch', self.launch_machine, nickname)
+                self.add_task('jobs', self.poll_jobs, nickname)
+                self.add_task('stages', self.poll_stages, nickname)
+            self.add_task('scrape', self.scrape_machine, nickname)
+            self.add_task('cleanup', self.cleanup_machine, nickname)
+
+    def wake(self, kind, nickname=None):
+        """Run a task now, may be called from any thread"""
+        task = self.tasks.get(kind if nickname is None else kind + ' ' + nickname)
+        if task is None or self.loop is None:
+            return
+        self.loop.call_soon_threadsafe(task.wake)
+
+    async def run(self):
+        """Run every task until cancelled"""
+        self.loop = asyncio.get_event_loop()
+        random.seed(7)
+        self.create_tasks()
+        if self.args.listen_port:
+            self.webhooks = WebhookListener(self.args.listen_port, self.base, self.args.webhook_secret,
+                                            on_event=lambda: self.wake('github'),
+                                            debug_print=self.debug_print)
+            self.webhooks.start()
+        metrics_server = None
+        if self.args.metrics_port:
+            metrics_server = MetricsServer(self.args.metrics_port, self.metrics)
+            metrics_server.start()
+        try:
+            await asyncio.gather(*[task.run() for task in self.tasks.values()])
+        finally:
+            if self.webhooks:
+                self.webhooks.stop()
+            if metrics_server:
+                metrics_server.stop()
+
+    async def run_once(self):
+        """One run of every task, one after the other"""
+        loop = asyncio.get_event_loop()
+        # the tasks (and their events) belong to one event loop
+        if not self.tasks or loop is not self.loop:
+            self.create_tasks()
+        self.loop = loop
+        for kind in ('access', 'github', 'launch', 'local', 'jobs', 'stages', 'scrape', 'cleanup', 'publish', 'metrics'):
+            for task in [t for t in self.tasks.values() if t.name.split()[0] == kind]:
+                await task.run_once()
+
+    #--------------------------------------------------------------------------
+    # access : fetch the logins allowed to build again once they are too old
+    #--------------------------------------------------------------------------
+    async def refresh_access(self):
+        if self.access.expired():
+            await self.in_thread(self.access.refresh)
+
+    #--------------------------------------------------------------------------
+    # github : find the PRs that changed and queue their builds
+    #--------------------------------------------------------------------------
+    async def check_github(self):
+        superseded = await self.in_thread(self.github_pass)
+        await self.cancel_builds(superseded)
+        for nickname in self.machines:
+            if self.build_queue.depth(nickname):
+                self.wake('launch', nickname)
+
+    def github_pass(self):
+        """Runs in a worker thread, returns the running builds that were superseded"""
+        now = time.time()
+        # with webhooks, github is polled only to reconcile missed events
+        # or when the base branch moved (which affects every PR)
+        event_prs, base_pushed = self.webhooks.take_events() if self.webhooks else (set(), False)
+        try:
+            return self.github_changes(now, event_prs, base_pushed)
+        except Exception:
+            # the events are handled by the next pass instead
+            if self.webhooks:
+                self.webhooks.requeue(event_prs, base_pushed)
+            raise
+
+    def github_changes(self, now, event_prs, base_pushed):
+        # a PR whose mergeable state github was still computing is looked at
+        # again by the next pass, not after --reconcile-time
+        poll = (not self.webhooks or base_pushed or self.first_pass or self.budget_deferred
+                or self.mergeable_unknown or self.failed_launches or now - self.github_checked >= self.args.reconcile_time)
+        if poll:
+            print('-' * 30)
+            print('Checking github:', 'Time since last check:', int(now - self.github_checked), '(s)')
+            print('-' * 30)
+            self.github_checked = now
+
+        # cheap conditional requests first, a 304 for both the base branch and
+        # the PR list means there is nothing new and the PR pass is skipped
+        force     = self.force
+        changed   = poll and (self.github_client.base_or_pulls_changed(self.base) or base_pushed)
+        full_pass = poll and (changed or force or self.first_pass or self.mergeable_unknown
+                              or self.budget_deferred or self.failed_launches)
+        superseded = []
+        self.cycle_builds = 0
+        if poll:
+            print('Github cache:', self.github_client.stats())
+        if not full_pass:
+            if poll:
+                print('No changes on github since last check')
+            # just the PRs that webhooks told us about
+            pr_list = self.pr_list
+            retry   = set()
+            for number in event_prs:
+                if self.args.pull_request==0 or number==self.args.pull_request:
+                    print('Webhook event for PR', number)
+                    base_sha, prs = self.github_client.get_pull_requests(self.base, number)
+                    for pr in prs:
+                        if pr.mergeable is None:
+                            print('PR', number, 'mergeable state unknown, retried next pass')
+                            retry.add(number)
+                        superseded += self.process_pull_request(pr, base_sha, force, pr_list)
+            if retry:
+                self.webhooks.requeue(retry)
+        else:
+            # one batched query gives the base SHA and the state of all open PRs
+            # (or just the one PR that was asked for)
+            if self.args.pull_request==0:
+                print("Getting open PR's for ", self.base)
+            base_sha, pull_requests = self.github_client.get_pull_requests(self.base, self.args.pull_request)
+            self.debug_print('Base branch', self.base, base_sha)
+            self.mergeable_unknown = any(pr.mergeable is None for pr in pull_requests)
+            self.first_pass = False
+            self.budget_deferred = False
+            # failed launches this pass did not queue again (closed PR, ...) are dropped
+            retried = set(self.failed_launches)
+            # filled before it replaces the current list, the scrapes keep using that
+            pr_list = {}
+            for pr in pull_requests:
+                superseded += self.process_pull_request(pr, base_sha, force, pr_list)
+            # also build the base branch if it has changed
+            if self.args.pull_request==0:
+                pr_list[self.base] = [self.base, base_sha]
+                self.store.set_pull_request(self.base, self.base, base_sha, base_sha)
+                # PRs that are no longer open
+                self.store.close_missing(pr_list)
+                if not self.args.scrape_only:
+                    if force or self.needs_update(self.base, self.base, base_sha, base_sha):
+                        superseded += self.dispatch_build(self.base, self.base, base_sha, BASE_PRIORITY,
+                                                          machines=self.retry_machines(self.base, base_sha,
+                                                                                       base_sha))
+            self.pr_list = pr_list
+            print("The Open PRs:")
+            print(pr_list)
+            for branch_id in retried:
+                self.failed_launches.pop(branch_id, None)
+            # the change is handled, a pass that failed sees it again
+            self.github_client.commit_etags()
+        # force option should only have effect on the first pass
+        self.force = False
+        return superseded
+
+    #--------------------------------------------------------------------------
+    # Check if a PR Needs and Update
+    #--------------------------------------------------------------------------
+    def needs_update(self, branch_id, branch_name, branch_sha, base_sha):
+        """True if the PR (or base branch) has changed since it was last built"""
+        self.debug_print("Begin : needs_update", branch_id, branch_sha, base_sha)
+        if not self.store.has_built(branch_id):
+            # SHAs recorded by older versions of pycicle in src/<project>-<PR>/last_pr_sha.txt
+            status_file = (self.args.pycicle_dir + '/src/' + self.args.project + '-' + branch_id +
+                           '/last_pr_sha.txt')
+            if os.path.exists(status_file):
+                with open(status_file, 'r') as f:
+                    lines = [l.strip() for l in f.readlines()]
+                if len(lines) > 1:
+                    self.store.needs_update(branch_id, branch_name, lines[0], lines[1])
+                os.remove(status_file)
+        update = self.store.needs_update(branch_id, branch_name, branch_sha, base_sha)
+        if update:
+            print(branch_id, branch_name, 'changed : trigger update')
+        return update
+
+    #--------------------------------------------------------------------------
+    # Record an open PR in pr_list and queue a build if it needs one
+    #--------------------------------------------------------------------------
+    def process_pull_request(self, pr, base_sha, force, pr_list):
+        """Returns the running builds superseded by the new build"""
+        # find out if the PR is from a local branch or from a clone of the repo
+        self.debug_print('-' * 30)
+        self.debug_print(pr)
+        self.debug_print('Repo to merge from   :', pr.owner)
+        self.debug_print('Branch to merge from :', pr.branch_name)
+        if pr.owner==self.organisation:
+            self.debug_print('Pull request is from branch local to repo')
+        else:
+            self.debug_print('Pull request is from branch of forked repo')
+        self.debug_print('git pull https://github.com/' + str(pr.owner)
+                         + '/' + self.reponame + '.git' + ' ' + pr.branch_name)
+        self.debug_print('-' * 30)
+
+        branch_id   = str(pr.number)
+        branch_name = pr.branch_name
+        branch_sha  = pr.head_sha
+        # keep the head SHA of the PR for setting status
+        pr_list[branch_id] = [branch_name, branch_sha]
+        self.store.set_pull_request(branch_id, branch_name, branch_sha, base_sha)
+        #
+        if not pr.mergeable or self.args.scrape_only:
+            return []
+        #
+        #minimal security, only if last commit by org members or owner is it updated or built.
+        # checked before needs_update, which records the SHA as built
+        commit_author = pr.author
+        if self.access and not self.access.allowed(commit_author, branch_sha):
+            if self.org_login:
+                print("{} is not a member of the organisation, PR will not be built.".format(commit_author))
+            else:
+                print("{} does not have push access, PR will not be built.".format(commit_author))
+            return []
+        # the budget of the pass is used up, the PR is looked at again next pass
+        budget = self.args.cycle_budget
+        if (budget and self.cycle_builds >= budget and not force
+                and not self.store.is_built(branch_id, branch_sha, base_sha)):
+            print('PR', branch_id, 'deferred, the budget of', budget, 'builds per cycle is used')
+            self.budget_deferred = True
+            return []
+        update = force or self.needs_update(branch_id, branch_name, branch_sha, base_sha)
+        # only the tests covering the changed files, when they are known
+        test_labels   = select_labels(self.test_selection, pr.files)
+        include_label = label_regex(test_labels) if test_labels else None
+        if test_labels:
+            print('PR', branch_id, 'tests limited to labels', test_labels)
+        if update:
+            return self.dispatch_build(branch_id, branch_name, branch_sha, include_label=include_label,
+                                       machines=self.retry_machines(branch_id, branch_sha, base_sha))
+        return []
+
+    #--------------------------------------------------------------------------
+    # queue a build of a PR on every machine (or just the given ones)
+    #--------------------------------------------------------------------------
+    def dispatch_build(self, branch_id, branch_name, sha, priority=PR_PRIORITY, include_label=None,
+                       machines=None):
+        superseded = []
+        for nickname in machines or self.machines:
+            superseded += self.choose_and_launch(nickname, branch_id, branch_name, sha,
+                                                 priority, include_label)
+        return superseded
+
+    def matrix(self, nickname):
+        """(compiler, build_type) combinations the machine builds"""
+        project = self.args.project
+        def setting(name):
+            return (self.setting(nickname, name) or
+                    self.params.get_setting_for_machine(project, project, name))
+        compilers   = (cmake_list(setting('PYCICLE_COMPILERS')) or
+                       [self.setting(nickname, 'PYCICLE_COMPILER_TYPE')])
+        build_types = (cmake_list(setting('PYCICLE_BUILD_TYPES')) or
+                       [self.setting(nickname, 'PYCICLE_BUILD_TYPE')])
+        return build_matrix(compilers, build_types)
+
+    #--------------------------------------------------------------------------
+    # queue one build from a list of options
+    #--------------------------------------------------------------------------
+    def choose_and_launch(self, machine, branch_id, branch_name, sha, priority, include_label=None):
+        """Queue the base branch with every combination of the machine matrix,
+        a PR with the next one it was not built with"""
+        self.debug_print("Begin : choose_and_launch", self.args.project, machine, branch_id, branch_name)
+        combinations = self.matrix(machine)
+        if branch_id == self.base:
+            chosen = combinations
+        else:
+            chosen = [next_combination(combinations, self.store.coverage(branch_id, machine), sha)]
+            self.cycle_builds += 1
+        superseded = []
+        for compiler_type, build_type in chosen:
+            self.store.add_coverage(branch_id, sha, machine, compiler_type, build_type)
+            superseded += self.build_queue.add(branch_id, branch_name, machine, compiler_type, sha, priority,
+                                               include_label, build_type)
+        return superseded
+
+    #--------------------------------------------------------------------------
+    # launch : start the queued builds of a machine when it has free slots
+    #--------------------------------------------------------------------------
+    async def launch_machine(self, nickname):
+        entries = self.build_queue.next_launches(nickname)
+        for entry in entries:
+            # time spent waiting for a slot, the github polling delay is not included
+            self.metrics.observe('pycicle_queue_wait_seconds', entry.started - entry.enqueued,
+                                 machine=nickname)
+        if entries:
+            # new SHAs must be in the mirror before the builds clone from it
+            await self.refresh_mirror(nickname)
+            if self.args.result_cache:
+                entries = await self.reuse_results(nickname, entries)
+        if entries:
+            if self.args.job_arrays and self.setting(nickname, 'PYCICLE_JOB_LAUNCH') in job_schedulers:
+                # one array per compiler and build type, the job script depends on them
+                arrays = {}
+                for entry in entries:
+                    arrays.setdefault((entry.compiler, entry.build_type), []).append(entry)
+                batches  = list(arrays.values())
+                launches = [self.launch_array(nickname, batch[0].compiler, batch[0].build_type, batch)
+                            for batch in batches]
+            else:
+                batches  = [[entry] for entry in entries]
+                launches = [self.launch_entry(entry) for entry in entries]
+            results = await asyncio.gather(*launches, return_exceptions=True)
+            for batch, result in zip(batches, results):
+                if isinstance(result, Exception):
+                    for entry in batch:
+                        print('Build launch failed :', entry, result)
+                        self.launch_failed(entry, result)
+        print('Build queue', nickname, ':', self.build_queue.depth(nickname), 'pending',
+              self.build_queue.depth(nickname, state='running'), 'running')
+        self.update_queue_metrics()
+
+    def launch_failed(self, entry, error):
+        """Free the slot of a build that could not be launched, and forget that
+        its SHA was built so that the next github pass queues it again
+        """
+        built = self.store.pull_request(entry.pr) or {}
+        self.build_queue.release(entry)
+        self.store.forget_build(entry.pr, entry.sha, entry.machine, entry.compiler, entry.build_type)
+        sha, base_sha, machines = self.failed_launches.get(entry.pr, (None, None, set()))
+        if sha != entry.sha:
+            machines = set()
+        self.failed_launches[entry.pr] = (entry.sha, built.get('built_base'), machines | {entry.machine})
+        self.metrics.inc('pycicle_launch_failures_total', machine=entry.machine)
+        self.publish_job_status(entry, 'failed', 'launch failed : {}'.format(error)[:140])
+        self.wake('publish')
+
+    def retry_machines(self, branch_id, sha, base_sha):
+        """The machines a build that could not be launched is queued on again, None for all"""
+        failed = self.failed_launches.pop(branch_id, None)
+        if failed and failed[:2] == (sha, base_sha):
+            return sorted(failed[2])
+        return None
+
+    def update_queue_metrics(self):
+        for nickname in self.machines:
+            for state in ('pending', 'running'):
+                self.metrics.set('pycicle_queue_builds', self.build_queue.depth(nickname, state=state),
+                                 machine=nickname, state=state)
+
+    #--------------------------------------------------------------------------
+    # builds whose merged tree was already tested on the machine (a rebase
+    # or force-push that changed nothing, the base branch after merging a
+    # PR) are not launched, the statuses of the tree are published again
+    #--------------------------------------------------------------------------
+    async def reuse_results(self, nickname, entries):
+        """Returns the entries that still have to be built"""
+        remote_path = self.setting(nickname, 'PYCICLE_ROOT')
+        cmd = tree_command(remote_path, self.reponame, self.base, [e.sha for e in entries])
+        try:
+            trees = parse_tree_output(await self.machine_transport(nickname).run_async(cmd))
+        except Exception as ex:
+            print('Merged trees on', nickname, 'failed', ex)
+            return entries
+        builds = []
+        for entry in entries:
+            tree   = trees.get(entry.sha)
+            cached = tree and self.store.cached_results(tree, nickname, entry.compiler, entry.build_type,
+                                                        entry.include_label)
+            self.metrics.inc('pycicle_result_cache_total', machine=nickname,
+                             result='hit' if cached else 'miss')
+            if not cached:
+                if tree:
+                    self.build_queue.set_tree(entry, tree)
+                builds.append(entry)
+                continue
+            print('Reusing the results of tree', tree[:10], 'for', entry)
+            self.build_queue.finish(entry.pr, nickname, entry.compiler)
+            if not self.args.debug:
+                for context, state, description, url in cached:
+                    self.status_publisher.add(entry.sha, context, state, description, url)
+            self.publish_job_status(entry, 'completed', 'results of tree {} reused'.format(tree[:10]))
+        if len(builds) < len(entries):
+            self.wake('publish')
+            # the slots of the reused builds are free again
+            self.wake('launch', nickname)
+        return builds
+
+    async def launch_entry(self, entry):
+        job_id = await self.launch_build(entry.machine, entry.compiler, entry.pr, entry.branch_name,
+                                         entry.include_label, entry.build_type)
+        if job_id:
+            self.build_queue.set_job_id(entry, job_id)
+            self.publish_job_status(entry, 'pending')
+            self.wake('publish')
+
+    async def launch_array(self, nickname, compiler_type, build_type, entries):
+        """Submit the builds as one slurm/pbs job array, with a single remote command"""
+        transport    = self.machine_transport(nickname)
+        pycicle_path = self.setting(nickname, 'PYCICLE_ROOT')
+        job_type     = self.setting(nickname, 'PYCICLE_JOB_LAUNCH')
+        tasks_file   = '{}/arrays/{}-{}-{}.txt'.format(pycicle_path, self.args.project, nickname,
+                                                       random_string(10))
+        # the arguments of a task (one line of the task file) follow the shared ones
+        tasks = []
+        for entry in entries:
+            task = ['-DPYCICLE_PR='     + entry.pr,
+                    '-DPYCICLE_BRANCH=' + entry.branch_name,
+                    '-DPYCICLE_RANDOM=' + random_string(10)]
+            if entry.include_label:
+                task = task + ['-DPYCICLE_TEST_INCLUDE_LABEL=' + entry.include_label]
+            tasks.append(task)
+        cmd = ['ctest', '-S', pycicle_path + '/pycicle/dashboard_array.cmake']
+        cmd = cmd + self.ctest_arguments(nickname, compiler_type, 'array', 'array', build_type=build_type)
+        cmd = cmd + ['-DPYCICLE_JOB_LAUNCH=' + job_type,
+                     '-DPYCICLE_ARRAY_FILE=' + tasks_file,
+                     '-DPYCICLE_ARRAY_SIZE=' + str(len(entries))]
+        cmd = shell_command(cmd)
+        if self.args.pre_ctest_commands:
+            cmd = self.args.pre_ctest_commands + ' ' + cmd
+        cmd = array_submit_command(tasks_file, tasks, cmd + ' 2>&1')
+
+        if self.args.debug:
+            print('\n' + '-' * 20, 'Debug\n', cmd)
+            return
+        print('\n' + '-' * 20, 'Executing\n', cmd, '\n')
+        array_id = parse_job_id(await transport.run_async(cmd))
+        if not array_id:
+            raise RuntimeError('no job id for the {} job array'.format(job_type))
+        print('Submitted', job_type, 'job array', array_id, 'of', len(entries), 'builds')
+        print('-' * 20 + '\n')
+        for entry, job_id in zip(entries, array_task_ids(job_type, array_id, len(entries))):
+            self.build_queue.set_job_id(entry, job_id)
+            self.publish_job_status(entry, 'pending')
+        self.wake('publish')
+
+    async def refresh_mirror(self, nickname):
+        remote_path = self.setting(nickname, 'PYCICLE_ROOT')
+        url = github_url(self.reponame, self.organisation, self.userlogin)
+        try:
+            await self.machine_transport(nickname).run_async(mirror_command(remote_path, self.reponame, url))
+        except Exception as ex:
+            print('Updating the repository mirror on', nickname, 'failed', ex)
+
+    def ctest_arguments(self, nickname, compiler_type, branch_id, branch_name, include_label=None,
+                        build_type=None):
+        """The -D options of the dashboard scripts for a build"""
+        args         = self.args
+        transport    = self.machine_transport(nickname)
+        pycicle_path = self.setting(nickname, 'PYCICLE_ROOT')
+        # we are not yet using these as 'options'
+        boost = 'x.xx.x'
+
+        if transport.is_local:
+            # if we're local we assume the current context has the module setup
+            self.debug_print( "Local build working in:", os.getcwd())
+            config_path = self.params.config_path
+        else:
+            config_path = pycicle_path + self.params.remote_config_path
+
+        build_type = build_type or self.setting(nickname, 'PYCICLE_BUILD_TYPE')
+
+        cmd = []
+        if self.organisation:
+           cmd = cmd + [ '-DPYCICLE_GITHUB_ORGANISATION=' + self.organisation ]
+        if self.userlogin:
+           cmd = cmd + [ '-DPYCICLE_GITHUB_USER_LOGIN=' + self.userlogin ]
+
+        cmd = cmd + [ '-DPYCICLE_ROOT='                + pycicle_path,
+                      '-DPYCICLE_HOST='                + nickname,
+                      '-DPYCICLE_PROJECT_NAME='        + args.project,
+                      '-DPYCICLE_CONFIG_PATH='         + config_path,
+                      '-DPYCICLE_GITHUB_PROJECT_NAME=' + self.reponame,
+                      '-DPYCICLE_PR='                  + branch_id,
+                      '-DPYCICLE_BRANCH='              + branch_name,
+                      '-DPYCICLE_RANDOM='              + random_string(10),
+                      '-DPYCICLE_COMPILER_TYPE='       + str(compiler_type),
+                      '-DPYCICLE_BOOST='               + boost,
+                      '-DPYCICLE_BUILD_TYPE='          + str(build_type),
+                      '-DPYCICLE_BASE='                + self.base,
+                      '-DPYCICLE_INCREMENTAL='         + ('ON' if args.incremental else 'OFF'),
+                      '-DPYCICLE_FAIL_FAST='           + ('ON' if args.fail_fast else 'OFF'),
+                      # These are to quiet warnings from ctest about unset vars
+                      '-DCTEST_SOURCE_DIRECTORY=.',
+                      '-DCTEST_BINARY_DIRECTORY=.',
+                      '-DCTEST_COMMAND=:' ]
+
+        if include_label:
+            cmd = cmd + [ '-DPYCICLE_TEST_INCLUDE_LABEL=' + include_label ]
+        return cmd
+
+    async def launch_build(self, nickname, compiler_type, branch_id, branch_name, include_label=None,
+                           build_type=None):
+        """ Calls the dashboard script, possibly remotely
+            include_label: CTest label regex of the tests to run, None for all
+            build_type   : CMake build type, PYCICLE_BUILD_TYPE of the machine when None
+            returns the scheduler job id of slurm/pbs builds
+        """
+        args         = self.args
+        transport    = self.machine_transport(nickname)
+        pycicle_path = self.setting(nickname, 'PYCICLE_ROOT')
+        job_type     = self.setting(nickname, 'PYCICLE_JOB_LAUNCH')
+        self.debug_print('launching build', compiler_type, branch_id, branch_name, job_type)
+
+        # This is a clumsy way to do this.
+        # implies local default, should be explicit somewhere
+        if job_type=='slurm':
+            self.debug_print("slurm build:", args.project)
+            script = 'dashboard_slurm.cmake'
+        elif job_type=='pbs':
+            self.debug_print("pbs build:", args.project)
+            script = 'dashboard_pbs.cmake'
+        else:
+            self.debug_print("direct build:", args.project)
+            script = 'dashboard_script.cmake'
+
+        cmd = ['ctest', '-S', pycicle_path  + '/pycicle/' + script]
+        cmd = cmd + self.ctest_arguments(nickname, compiler_type, branch_id, branch_name, include_label,
+                                         build_type)
+
+        cmd = shell_command(cmd)
+        # We may need to setup the environment on the build machine,
+        # often even cmake comes from a module or the like.
+        if args.pre_ctest_commands:
+            cmd = args.pre_ctest_commands + ' ' + cmd
+
+        if args.debug:
+            print('\n' + '-' * 20, 'Debug\n', cmd)
+            debug_out = await transport.run_async(cmd, merge_stderr=True)
+            print('-' * 20 + '\n')
+            print(debug_out)
+            return None
+
+        print('\n' + '-' * 20, 'Executing\n', cmd, '\n')
+        if job_type in job_schedulers:
+            # submission returns straight away, with the job id in the output
+            output = await transport.run_async(cmd + ' 2>&1')
+            job_id = parse_job_id(output)
+            if not job_id:
+                raise RuntimeError('no job id from the {} submission : {}'.format(
+                    job_type, output.decode('utf-8', 'replace').strip()[-200:]))
+            print('Submitted', job_type, 'job', job_id)
+            print('-' * 20 + '\n')
+            return job_id
+        # local builds run in the background pool, output goes to a log file
+        if transport.is_local:
+            self.local_builds.submit(self.local_build_name(branch_id, nickname, compiler_type, build_type),
+                                     transport, cmd, tag=(branch_id, nickname, compiler_type))
+        else:
+            process = await transport.start_async(cmd)
+            reaper  = asyncio.ensure_future(process.wait())
+            self.background.add(reaper)
+            reaper.add_done_callback(self.background.discard)
+        print('-' * 20 + '\n')
+        return None
+
+    #--------------------------------------------------------------------------
+    # stop a build that has been superseded by a newer commit
+    #--------------------------------------------------------------------------
+    def local_build_name(self, branch_id, nickname, compiler_type, build_type):
+        return '-'.join([self.args.project, branch_id, nickname] +
+                        [str(c) for c in (compiler_type, build_type) if c])
+
+    async def cancel_builds(self, entries):
+        """Cancel superseded builds, the slurm/pbs jobs of a machine with one command"""
+        jobs = {}
+        for entry in entries:
+            if self.setting(entry.machine, 'PYCICLE_JOB_LAUNCH') in job_schedulers and entry.job_id:
+                jobs.setdefault(entry.machine, []).append(entry)
+                continue
+            try:
+                await self.cancel_build(entry)
+            except Exception as ex:
+                print('Cancelling', entry, 'failed', ex)
+        for nickname, batch in jobs.items():
+            print('Cancelling superseded builds', batch)
+            cmd = cancel_command(self.setting(nickname, 'PYCICLE_JOB_LAUNCH'), [e.job_id for e in batch])
+            if self.args.debug:
+                print('Debug cancel', cmd)
+                continue
+            try:
+                await self.machine_transport(nickname).run_async(cmd + ' > /dev/null 2>&1; true')
+            except Exception as ex:
+                print('Cancelling', batch, 'failed', ex)
+
+    async def cancel_build(self, entry):
+        transport = self.machine_transport(entry.machine)
+        job_type  = self.setting(entry.machine, 'PYCICLE_JOB_LAUNCH')
+        print('Cancelling superseded build', entry)
+        if transport.is_local and job_type not in job_schedulers:
+            self.local_builds.cancel(self.local_build_name(entry.pr, entry.machine, entry.compiler,
+                                                           entry.build_type))
+            return
+        if job_type in job_schedulers and entry.job_id:
+            if self.args.debug:
+                print('Debug cancel', cancel_command(job_type, [entry.job_id]))
+            else:
+                await transport.run_async(cancel_command(job_type, [entry.job_id]) + ' > /dev/null 2>&1; true')
+            return
+        # scheduler jobs are named <project>-<PR>-<build stamp> by the job templates
+        prefix = (self.args.project + '-' + entry.pr + '-').lower()
+        if job_type == 'slurm':
+            cmd = ("squeue -h -u $USER -o '%A %j' | "
+                   "awk -v p={} 'index(tolower($2), p) == 1 {{print $1}}' | xargs -r scancel")
+        elif job_type == 'pbs':
+            cmd = ("for id in $(qselect -u $USER); do "
+                   "qstat -f $id | awk -v p={} '$1 == \"Job_Name\" && index(tolower($3), p) == 1 {{f=1}} "
+                   "END {{exit !f}}' && qdel $id; done")
+        else:
+            # a direct build on a remote machine can not be stopped
+            return
+        if self.args.debug:
+            print('Debug cancel', cmd.format(shell_command([prefix])))
+        else:
+            await transport.run_async(cmd.format(shell_command([prefix])))
+
+    #--------------------------------------------------------------------------
+    # local : builds in the local pool that ended, their results are scraped
+    #--------------------------------------------------------------------------
+    async def poll_local_builds(self):
+        for build in self.local_builds.poll():
+            print('Local build', build.name, build.state, 'log in', build.log_file)
+            if build.state != 'cancelled':
+                branch_id, nickname, compiler = build.tag
+                self.build_queue.finish(branch_id, nickname, compiler)
+                self.wake('scrape', nickname)
+                self.wake('launch', nickname)
+
+    #--------------------------------------------------------------------------
+    # github status of the scheduler job of a build, next to its results
+    #--------------------------------------------------------------------------
+    job_descriptions = {
+        'pending'   : 'job {} queued',
+        'running'   : 'job {} running',
+        'completed' : 'job {} completed',
+        'failed'    : 'job {} failed',
+    }
+
+    def publish_job_status(self, entry, state, description=None):
+        if self.args.debug or not entry.sha:
+            return
+        github_state = {'pending': 'pending', 'running': 'pending',
+                        'completed': 'success', 'failed': 'error'}[state]
+        origin = '-'.join(str(c) for c in (entry.machine, entry.compiler, entry.build_type) if c)
+        self.status_publisher.add(entry.sha, 'pycicle {} job'.format(origin),
+                                  github_state,
+                                  description or self.job_descriptions[state].format(entry.job_id), None)
+
+    #--------------------------------------------------------------------------
+    # jobs : ask the scheduler about all jobs of a machine in one go, the
+    # results of jobs that ended are scraped straight away
+    #--------------------------------------------------------------------------
+    async def poll_jobs(self, nickname):
+        jobs = self.build_queue.jobs(nickname)
+        if not jobs:
+            return
+        job_type = self.setting(nickname, 'PYCICLE_JOB_LAUNCH')
+        if job_type not in job_schedulers:
+            return
+        job_ids = [e.job_id for e in jobs]
+        output  = await self.machine_transport(nickname).run_async(poll_command(job_type, job_ids))
+        states  = parse_poll_output(job_type, output, job_ids)
+        self.debug_print(nickname, 'jobs', states)
+        ended   = []
+        for entry in jobs:
+            # the scheduler did not say, the job is looked at again next poll
+            state = states.get(entry.job_id)
+            if state is None:
+                continue
+            self.publish_job_status(entry, state)
+            if state in ('completed', 'failed'):
+                ended.append(entry)
+        self.wake('publish')
+        if ended:
+            print(nickname, 'jobs ended', [e.job_id for e in ended])
+            self.ended_jobs.setdefault(nickname, []).extend(ended)
+            self.wake('scrape', nickname)
+
+    #--------------------------------------------------------------------------
+    # stages : while builds are running on a machine, scrape it every poll
+    # so that the result of each stage is published as soon as it is known
+    #--------------------------------------------------------------------------
+    async def poll_stages(self, nickname):
+        if self.build_queue.depth(nickname, 'running'):
+            self.wake('scrape', nickname)
+
+    #--------------------------------------------------------------------------
+    # scrape : all finished builds of one machine, their github statuses
+    # are queued for the publish task, and the stages finished by running
+    # builds
+    #--------------------------------------------------------------------------
+    async def scrape_machine(self, nickname):
+        # jobs known to have ended before the results are looked for
+        ended       = self.ended_jobs.pop(nickname, [])
+        transport   = self.machine_transport(nickname)
+        scraped     = await self.find_scrape_files(nickname)
+        builds_done = [b for b in scraped if not stage_from_path(b.path)]
+        print(nickname, 'scrape files for PRs', [b.branch_id for b in builds_done])
+        done_files  = self.scrape_stages(nickname, scraped, builds_done)
+        for build in builds_done:
+            # a late result of a superseded job must not finish the newer
+            # build, nor be published or cached as its result
+            if not self.expected_result(nickname, build):
+                done_files.append(build.path)
+                continue
+            # a result means the build is no longer in flight
+            finished = self.build_queue.finish(build.branch_id, nickname)
+            for entry in finished:
+                self.metrics.observe('pycicle_launch_to_status_seconds', time.time() - entry.started,
+                                     machine=nickname)
+            if build.branch_id in self.pr_list:
+                branch_id = build.branch_id
+                # the status goes to the commit that was built, if still known
+                head_sha  = finished[0].sha if finished else self.pr_list[branch_id][1]
+                if self.scrape_testing_results(nickname, build.path, build.content, branch_id,
+                                               self.pr_list[branch_id][0], head_sha,
+                                               finished[0] if finished else None):
+                    done_files.append(build.path)
+            else:
+                # just delete the file, it is probably an old one
+                done_files.append(build.path)
+        await self.erase_files(transport, done_files)
+        # jobs that ended without leaving a result
+        for entry in ended:
+            if self.build_queue.finish(entry.pr, entry.machine, entry.compiler):
+                self.publish_job_status(entry, 'failed', 'job {} ended without results'.format(entry.job_id))
+        if builds_done or ended:
+            self.wake('publish')
+            self.wake('launch', nickname)
+
+    def scrape_stages(self, nickname, scraped, builds_done):
+        """Queue the statuses of the stage markers, returns the markers to erase"""
+        finished = set(b.path.rsplit('/', 1)[0] for b in builds_done)
+        done_files = []
+        for build in scraped:
+            if not stage_from_path(build.path):
+                continue
+            # the final result of the same build supersedes it, and the
+            # marker of a build that is no longer running is just deleted
+            branch_id = build.branch_id
+            running   = self.build_queue.running(branch_id, nickname)
+            if (build.path.rsplit('/', 1)[0] not in finished and running and
+                    branch_id in self.pr_list and self.expected_result(nickname, build)):
+                print(nickname, 'PR', branch_id, stage_from_path(build.path), 'finished')
+                if not self.scrape_testing_results(nickname, build.path, build.content, branch_id,
+                                                   self.pr_list[branch_id][0], running[0].sha):
+                    continue
+            done_files.append(build.path)
+        if done_files:
+            self.wake('publish')
+        return done_files
+
+    def expected_result(self, nickname, build):
+        """False when the result was built from another commit than the one
+        the PR is being built (or was last seen) at
+        """
+        try:
+            built = parse_result(build.content).get('sha')
+        except Exception:
+            built = None
+        # results of dashboard scripts that do not record the SHA are trusted
+        if not built:
+            return True
+        expected = [e.sha for e in self.build_queue.running(build.branch_id, nickname)]
+        if not expected and build.branch_id in self.pr_list:
+            expected = [self.pr_list[build.branch_id][1]]
+        if expected and built not in expected:
+            print(nickname, 'result of', built[:8], 'for PR', build.branch_id,
+                  'is not from the current build', expected[0][:8], ', dropped')
+            return False
+        return True
+
+    async def find_scrape_files(self, nickname):
+        """The path and contents of every result file, with a single command on the machine"""
+        transport   = self.machine_transport(nickname)
+        remote_path = self.setting(nickname, 'PYCICLE_ROOT')
+        print("Scraping in {}/build/".format(remote_path))
+        try:
+            output = await transport.run_async(scrape_command(remote_path, self.args.project))
+        except Exception as e:
+            print("Exception", e, " : "
+                "find_scrape_files failed for {}".format(nickname))
+            return []
+        results = parse_scrape_output(output, self.args.project, self.base)
+        for result in results:
+            self.debug_print('#'*5, result.path, 'gives PR:', result.branch_id)
+        return results
+
+    async def erase_files(self, transport, files):
+        # erase the pycicle scrape files once we have set status corectly
+        if not files:
+            return
+        try:
+            await transport.run_async(erase_command(files))
+            print('Files removed', files)
+        except Exception as ex:
+            print('File deletion failed', ex)
+
+    def scrape_testing_results(self, nickname, scrape_file, content, branch_id, branch_name, head_sha,
+                               entry=None):
+        """Queue the github statuses from the scrape_file contents, True when done
+        entry : the build the results are from, they are cached against its merged tree
+                when the dashboard built that same tree
+        """
+        context = re.search(r'/build/'+self.args.project+r'-.+?-(.+)/pycicle-[^/]+\.txt', scrape_file)
+        if context:
+            origin = nickname + '-' + context.group(1)
+        else:
+            origin = 'unknown'
+
+        try:
+            summary = parse_result(content)
+            print('Config/Build/Test results are', summary)
+
+            URL = None
+            if summary.get('build_id'):
+                URL = '{}://{}/{}/buildSummary.php?buildid={}'.format(
+                    self.cdash_method, self.cdash_server, self.cdash_path, summary['build_id'])
+            elif summary.get('tag'):
+                DateStamp = summary['tag']
+                DateURL   = DateStamp[0:4]+'-'+DateStamp[4:6]+'-'+DateStamp[6:8]
+                print('Extracted date as', DateURL)
+
+                URL = ('{}://{}/{}/index.php?project='.format(self.cdash_method, self.cdash_server,
+                                                              self.cdash_path) + self.cdash_project +
+                       '&date=' + DateURL +
+                       '&filtercount=1' +
+                       '&field1=buildname/string&compare1=63&value1=' +
+                       branch_id + '-' + branch_name)
+            if URL:
+                print("URL:", URL)
+                if self.args.debug:
+                    print('Debug github PR status', URL)
+                else:
+                    statuses = [('pycicle ' + origin + ' ' + stage, state, description, URL)
+                                for stage, state, description in result_statuses(summary)]
+                    for status in statuses:
+                        self.status_publisher.add(head_sha, *status)
+                    print('Queued github PR status for', origin)
+                    if entry is not None and entry.tree and summary.get('tree') == entry.tree:
+                        self.store.cache_results(entry.tree, nickname, entry.compiler, entry.build_type,
+                                                 entry.include_label, statuses)
+
+            print('-' * 30)
+            return True
+
+        except Exception as ex:
+            print('Scrape failed for PR', branch_id, ex)
+            return False
+
+    #--------------------------------------------------------------------------
+    # publish : statuses of all machines go to github together
+    #--------------------------------------------------------------------------
+    async def publish(self):
+        sent = await self.in_thread(self.status_publisher.publish)
+        self.metrics.inc('pycicle_statuses_published_total', sent)
+        if time.time() - self.last_prune > self.intervals['scrape']:
+            self.last_prune = time.time()
+            self.store.prune(30)
+
+    #--------------------------------------------------------------------------
+    # metrics : a one line json summary in the log
+    #--------------------------------------------------------------------------
+    async def log_metrics(self):
+        self.update_queue_metrics()
+        print('Metrics', json.dumps(self.metrics.summary(), sort_keys=True))
+
+    #--------------------------------------------------------------------------
+    # cleanup : delete src/build trees of a machine that are no longer needed
+    # and shrink its ccache directories
+    #--------------------------------------------------------------------------
+    async def cleanup_machine(self, nickname):
+        args        = self.args
+        transport   = self.machine_transport(nickname)
+        remote_path = self.setting(nickname, 'PYCICLE_ROOT')
+        try:
+            trees = parse_usage_output(await transport.run_async(usage_command(remote_path, args.project)),
+                                       args.project, self.base)
+        except Exception as ex:
+            print('Disk usage failed for', nickname, ex)
+            trees = None
+        if trees is not None:
+            # trees that a queued or running build is going to use
+            in_flight = self.build_queue.branches(nickname)
+            # open PRs go after closed ones when over the budget, and in incremental
+            # mode their trees are kept as they are reused by the next push
+            evict     = plan_cleanup(trees, in_flight, set(self.pr_list), args.disk_budget,
+                                     args.max_age * 24 * 3600, keep_open=args.incremental)
+            print('{} : {} trees using {:.1f} GB, removing {}'.format(
+                nickname, len(trees), sum(t.size for t in trees) / 2.0**30, len(evict)))
+            for tree in evict:
+                print('Deleting old/stale directory : ', tree.path)
+            if evict:
+                try:
+                    await transport.run_async(remove_command(remote_path, [t.path for t in evict]))
+                except Exception as ex:
+                    print('Cleanup failed for ', nickname, ex)
+        if args.incremental:
+            await self.trim_ccache(nickname)
+
+    async def trim_ccache(self, nickname):
+        """Shrink the ccache directories of a machine to --ccache-size,
+        least recently used files are evicted first"""
+        transport   = self.machine_transport(nickname)
+        remote_path = self.setting(nickname, 'PYCICLE_ROOT')
+        cmd = ('for d in {}/ccache/*/; do [ -d "$d" ] && CCACHE_DIR="$d" ccache -M {} -c > /dev/null; done; true'
+               .format(shell_command([remote_path]), shell_command([self.args.ccache_size])))
+        if self.args.pre_ctest_commands:
+            # ccache may come from the same modules as cmake
+            cmd = self.args.pre_ctest_commands + ' ' + cmd
+        try:
+            await transport.run_async(cmd)
+        except Exception as ex:
+            print('ccache cleanup failed for', nickname, ex)
+
+#--------------------------------------------------------------------------
+# random string of N chars
+#--------------------------------------------------------------------------
+def random_string(N):
+    return ''.join(random.choice(string.ascii_uppercase + string.digits)
+        for _ in range(N))
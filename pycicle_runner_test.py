@@ -0,0 +1,462 @@
+import os
+import re
+import json
+import stat
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import threading
+import unittest
+
+from pycicle_github import GithubClient, PullRequestInfo
+from pycicle_params import PycicleParams
+from pycicle_runner import PycicleRunner, PeriodicTask
+from pycicle_store import PycicleStore
+from pycicle_queue import BuildEntry
+from pycicle_webhook import WebhookListener
+
+class FakeGithub(GithubClient):
+    """Open PRs from a list, status requests are recorded"""
+    def __init__(self, base_sha, pull_requests):
+        GithubClient.__init__(self, 'token', 'org/proj')
+        self.base_sha      = base_sha
+        self.pull_requests = pull_requests
+        self.lock          = threading.Lock()
+        self.requests      = []
+
+    def base_or_pulls_changed(self, base):
+        return True
+
+    def get_pull_requests(self, base, number=0):
+        return self.base_sha, [pr for pr in self.pull_requests if number in (0, pr.number)]
+
+    def request(self, method, path, data=None, headers=None):
+        with self.lock:
+            self.requests.append((method, path, data))
+        return 201, {}, {}
+
+    def statuses(self):
+        return dict(((p.rsplit('/', 1)[-1], d['context']), (d['state'], d['description']))
+                    for m, p, d in self.requests if '/statuses/' in p)
+
+class EtagGithub(FakeGithub):
+    """Answers the conditional requests like github, with an ETag per path"""
+    base_or_pulls_changed = GithubClient.base_or_pulls_changed
+
+    def __init__(self, base_sha, pull_requests):
+        FakeGithub.__init__(self, base_sha, pull_requests)
+        self.server_etags = {}
+        self.fail         = False
+
+    def get_pull_requests(self, base, number=0):
+        if self.fail:
+            raise RuntimeError('github is down')
+        return FakeGithub.get_pull_requests(self, base, number)
+
+    def request(self, method, path, data=None, headers=None):
+        if method == 'GET':
+            etag = self.server_etags.setdefault(path, '"1"')
+            if headers.get('If-None-Match') == etag:
+                return 304, {}, None
+            return 200, {'ETag': etag}, []
+        return FakeGithub.request(self, method, path, data, headers)
+
+# submitting prints a job id made from the PR, the scheduler knows the
+# jobs have ended, the base branch job failed, ctest/scancel calls are logged
+fake_bin = {
+    'ctest': '''#!/bin/bash
+printf '%s\\n' "$*" >> $(dirname $0)/calls.log
+for a in "$@"; do case $a in -DPYCICLE_PR=*) pr=${a#-DPYCICLE_PR=} ;; esac; done
+echo "PYCICLE_JOB_ID=job-$pr"
+''',
+    'scancel': '''#!/bin/bash
+printf 'scancel %s\\n' "$*" >> $(dirname $0)/calls.log
+''',
+    'squeue': '#!/bin/bash\n',
+    'sacct':  '''#!/bin/bash
+printf 'job-12|COMPLETED\\njob-master|FAILED\\n'
+''',
+    'git': '#!/bin/bash\n',
+}
+
+def make_args(config_path, pycicle_dir, **kwargs):
+    args = argparse.Namespace(
+        project='proj', config_path=config_path, pycicle_dir=pycicle_dir, machines=[],
+        debug=False, force=False, access_control=False, pull_request=0, scrape_only=False,
+        pre_ctest_commands=None, local_jobs=1, max_jobs=10, cdash_server=None, checks=False,
+        incremental=False, ccache_size='20G', disk_budget=None, max_age=1,
+        fail_fast=False, result_cache=True,
+        job_arrays=False, cycle_budget=0, listen_port=0, reconcile_time=900, webhook_secret=None,
+        poll_time=60, scrape_time=600,
+        metrics_port=0, metrics_interval=300, access_ttl=3600)
+    for key, value in kwargs.items():
+        setattr(args, key, value)
+    return args
+
+class PeriodicTaskTestCase(unittest.TestCase):
+    def test_timeout_and_wake(self):
+        calls = []
+        async def work(delay):
+            calls.append(delay)
+            await asyncio.sleep(delay)
+
+        async def scenario():
+            slow = PeriodicTask('slow', work, 3600, 0.05, 10)
+            await slow.run_once()
+            self.assertEqual((slow.runs, slow.failures), (1, 1))
+            # a long interval, but woken twice
+            fast = PeriodicTask('fast', work, 3600, 1, 0)
+            runner = asyncio.ensure_future(fast.run())
+            for _ in range(2):
+                await asyncio.sleep(0.05)
+                fast.wake()
+            await asyncio.sleep(0.05)
+            runner.cancel()
+            self.assertEqual(fast.runs, 3)
+            self.assertEqual(fast.failures, 0)
+
+        asyncio.run(scenario())
+        self.assertEqual(calls, [10, 0, 0, 0])
+
+class PycicleRunnerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.root   = os.path.join(self.tmp, 'root')
+        config_path = os.path.join(self.tmp, 'config')
+        bin_path    = os.path.join(self.tmp, 'bin')
+        for path in [self.root, config_path, bin_path]:
+            os.makedirs(path)
+        with open(os.path.join(config_path, 'proj.cmake'), 'w') as f:
+            f.write('set(PYCICLE_GITHUB_PROJECT_NAME "proj")\n'
+                    'set(PYCICLE_GITHUB_ORGANISATION "org")\n'
+                    'set(PYCICLE_GITHUB_BASE_BRANCH "master")\n'
+                    'set(PYCICLE_CDASH_SERVER_NAME "cdash.example.org")\n'
+                    'set(PYCICLE_CDASH_PROJECT_NAME "proj")\n'
+                    'set(PYCICLE_CDASH_HTTP_PATH "cdash")\n'
+                    'set(PYCICLE_MACHINES "cluster")\n')
+        with open(os.path.join(config_path, 'cluster.cmake'), 'w') as f:
+            f.write('set(PYCICLE_MACHINE "local")\n'
+                    'set(PYCICLE_ROOT "{}")\n'
+                    'set(PYCICLE_JOB_LAUNCH "slurm")\n'
+                    'set(PYCICLE_COMPILER_TYPE "gcc")\n'
+                    'set(PYCICLE_BUILD_TYPE "Release")\n'.format(self.root))
+        for name, script in fake_bin.items():
+            path = os.path.join(bin_path, name)
+            with open(path, 'w') as f:
+                f.write(script)
+            os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        path = os.environ['PATH']
+        self.addCleanup(os.environ.__setitem__, 'PATH', path)
+        os.environ['PATH'] = bin_path + os.pathsep + path
+        self.args = make_args(config_path, self.tmp)
+
+    def runner(self, github):
+        return PycicleRunner(self.args, PycicleParams(self.args), github,
+                             store=PycicleStore(os.path.join(self.tmp, 'pycicle.db')))
+
+    def calls(self):
+        with open(os.path.join(self.tmp, 'bin', 'calls.log')) as f:
+            return f.read().splitlines()
+
+    def write_result(self, build_dir, summary):
+        os.makedirs(os.path.join(self.root, 'build', build_dir))
+        with open(os.path.join(self.root, 'build', build_dir, 'pycicle-TAG.txt'), 'w') as f:
+            json.dump(summary, f)
+
+    def test_cycle(self):
+        github = FakeGithub('basesha', [
+            PullRequestInfo(12, 'fix', 'sha12', True, 'dev', 'org', None),
+            PullRequestInfo(13, 'wip', 'sha13', False, 'dev', 'org', None)])
+        runner = self.runner(github)
+        # the result that job-12 leaves behind
+        self.write_result('proj-12-gcc-Release', {
+            'version': 1, 'tag': '20190311-0100', 'build_id': 7,
+            'configure': {'errors': 0}, 'build': {'errors': 0, 'warnings': 2},
+            'test': {'passed': 3, 'failed': 0, 'not_run': 0, 'failed_tests': []}})
+        asyncio.run(runner.run_once())
+
+        # PR 13 is not mergeable, the base branch and PR 12 were built
+        self.assertEqual(sorted(runner.pr_list), ['12', '13', 'master'])
+        self.assertEqual(runner.build_queue.entries, [])
+        statuses = github.statuses()
+        self.assertEqual(statuses[('sha12', 'pycicle cluster-gcc-Release Build')],
+                         ('success', 'errors 0, warnings 2'))
+        self.assertEqual(statuses[('sha12', 'pycicle cluster-gcc-Release Test')],
+                         ('success', '3 passed'))
+        self.assertEqual(statuses[('sha12', 'pycicle cluster-gcc-Release job')],
+                         ('success', 'job job-12 completed'))
+        self.assertEqual(statuses[('basesha', 'pycicle cluster-gcc-Release job')],
+                         ('error', 'job job-master ended without results'))
+        self.assertFalse(os.path.exists(os.path.join(self.root, 'build', 'proj-12-gcc-Release',
+                                                     'pycicle-TAG.txt')))
+        metrics = runner.metrics
+        self.assertEqual(metrics.get('pycicle_queue_wait_seconds', machine='cluster').count, 2)
+        self.assertEqual(metrics.get('pycicle_launch_to_status_seconds', machine='cluster').count, 1)
+        self.assertEqual(metrics.get('pycicle_statuses_published_total'), len(statuses))
+        self.assertGreater(metrics.get('pycicle_command_seconds', machine='cluster').count, 4)
+        self.assertEqual(metrics.get('pycicle_task_seconds', task='scrape', machine='cluster').count, 1)
+        self.assertEqual(metrics.get('pycicle_queue_builds', machine='cluster', state='running'), 0)
+        # nothing changed, nothing is built or published again
+        count = len(github.requests)
+        asyncio.run(runner.run_once())
+        self.assertEqual(len(github.requests), count)
+
+    def test_webhook_retries(self):
+        github = FakeGithub('base1', [PullRequestInfo(12, 'fix', 'sha-a', True, 'dev', 'org', None)])
+        runner = self.runner(github)
+        runner.webhooks = listener = WebhookListener(0, 'master')
+        self.addCleanup(listener.server.server_close)
+        runner.github_pass()
+        synchronize = {'action': 'synchronize', 'pull_request': {'number': 12, 'base': {'ref': 'master'}}}
+        # right after the push github does not know yet if the PR can be merged
+        github.pull_requests = [PullRequestInfo(12, 'fix', 'sha-b', None, 'dev', 'org', None)]
+        listener.queue_event('pull_request', synchronize)
+        runner.github_pass()
+        self.assertEqual(listener.pending_prs, {12})
+        github.pull_requests = [PullRequestInfo(12, 'fix', 'sha-b', True, 'dev', 'org', None)]
+        runner.github_pass()
+        self.assertEqual(sorted(e.sha for e in runner.build_queue.entries), ['base1', 'sha-b'])
+        self.assertEqual(listener.pending_prs, set())
+        # events are not lost when github fails
+        def fail(base, number=0):
+            raise RuntimeError('github is down')
+        github.get_pull_requests = fail
+        listener.queue_event('pull_request', synchronize)
+        with self.assertRaises(RuntimeError):
+            runner.github_pass()
+        self.assertEqual(listener.take_events(), ({12}, False))
+
+    def test_failed_pass_after_change(self):
+        github = EtagGithub('basesha', [PullRequestInfo(12, 'fix', 'sha12', True, 'dev', 'org', None)])
+        runner = self.runner(github)
+        asyncio.run(runner.run_once())
+        # a push is seen by the conditional request, but the PR query fails
+        github.pull_requests = [PullRequestInfo(12, 'fix', 'sha12b', True, 'dev', 'org', None)]
+        github.server_etags = dict((path, '"2"') for path in github.server_etags)
+        github.fail = True
+        asyncio.run(runner.run_once())
+        self.assertEqual(runner.pr_list['12'], ['fix', 'sha12'])
+        # the next poll still sees the change, the push is built
+        github.fail = False
+        asyncio.run(runner.run_once())
+        self.assertEqual(runner.pr_list['12'], ['fix', 'sha12b'])
+        self.assertEqual(len([c for c in self.calls() if '-DPYCICLE_PR=12' in c.split()]), 2)
+        # and once handled it is not seen again
+        self.assertFalse(github.base_or_pulls_changed('master'))
+
+    def test_failed_submission(self):
+        github = FakeGithub('basesha', [PullRequestInfo(12, 'fix', 'sha12', True, 'dev', 'org', None)])
+        runner = self.runner(github)
+        # sbatch fails, ctest prints no job id
+        ctest = os.path.join(self.tmp, 'bin', 'ctest')
+        with open(ctest) as f:
+            script = f.read()
+        with open(ctest, 'w') as f:
+            f.write('#!/bin/bash\nprintf \'%s\\n\' "$*" >> $(dirname $0)/calls.log\n'
+                    'echo "sbatch: error: Batch job submission failed"\n')
+        asyncio.run(runner.run_once())
+        self.assertEqual(runner.build_queue.entries, [])
+        self.assertFalse(runner.store.is_built('12', 'sha12', 'basesha'))
+        state, description = github.statuses()[('sha12', 'pycicle cluster-gcc-Release job')]
+        self.assertEqual(state, 'error')
+        self.assertIn('sbatch: error', description)
+        # the next pass launches it again
+        with open(ctest, 'w') as f:
+            f.write(script)
+        asyncio.run(runner.run_once())
+        self.assertEqual(len([c for c in self.calls() if '-DPYCICLE_PR=12' in c.split()]), 2)
+        self.assertTrue(runner.store.is_built('12', 'sha12', 'basesha'))
+        self.assertEqual(runner.failed_launches, {})
+
+    def test_stages(self):
+        github = FakeGithub('basesha', [PullRequestInfo(12, 'fix', 'sha12', True, 'dev', 'org', None)])
+        self.args.fail_fast = True
+        runner = self.runner(github)
+        # job-12 has configured, a marker of an old build is only deleted
+        os.makedirs(os.path.join(self.root, 'build', 'proj-12-gcc-Release'))
+        os.makedirs(os.path.join(self.root, 'build', 'proj-15-gcc-Release'))
+        for build_dir in ('proj-12-gcc-Release', 'proj-15-gcc-Release'):
+            with open(os.path.join(self.root, 'build', build_dir, 'pycicle-stage-configure.txt'), 'w') as f:
+                json.dump({'version': 1, 'tag': '20190311-0100', 'stage': 'configure',
+                           'configure': {'errors': 2, 'status': 1}}, f)
+        asyncio.run(runner.run_once())
+        self.assertIn('-DPYCICLE_FAIL_FAST=ON', self.calls()[0].split())
+        statuses = github.statuses()
+        self.assertEqual(statuses[('sha12', 'pycicle cluster-gcc-Release Config')], ('failure', 'errors 2'))
+        self.assertEqual(statuses[('sha12', 'pycicle cluster-gcc-Release Build')], ('pending', 'running'))
+        self.assertEqual(statuses[('sha12', 'pycicle cluster-gcc-Release Test')],
+                         ('pending', 'waiting for build'))
+        self.assertEqual(os.listdir(os.path.join(self.root, 'build', 'proj-15-gcc-Release')), [])
+        self.assertEqual(os.listdir(os.path.join(self.root, 'build', 'proj-12-gcc-Release')), [])
+
+    def test_result_cache(self):
+        # every SHA merges onto the base branch into the same tree
+        with open(os.path.join(self.tmp, 'bin', 'git'), 'w') as f:
+            f.write('#!/bin/bash\ncase "$*" in *merge-tree*) echo tree12 ;; esac\n')
+        github = FakeGithub('basesha', [PullRequestInfo(12, 'fix', 'sha12', True, 'dev', 'org', None)])
+        runner = self.runner(github)
+        self.write_result('proj-12-gcc-Release', {
+            'version': 1, 'tag': '20190311-0100', 'build_id': 7, 'sha': 'sha12', 'tree': 'tree12',
+            'configure': {'errors': 0}, 'build': {'errors': 0, 'warnings': 2},
+            'test': {'passed': 3, 'failed': 0, 'not_run': 0, 'failed_tests': []}})
+        asyncio.run(runner.run_once())
+        self.assertEqual(runner.store.cached_results('tree12', 'cluster', 'gcc', 'Release')[1],
+                         ('pycicle cluster-gcc-Release Build', 'success', 'errors 0, warnings 2',
+                          'http://cdash.example.org/cdash/buildSummary.php?buildid=7'))
+        # a force-push that changed nothing is not built again
+        github.pull_requests = [PullRequestInfo(12, 'fix', 'sha12b', True, 'dev', 'org', None)]
+        asyncio.run(runner.run_once())
+        self.assertEqual(len([c for c in self.calls() if '-DPYCICLE_PR=12' in c.split()]), 1)
+        self.assertEqual(runner.build_queue.entries, [])
+        statuses = github.statuses()
+        self.assertEqual(statuses[('sha12b', 'pycicle cluster-gcc-Release Test')], ('success', '3 passed'))
+        self.assertEqual(statuses[('sha12b', 'pycicle cluster-gcc-Release job')],
+                         ('success', 'results of tree tree12 reused'))
+        self.assertEqual(runner.metrics.get('pycicle_result_cache_total', machine='cluster', result='hit'), 1)
+
+    def test_superseded_result(self):
+        github = FakeGithub('basesha', [PullRequestInfo(12, 'fix', 'sha12', True, 'dev', 'org', None)])
+        runner = self.runner(github)
+        asyncio.run(runner.run_once())
+        # the job of sha12 finishes after the push of sha12b was launched
+        for tool, line in [('squeue', 'squeue job-12 RUNNING'), ('sacct', 'job-12|RUNNING')]:
+            with open(os.path.join(self.tmp, 'bin', tool), 'w') as f:
+                f.write('#!/bin/bash\necho "{}"\n'.format(line))
+        github.pull_requests = [PullRequestInfo(12, 'fix', 'sha12b', True, 'dev', 'org', None)]
+        self.write_result('proj-12-gcc-Release', {
+            'version': 1, 'tag': '20190311-0100', 'sha': 'sha12', 'tree': 'tree12',
+            'configure': {'errors': 0}, 'build': {'errors': 0},
+            'test': {'passed': 3, 'failed': 0, 'not_run': 0, 'failed_tests': []}})
+        asyncio.run(runner.run_once())
+        self.assertEqual([e.sha for e in runner.build_queue.running('12', 'cluster')], ['sha12b'])
+        statuses = github.statuses()
+        self.assertNotIn(('sha12', 'pycicle cluster-gcc-Release Test'), statuses)
+        self.assertNotIn(('sha12b', 'pycicle cluster-gcc-Release Test'), statuses)
+        self.assertIsNone(runner.store.cached_results('tree12', 'cluster', 'gcc', 'Release'))
+        self.assertEqual(os.listdir(os.path.join(self.root, 'build', 'proj-12-gcc-Release')), [])
+
+    def test_access_control(self):
+        github = FakeGithub('basesha', [
+            PullRequestInfo(12, 'fix', 'sha12', True, 'dev', 'org', None),
+            PullRequestInfo(14, 'evil', 'sha14', True, 'mallory', 'fork', None)])
+        github.org_members   = lambda org: {'dev'}
+        github.is_org_member = lambda org, login: False
+        self.args.access_control = True
+        runner = PycicleRunner(self.args, PycicleParams(self.args), github, org_login='org',
+                               store=PycicleStore(os.path.join(self.tmp, 'pycicle.db')))
+        asyncio.run(runner.run_once())
+        self.assertTrue(runner.store.has_built('12'))
+        self.assertFalse(runner.store.has_built('14'))
+        self.assertEqual(runner.store.access_list('members org')[0], {'dev'})
+        self.assertNotIn(('sha14', 'pycicle cluster-gcc-Release job'), github.statuses())
+        self.assertEqual(runner.metrics.get('pycicle_access_checks_total', source='query'), 1)
+
+    def test_job_arrays(self):
+        github = FakeGithub('basesha', [
+            PullRequestInfo(12, 'fix', 'sha12', True, 'dev', 'org', None),
+            PullRequestInfo(14, 'feature', 'sha14', True, 'dev', 'org', None)])
+        self.args.job_arrays = True
+        runner = self.runner(github)
+        asyncio.run(runner.run_once())
+        # one submission for the three builds, each task a line of the task file
+        calls = self.calls()
+        self.assertEqual(len(calls), 1)
+        self.assertIn('dashboard_array.cmake', calls[0])
+        self.assertIn('-DPYCICLE_ARRAY_SIZE=3', calls[0])
+        tasks_file = re.search(r'-DPYCICLE_ARRAY_FILE=(\S+)', calls[0]).group(1)
+        with open(tasks_file) as f:
+            tasks = f.read().splitlines()
+        self.assertEqual([t.split()[:2] for t in tasks],
+                         [['-DPYCICLE_PR=master', '-DPYCICLE_BRANCH=master'],
+                          ['-DPYCICLE_PR=12', '-DPYCICLE_BRANCH=fix'],
+                          ['-DPYCICLE_PR=14', '-DPYCICLE_BRANCH=feature']])
+        statuses = github.statuses()
+        self.assertEqual(statuses[('sha14', 'pycicle cluster-gcc-Release job')],
+                         ('error', 'job job-array_2 ended without results'))
+
+        # superseded jobs of a machine are cancelled together
+        entries = [BuildEntry('12', 'fix', 'cluster', 'gcc', 'sha12', 0, job_id='job-array_1'),
+                   BuildEntry('14', 'feature', 'cluster', 'gcc', 'sha14', 0, job_id='job-array_2')]
+        asyncio.run(runner.cancel_builds(entries))
+        self.assertEqual(self.calls()[1:], ['scancel job-array_1 job-array_2'])
+
+    def test_matrix_and_budget(self):
+        with open(os.path.join(self.args.config_path, 'cluster.cmake'), 'a') as f:
+            f.write('set(PYCICLE_COMPILERS "gcc;clang")\n')
+        github = FakeGithub('basesha', [
+            PullRequestInfo(12, 'fix', 'sha12', True, 'dev', 'org', None),
+            PullRequestInfo(14, 'feature', 'sha14', True, 'dev', 'org', None)])
+        self.args.cycle_budget = 1
+        runner = self.runner(github)
+        def queued():
+            return sorted((e.pr, e.sha, e.compiler) for e in runner.build_queue.entries)
+        # the base branch with both compilers, one PR within the budget
+        runner.github_pass()
+        self.assertEqual(queued(), [('12', 'sha12', 'gcc'),
+                                    ('master', 'basesha', 'clang'), ('master', 'basesha', 'gcc')])
+        self.assertTrue(runner.budget_deferred)
+        runner.github_pass()
+        self.assertEqual(queued()[1], ('14', 'sha14', 'gcc'))
+        # a push to PR 12 builds it with the compiler it has not been built with
+        github.pull_requests[0] = PullRequestInfo(12, 'fix', 'sha12b', True, 'dev', 'org', None)
+        runner.github_pass()
+        self.assertEqual(queued()[0], ('12', 'sha12b', 'clang'))
+        self.assertFalse(runner.budget_deferred)
+
+    def test_thread_of_timed_out_run(self):
+        runner  = self.runner(FakeGithub('base1', []))
+        release = threading.Event()
+        calls   = []
+        def blocked():
+            calls.append(1)
+            release.wait(5)
+            return []
+        runner.github_pass = blocked
+
+        async def scenario():
+            task = PeriodicTask('github', runner.check_github, 60, 0.1, metrics=runner.metrics)
+            await task.run_once()
+            # the thread of the run that timed out is not started again
+            await task.run_once()
+            self.assertEqual(len(calls), 1)
+            self.assertEqual(task.failures, 1)
+            self.assertEqual(runner.metrics.get('pycicle_task_skipped_total', task='github'), 1)
+            release.set()
+            await asyncio.sleep(0.1)
+            await task.run_once()
+            self.assertEqual(len(calls), 2)
+
+        asyncio.run(scenario())
+
+    def test_slow_machine_does_not_block(self):
+        github = FakeGithub('basesha', [])
+        runner = self.runner(github)
+        runner.create_tasks()
+
+        async def stuck(nickname):
+            await asyncio.sleep(3600)
+        runner.tasks['scrape cluster'].func    = stuck
+        runner.tasks['scrape cluster'].timeout = 0.2
+
+        async def scenario():
+            runner.loop = asyncio.get_event_loop()
+            tasks = [asyncio.ensure_future(t.run()) for t in runner.tasks.values()]
+            start = time.time()
+            while runner.tasks['github'].runs == 0 and time.time() - start < 5:
+                await asyncio.sleep(0.01)
+            # github was checked while the scrape was still stuck
+            self.assertEqual(runner.tasks['scrape cluster'].runs, 0)
+            await asyncio.sleep(0.3)
+            self.assertEqual(runner.tasks['scrape cluster'].failures, 1)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        asyncio.run(scenario())
+        self.assertEqual(runner.pr_list, {'master': ['master', 'basesha']})
+
+if __name__ == "__main__":
+    unittest.main()
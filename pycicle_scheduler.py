@@ -0,0 +1,143 @@
+#  Copyright (c) 2017-2019 John Biddiscombe
+#
+#  Distributed under the Boost Software License, Version 1.0. (See accompanying
+#  file LICENSE_1_0.txt or copy at http://www.boost.org/LICENSE_1_0.txt)
+#--------------------------------------------------------------------------
+# Tracking of the slurm/pbs jobs that run the builds.
+# dashboard_slurm.cmake and dashboard_pbs.cmake print the id of the job
+# they submit as PYCICLE_JOB_ID=<id>, pycicle keeps it with the build and
+# asks the scheduler about all jobs of a machine with one command per
+# poll. A job is
+#   pending   : waiting in the queue
+#   running   : started (or completing)
+#   completed : ended, or no longer known to the scheduler
+#   failed    : ended badly (cancelled, timeout, node failure, ...)
+# A job the scheduler did not answer about (squeue/sacct failed, the pbs
+# server is down) is left out, the caller keeps its previous state.
+# With --job-arrays the builds a machine launches in one go are submitted
+# as a single job array (dashboard_array.cmake), each task reads its PR
+# parameters from one line of a task file. The file is written by the
+# same remote command that submits the array.
+#--------------------------------------------------------------------------
+from __future__ import absolute_import, division, print_function, unicode_literals
+import re
+
+from pycicle_transport import shell_command
+
+job_schedulers = ('slurm', 'pbs')
+
+_job_id = re.compile(r'PYCICLE_JOB_ID=(\S+)')
+
+def parse_job_id(output):
+    """The job id printed at submission, None if there is none"""
+    if isinstance(output, bytes):
+        output = output.decode('utf-8', 'replace')
+    ids = _job_id.findall(output)
+    if not ids:
+        return None
+    # sbatch --parsable gives <id>;<cluster> on multi cluster systems
+    return ids[-1].split(';')[0]
+
+#--------------------------------------------------------------------------
+# scheduler states mapped to ours, anything else counts as running
+#--------------------------------------------------------------------------
+_slurm_states = {
+    'PENDING': 'pending', 'CONFIGURING': 'pending', 'REQUEUED': 'pending',
+    'REQUEUE_HOLD': 'pending', 'SUSPENDED': 'pending',
+    'COMPLETED': 'completed',
+    'FAILED': 'failed', 'CANCELLED': 'failed', 'TIMEOUT': 'failed', 'NODE_FAIL': 'failed',
+    'OUT_OF_MEMORY': 'failed', 'PREEMPTED': 'failed', 'BOOT_FAIL': 'failed', 'DEADLINE': 'failed',
+}
+
+_pbs_states = {
+    'Q': 'pending', 'H': 'pending', 'W': 'pending', 'T': 'pending', 'S': 'pending',
+    'C': 'completed', 'F': 'completed',
+    # no longer known to qstat (torque), finished (pbs pro without -x)
+    'UNKNOWN': 'completed', 'FINISHED': 'completed',
+}
+
+def poll_command(scheduler, job_ids):
+    """One command giving '<tool> <id> <state>' lines for the jobs"""
+    if scheduler == 'slurm':
+        # squeue knows the live jobs, sacct (when accounting is enabled)
+        # tells how the ones that left the queue ended
+        # -r : a line per array task, not 1234_[0-9] for the pending ones
+        # the exit status of each tool tells an empty answer from a failure
+        return ("squeue -h -r -o 'squeue %i %T' -j {c} 2>/dev/null; echo \"status squeue $?\"; "
+                "out=$(sacct -n -X -P -o JobID,State -j {c} 2>/dev/null); echo \"status sacct $?\"; "
+                "printf '%s\\n' \"$out\" | awk -F'|' 'NF > 1 {{print \"sacct\", $1, $2}}'; true"
+                .format(c=shell_command([','.join(job_ids)])))
+    elif scheduler == 'pbs':
+        # jobs that have left the queue are an error for qstat, it still
+        # reports the others, so the jobs it says it does not know are
+        # listed, -t expands array jobs into their tasks
+        return ("qstat -f -t {} 2>&1 | "
+                "awk '/^Job Id:/ {{id=$3}} /job_state =/ {{print \"qstat\", id, $3}} "
+                "/Unknown Job Id/ {{print \"qstat\", $NF, \"UNKNOWN\"}} "
+                "/Job has finished/ {{print \"qstat\", $2, \"FINISHED\"}}'; true"
+                .format(shell_command(job_ids)))
+    raise ValueError('unknown scheduler {}'.format(scheduler))
+
+def parse_poll_output(scheduler, output, job_ids):
+    """{job_id: state} for the jobs of job_ids the scheduler answered about"""
+    if isinstance(output, bytes):
+        output = output.decode('utf-8', 'replace')
+    live, ended, succeeded = {}, {}, set()
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) < 3:
+            continue
+        if fields[0] == 'status':
+            if fields[2] == '0':
+                succeeded.add(fields[1])
+            continue
+        tool, job_id, state = fields[0], fields[1], fields[2].upper()
+        if scheduler == 'slurm':
+            # 'CANCELLED by 1234' and job steps like 1234.batch
+            state = _slurm_states.get(state, 'running')
+            if tool == 'squeue':
+                live[job_id] = state
+            elif '.' not in job_id:
+                ended[job_id] = state
+        else:
+            live[job_id] = _pbs_states.get(state, 'running')
+    states = {}
+    for job_id in job_ids:
+        # pbs ids are 1234.server, qstat may give the full server name
+        short = job_id.split('.')[0]
+        state = live.get(job_id) or next((s for j, s in live.items() if j.split('.')[0] == short), None)
+        if state is None or state in ('completed', 'failed'):
+            state = ended.get(job_id, state)
+        # not in a queue that squeue listed, and unknown to accounting
+        if state is None and 'squeue' in succeeded:
+            state = 'completed'
+        if state is not None:
+            states[job_id] = state
+    return states
+
+def cancel_command(scheduler, job_ids):
+    return ('scancel ' if scheduler == 'slurm' else 'qdel ') + shell_command(job_ids)
+
+#--------------------------------------------------------------------------
+# job arrays
+#--------------------------------------------------------------------------
+def array_task_ids(scheduler, array_id, count):
+    """The job ids of the tasks of an array, in the order of the task file"""
+    if scheduler == 'slurm':
+        return ['{}_{}'.format(array_id, i) for i in range(count)]
+    # pbs gives 1234[].server for an array, its tasks are 1234[0].server ...
+    head, dot, tail = array_id.partition('.')
+    head = head.replace('[]', '')
+    return ['{}[{}]{}{}'.format(head, i, dot, tail) for i in range(count)]
+
+def array_submit_command(tasks_file, tasks, submit):
+    """One command that writes the task file and runs submit
+    tasks  : the extra ctest arguments of each task
+    submit : command submitting the array (ctest -S dashboard_array.cmake ...)
+    Task files of arrays submitted more than a week ago are removed.
+    """
+    directory = tasks_file.rsplit('/', 1)[0]
+    lines = '\n'.join(shell_command(task) for task in tasks)
+    return ("mkdir -p {d} && find {d} -type f -mtime +7 -delete; "
+            "cat > {f} <<'PYCICLE_TASKS'\n{l}\nPYCICLE_TASKS\n{s}"
+            .format(d=shell_command([directory]), f=shell_command([tasks_file]), l=lines, s=submit))
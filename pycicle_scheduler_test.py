@@ -0,0 +1,113 @@
+import os
+import stat
+import shutil
+import tempfile
+import unittest
+
+from pycicle_scheduler import (parse_job_id, poll_command, parse_poll_output, cancel_command,
+                               array_task_ids, array_submit_command)
+from pycicle_transport import LocalTransport
+
+# fake scheduler commands, they print canned output and log their arguments
+fake_squeue = '''#!/bin/bash
+printf '%s\\n' "$*" >> {log}
+printf 'squeue 101 PENDING\\nsqueue 102 RUNNING\\n'
+'''
+
+fake_sacct = '''#!/bin/bash
+printf '%s\\n' "$*" >> {log}
+printf '101|PENDING\\n102|RUNNING\\n103|COMPLETED\\n103.batch|COMPLETED\\n104|CANCELLED by 1000\\n'
+'''
+
+fake_qstat = '''#!/bin/bash
+printf '%s\\n' "$*" >> {log}
+for id in "$@"; do
+  case $id in
+    201.pbs) printf 'Job Id: 201.pbs.example.org\\n    Job_Name = hpx-12\\n    job_state = Q\\n' ;;
+    202.pbs) printf 'Job Id: 202.pbs.example.org\\n    job_state = R\\n' ;;
+    203.pbs) printf 'Job Id: 203.pbs.example.org\\n    job_state = C\\n' ;;
+    -f|-t) ;;
+    *) echo "qstat: Unknown Job Id $id" >&2 ;;
+  esac
+done
+exit 153
+'''
+
+class SchedulerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.bin = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.bin)
+        self.log = os.path.join(self.bin, 'calls.log')
+        for name, script in [('squeue', fake_squeue), ('sacct', fake_sacct), ('qstat', fake_qstat)]:
+            path = os.path.join(self.bin, name)
+            with open(path, 'w') as f:
+                f.write(script.format(log=self.log))
+            os.chmod(path, os.stat(path).st_mode | stat.S_IEXEC)
+        path = os.environ['PATH']
+        self.addCleanup(os.environ.__setitem__, 'PATH', path)
+        os.environ['PATH'] = self.bin + os.pathsep + path
+        self.transport = LocalTransport('local')
+
+    def calls(self):
+        with open(self.log, 'r') as f:
+            return f.read().splitlines()
+
+    def test_parse_job_id(self):
+        self.assertEqual(parse_job_id(b'sbatch \n/x/ctest-slurm-A.sh\nPYCICLE_JOB_ID=1234\n'), '1234')
+        self.assertEqual(parse_job_id('PYCICLE_JOB_ID=1234;daint\n'), '1234')
+        self.assertEqual(parse_job_id('PYCICLE_JOB_ID=201.pbs\n'), '201.pbs')
+        self.assertIsNone(parse_job_id('sbatch: error: Batch job submission failed\nPYCICLE_JOB_ID=\n'))
+
+    def test_slurm(self):
+        job_ids = ['101', '102', '103', '104', '105']
+        output  = self.transport.run(poll_command('slurm', job_ids))
+        self.assertEqual(parse_poll_output('slurm', output, job_ids),
+                         {'101': 'pending', '102': 'running', '103': 'completed',
+                          '104': 'failed', '105': 'completed'})
+        # one call of each tool for all the jobs
+        self.assertEqual(self.calls(), ['-h -r -o squeue %i %T -j 101,102,103,104,105',
+                                        '-n -X -P -o JobID,State -j 101,102,103,104,105'])
+
+    def test_pbs(self):
+        job_ids = ['201.pbs', '202.pbs', '203.pbs', '204.pbs']
+        output  = self.transport.run(poll_command('pbs', job_ids))
+        self.assertEqual(parse_poll_output('pbs', output, job_ids),
+                         {'201.pbs': 'pending', '202.pbs': 'running', '203.pbs': 'completed',
+                          '204.pbs': 'completed'})
+        self.assertEqual(len(self.calls()), 1)
+
+    def test_failed_poll(self):
+        job_ids = ['101', '102']
+        # nothing is known when the scheduler does not answer
+        self.assertEqual(parse_poll_output('slurm', '', job_ids), {})
+        self.assertEqual(parse_poll_output('slurm', 'status squeue 1\nstatus sacct 1\n', job_ids), {})
+        self.assertEqual(parse_poll_output('pbs', b'', ['201.pbs']), {})
+        # squeue failed, sacct still tells about the jobs it knows
+        output = 'status squeue 1\nstatus sacct 0\nsacct 101 COMPLETED\n'
+        self.assertEqual(parse_poll_output('slurm', output, job_ids), {'101': 'completed'})
+        # squeue answered and the job is not in the queue
+        self.assertEqual(parse_poll_output('slurm', 'status squeue 0\nstatus sacct 1\n', job_ids),
+                         {'101': 'completed', '102': 'completed'})
+        # pbs pro without -x
+        output = 'qstat 301.pbs FINISHED\n'
+        self.assertEqual(parse_poll_output('pbs', output, ['301.pbs', '302.pbs']), {'301.pbs': 'completed'})
+
+    def test_cancel_command(self):
+        self.assertEqual(cancel_command('slurm', ['101']), 'scancel 101')
+        self.assertEqual(cancel_command('pbs', ['201.pbs', '202.pbs']), 'qdel 201.pbs 202.pbs')
+
+    def test_array(self):
+        self.assertEqual(array_task_ids('slurm', '1234', 3), ['1234_0', '1234_1', '1234_2'])
+        self.assertEqual(array_task_ids('pbs', '301[].pbs', 2), ['301[0].pbs', '301[1].pbs'])
+        tasks_file = os.path.join(self.bin, 'arrays', 'tasks.txt')
+        tasks = [['-DPYCICLE_PR=12', '-DPYCICLE_BRANCH=fix'],
+                 ['-DPYCICLE_PR=13', "-DPYCICLE_TEST_INCLUDE_LABEL=^(a|b)$"]]
+        output = self.transport.run(array_submit_command(tasks_file, tasks, 'sed -n 2p ' + tasks_file))
+        self.assertEqual(output, b"-DPYCICLE_PR=13 '-DPYCICLE_TEST_INCLUDE_LABEL=^(a|b)$'\n")
+        # pbs array tasks are polled by their own ids
+        job_ids = ['203[0].pbs']
+        output  = 'qstat 203[0].pbs.example.org R\n'
+        self.assertEqual(parse_poll_output('pbs', output, job_ids), {'203[0].pbs': 'running'})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+#  Copyright (c) 2017-2019 John Biddiscombe
+#
+#  Distributed under the Boost Software License, Version 1.0. (See accompanying
+#  file LICENSE_1_0.txt or copy at http://www.boost.org/LICENSE_1_0.txt)
+#--------------------------------------------------------------------------
+# Collect the result files of all finished builds on a machine in a
+# single command. Every pycicle-TAG.txt under build/<project>-* is
+# written to the output as one json line {"path": ..., "content": ...}
+# so that the path and contents of N files cost one round-trip, and the
+# files that have been dealt with are then removed with one rm.
+# The pycicle-stage-<stage>.txt markers of builds that are still running
+# are collected by the same command.
+#--------------------------------------------------------------------------
+from __future__ import absolute_import, division, print_function, unicode_literals
+import json
+import collections
+
+from pycicle_transport import shell_command
+from pycicle_summary import RESULT_FILE
+
+ScrapeResult = collections.namedtuple('ScrapeResult', ['branch_id', 'path', 'content'])
+
+# awk program turning one file into a json line, only plain posix awk is
+# assumed on the build machine
+_json_line = r'''function esc(s) {
+  gsub(/\\/, "&&", s); gsub(/"/, "\\\"", s); gsub(/\t/, "\\t", s); gsub(/\r/, "\\r", s); return s
+}
+{ c = c esc($0) "\\n" }
+END { printf "{\"path\": \"%s\", \"content\": \"%s\"}\n", esc(f), c }'''
+
+def scrape_command(root, project, name='pycicle-*.txt'):
+    """The shell command that prints all result files as json lines"""
+    pattern = shell_command([root + '/build/' + project + '-']) + '*/' + name
+    return ('for f in {}; do [ -f "$f" ] && awk -v f="$f" {} "$f"; done; true'
+            .format(pattern, shell_command([_json_line])))
+
+def erase_command(files):
+    return shell_command(['rm', '-f'] + list(files))
+
+#--------------------------------------------------------------------------
+# The PR (or base branch) of a build dir build/<project>-<PR>-<stamp>/
+#--------------------------------------------------------------------------
+def branch_from_path(path, project, base):
+    build_dir = path.rsplit('/', 2)[-2]
+    if not build_dir.startswith(project + '-'):
+        return None
+    name = build_dir[len(project) + 1:]
+    pr   = name.split('-', 1)[0]
+    if pr.isdigit():
+        return pr
+    if base and name.startswith(base + '-'):
+        return base
+    return None
+
+#--------------------------------------------------------------------------
+# The stage of a pycicle-stage-<stage>.txt marker, None for a final result
+#--------------------------------------------------------------------------
+def stage_from_path(path):
+    name = path.rsplit('/', 1)[-1]
+    if name == RESULT_FILE or not name.startswith('pycicle-stage-'):
+        return None
+    return name[len('pycicle-stage-'):-len('.txt')]
+
+def parse_scrape_output(output, project, base=None):
+    """Turn the output of scrape_command into a list of ScrapeResult"""
+    if isinstance(output, bytes):
+        output = output.decode('utf-8', 'replace')
+    results = []
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            print('Ignoring malformed scrape output :', line)
+            continue
+        results.append(ScrapeResult(branch_from_path(entry['path'], project, base),
+                                    entry['path'], entry['content']))
+    return results
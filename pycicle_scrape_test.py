@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pycicle_scrape import (scrape_command, erase_command, parse_scrape_output,
+                            branch_from_path, stage_from_path)
+from pycicle_transport import LocalTransport
+
+class ScrapeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.transport = LocalTransport('local')
+
+    def write(self, build_dir, content, name='pycicle-TAG.txt'):
+        if not os.path.isdir(os.path.join(self.root, 'build', build_dir)):
+            os.makedirs(os.path.join(self.root, 'build', build_dir))
+        path = os.path.join(self.root, 'build', build_dir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def test_single_pass(self):
+        pr_file   = self.write('hpx-12-gcc-6.2.0-Release', '0\n3\n1\n20190311-0100\n')
+        base_file = self.write('hpx-master-clang-6.0.0', 'quote " back \\ tab \t\n')
+        self.write('dca-13-gcc', '0\n')
+        output  = self.transport.run(scrape_command(self.root, 'hpx'))
+        results = sorted(parse_scrape_output(output, 'hpx', 'master'))
+        self.assertEqual([(r.branch_id, r.path) for r in results],
+                         [('12', pr_file), ('master', base_file)])
+        self.assertEqual(results[0].content, '0\n3\n1\n20190311-0100\n')
+        self.assertEqual(results[1].content, 'quote " back \\ tab \t\n')
+        # one command deletes everything that was handled
+        self.transport.run(erase_command([pr_file, base_file]))
+        self.assertEqual(parse_scrape_output(
+            self.transport.run(scrape_command(self.root, 'hpx')), 'hpx'), [])
+
+    def test_stages(self):
+        stage_file = self.write('hpx-12-gcc', '{"stage": "configure"}', 'pycicle-stage-configure.txt')
+        self.write('hpx-12-gcc', '', 'ccache-before.txt')
+        output  = self.transport.run(scrape_command(self.root, 'hpx'))
+        self.assertEqual([(r.branch_id, r.path) for r in parse_scrape_output(output, 'hpx')],
+                         [('12', stage_file)])
+        self.assertEqual(stage_from_path(stage_file), 'configure')
+        self.assertIsNone(stage_from_path('/p/build/hpx-12-gcc/pycicle-TAG.txt'))
+
+    def test_no_builds(self):
+        output = self.transport.run(scrape_command(self.root + '/missing', 'hpx'))
+        self.assertEqual(parse_scrape_output(output, 'hpx'), [])
+
+    def test_branch_from_path(self):
+        self.assertEqual(branch_from_path('/p/build/hpx-3712-gcc/pycicle-TAG.txt', 'hpx', 'master'), '3712')
+        self.assertEqual(branch_from_path('/p/build/DCA-gpu_trunk-gcc/pycicle-TAG.txt', 'DCA', 'gpu_trunk'), 'gpu_trunk')
+        self.assertIsNone(branch_from_path('/p/build/hpx-feature-gcc/pycicle-TAG.txt', 'hpx', 'master'))
+
+if __name__ == "__main__":
+    unittest.main()
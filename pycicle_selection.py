@@ -0,0 +1,69 @@
+#  Copyright (c) 2017-2019 John Biddiscombe
+#
+#  Distributed under the Boost Software License, Version 1.0. (See accompanying
+#  file LICENSE_1_0.txt or copy at http://www.boost.org/LICENSE_1_0.txt)
+#--------------------------------------------------------------------------
+# Test selection from the files changed by a PR.
+# config/<project>/test_selection.json maps paths of the repository to
+# the CTest labels of the tests that cover them, e.g.
+#   {
+#     "libs/algorithms/": ["algorithms"],
+#     "libs/*/include/hpx/futures/": ["futures", "async"],
+#     "docs/": []
+#   }
+# A path matches the longest entry that it starts with (entries with *
+# are fnmatch patterns). Paths mapped to [] need no tests.
+# The whole suite is run when any changed path is not mapped, when the
+# list of files is not known, or when no mapping exists for the project.
+#--------------------------------------------------------------------------
+from __future__ import absolute_import, division, print_function, unicode_literals
+import os
+import re
+import json
+import fnmatch
+
+selection_file = 'test_selection.json'
+
+# labels are put into a regex and a job script, keep them simple
+_label_ok = re.compile(r'^[\w.+-]+$')
+
+def load_test_selection(config_path):
+    """The path -> labels mapping in the project config dir, None if there is none"""
+    filename = os.path.join(config_path, selection_file)
+    if not os.path.exists(filename):
+        return None
+    with open(filename, 'r') as f:
+        mapping = json.load(f)
+    for path, labels in mapping.items():
+        bad = [l for l in labels if not _label_ok.match(l)]
+        if bad:
+            raise ValueError('{} : invalid labels {} for {}'.format(filename, bad, path))
+    return mapping
+
+def _matches(pattern, path):
+    if '*' in pattern:
+        return fnmatch.fnmatchcase(path, pattern + '*')
+    return path.startswith(pattern)
+
+def labels_for_path(mapping, path):
+    best, labels = -1, None
+    for pattern, pattern_labels in mapping.items():
+        if len(pattern) > best and _matches(pattern, path):
+            best, labels = len(pattern), pattern_labels
+    return labels
+
+def select_labels(mapping, files):
+    """Sorted labels to test for the changed files, None for the full suite"""
+    if not mapping or not files:
+        return None
+    selected = set()
+    for path in files:
+        labels = labels_for_path(mapping, path)
+        if labels is None:
+            return None
+        selected.update(labels)
+    return sorted(selected) or None
+
+def label_regex(labels):
+    """CTest INCLUDE_LABEL regex for a list of labels"""
+    return '^(' + '|'.join(labels) + ')$'
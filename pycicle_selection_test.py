@@ -0,0 +1,46 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from pycicle_selection import load_test_selection, select_labels, label_regex
+
+mapping = {'libs/algorithms/': ['algorithms'],
+           'libs/algorithms/include/hpx/parallel/': ['algorithms', 'parallel'],
+           'libs/*/include/hpx/futures/': ['futures'],
+           'docs/': []}
+
+class SelectionTestCase(unittest.TestCase):
+    def test_select(self):
+        self.assertEqual(select_labels(mapping, ['libs/algorithms/src/a.cpp', 'docs/index.rst']),
+                         ['algorithms'])
+        # the longest matching entry wins
+        self.assertEqual(select_labels(mapping, ['libs/algorithms/include/hpx/parallel/for_each.hpp']),
+                         ['algorithms', 'parallel'])
+        self.assertEqual(select_labels(mapping, ['libs/core/include/hpx/futures/future.hpp']),
+                         ['futures'])
+
+    def test_full_run(self):
+        # unmapped paths, unknown files, no tests at all or no mapping run everything
+        self.assertIsNone(select_labels(mapping, ['libs/algorithms/a.cpp', 'CMakeLists.txt']))
+        self.assertIsNone(select_labels(mapping, None))
+        self.assertIsNone(select_labels(mapping, ['docs/index.rst']))
+        self.assertIsNone(select_labels(None, ['libs/algorithms/a.cpp']))
+
+    def test_load(self):
+        config = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, config)
+        self.assertIsNone(load_test_selection(config))
+        with open(os.path.join(config, 'test_selection.json'), 'w') as f:
+            json.dump(mapping, f)
+        self.assertEqual(load_test_selection(config), mapping)
+        with open(os.path.join(config, 'test_selection.json'), 'w') as f:
+            json.dump({'libs/': ['bad label;']}, f)
+        self.assertRaises(ValueError, load_test_selection, config)
+
+    def test_regex(self):
+        self.assertEqual(label_regex(['algorithms', 'futures']), '^(algorithms|futures)$')
+
+if __name__ == '__main__':
+    unittest.main()
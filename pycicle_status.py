@@ -0,0 +1,160 @@
+#  Copyright (c) 2017-2019 John Biddiscombe
+#
+#  Distributed under the Boost Software License, Version 1.0. (See accompanying
+#  file LICENSE_1_0.txt or copy at http://www.boost.org/LICENSE_1_0.txt)
+#--------------------------------------------------------------------------
+# Github commit status publishing.
+# Statuses found during a scrape are collected and sent together at the
+# end of the cycle. A status identical to the one last published for
+# the same commit and context is not sent again, the rest are sent in
+# parallel, and no more are sent than the remaining rate limit allows
+# (what is left over goes out in the next cycle).
+# Optionally one Checks API run per commit summarises all machines, with
+# one annotation per machine/stage.
+#--------------------------------------------------------------------------
+from __future__ import absolute_import, division, print_function, unicode_literals
+import threading
+import collections
+import concurrent.futures
+
+from pycicle_params import PycicleParamsHelper
+from pycicle_github import GithubError
+
+CommitStatus = collections.namedtuple('CommitStatus',
+    ['sha', 'context', 'state', 'description', 'target_url'])
+
+class StatusPublisher:
+    # github allows at most 50 annotations per check run request
+    max_annotations = 50
+    # check runs need a file for their annotations
+    annotation_path = '.github'
+
+    def __init__(self, client, published=None, workers=8, reserve=100, checks=False,
+                 debug_print=PycicleParamsHelper.no_op):
+        """client    : GithubClient used for the requests
+        published : mapping (sha, context) -> (state, description, target_url)
+                    of what github already shows
+        workers   : number of requests sent at the same time
+        reserve   : part of the rate limit that is never used for statuses
+        checks    : also create/update a check run per commit
+        """
+        self.client      = client
+        self.published   = published if published is not None else {}
+        self.workers     = workers
+        self.reserve     = reserve
+        self.checks      = checks
+        self.debug_print = debug_print
+        self.lock        = threading.Lock()
+        self.pending     = collections.OrderedDict()
+        self.check_runs  = {}
+
+    def add(self, sha, context, state, description, target_url=None):
+        """Queue a status, returns False when github already shows it"""
+        status = CommitStatus(sha, context, state, description, target_url)
+        with self.lock:
+            if self.published.get((sha, context)) == tuple(status[2:]):
+                self.pending.pop((sha, context), None)
+                self.debug_print('status unchanged', sha[:8], context)
+                return False
+            self.pending[(sha, context)] = status
+            return True
+
+    def budget(self):
+        if self.client.rate_limit_remaining is None:
+            return None
+        return max(0, self.client.rate_limit_remaining - self.reserve)
+
+    def send(self, status):
+        code, _, result = self.client.request(
+            'POST', '/repos/{}/statuses/{}'.format(self.client.full_name, status.sha),
+            {'state': status.state, 'target_url': status.target_url,
+             'description': status.description, 'context': status.context})
+        if code != 201:
+            raise GithubError('status {} for {} failed ({}) : {}'.format(
+                status.context, status.sha, code, result))
+        return status
+
+    #--------------------------------------------------------------------------
+    # Send what is pending, returns the number of statuses published
+    #--------------------------------------------------------------------------
+    def publish(self):
+        with self.lock:
+            statuses = list(self.pending.values())
+        budget = self.budget()
+        if budget is not None and len(statuses) > budget:
+            print('Rate limit allows', budget, 'of', len(statuses), 'statuses this cycle')
+            statuses = statuses[:budget]
+        if not statuses:
+            return 0
+        sent = []
+        with concurrent.futures.ThreadPoolExecutor(self.workers) as executor:
+            futures = [executor.submit(self.send, s) for s in statuses]
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    sent.append(future.result())
+                except GithubError as ex:
+                    print('Setting github status failed', ex)
+        with self.lock:
+            for status in sent:
+                key = (status.sha, status.context)
+                # a newer status may have been added while sending
+                if self.pending.get(key) == status:
+                    del self.pending[key]
+                self.published[key] = tuple(status[2:])
+        print('Published', len(sent), 'github statuses')
+        if self.checks:
+            for sha in set(s.sha for s in sent):
+                try:
+                    self.publish_check_run(sha)
+                except GithubError as ex:
+                    print('Check run for', sha, 'failed', ex)
+        return len(sent)
+
+    #--------------------------------------------------------------------------
+    # One check run with every status of the commit as an annotation
+    #--------------------------------------------------------------------------
+    def check_run_output(self, sha):
+        with self.lock:
+            statuses = sorted((key[1], value) for key, value in self.published.items()
+                              if key[0] == sha)
+        failed  = [c for c, (state, _, _) in statuses if state in ('failure', 'error')]
+        pending = [c for c, (state, _, _) in statuses if state == 'pending']
+        rows   = ['| {} | {} | {} |'.format(c, state, description)
+                  for c, (state, description, _) in statuses]
+        annotations = [{'path': self.annotation_path, 'start_line': 1, 'end_line': 1,
+                        'annotation_level': 'failure' if c in failed else 'notice',
+                        'title': c, 'message': description or state}
+                       for c, (state, description, _) in statuses]
+        if pending:
+            title = '{} of {} pending'.format(len(pending), len(statuses))
+            if failed:
+                title += ', {} failed'.format(len(failed))
+        elif failed:
+            title = '{} of {} failed'.format(len(failed), len(statuses))
+        else:
+            title = 'all {} passed'.format(len(statuses))
+        output = {'title': title,
+                  'summary': '\n'.join(['| context | state | result |', '|---|---|---|'] + rows),
+                  'annotations': annotations[:self.max_annotations]}
+        # the run is finished only when no build of the commit is still going
+        if pending:
+            return 'in_progress', None, output
+        return 'completed', ('failure' if failed else 'success'), output
+
+    def publish_check_run(self, sha):
+        status, conclusion, output = self.check_run_output(sha)
+        data = {'name': 'pycicle', 'head_sha': sha, 'status': status, 'output': output}
+        if conclusion:
+            data['conclusion'] = conclusion
+        run_id = self.check_runs.get(sha)
+        if run_id:
+            code, _, result = self.client.request(
+                'PATCH', '/repos/{}/check-runs/{}'.format(self.client.full_name, run_id), data,
+                headers={'Accept': 'application/vnd.github.antiope-preview+json'})
+        else:
+            code, _, result = self.client.request(
+                'POST', '/repos/{}/check-runs'.format(self.client.full_name), data,
+                headers={'Accept': 'application/vnd.github.antiope-preview+json'})
+        if code not in (200, 201):
+            raise GithubError('check run failed ({}) : {}'.format(code, result))
+        self.check_runs[sha] = result['id']
@@ -0,0 +1,84 @@
+import unittest
+import threading
+
+from pycicle_github import GithubClient
+from pycicle_status import StatusPublisher
+
+class StatusClient(GithubClient):
+    """Records status and check run requests, with a fixed rate limit"""
+    def __init__(self, rate_limit_remaining=None):
+        GithubClient.__init__(self, 'token', 'org/repo')
+        self.rate_limit_remaining = rate_limit_remaining
+        self.lock     = threading.Lock()
+        self.requests = []
+
+    def request(self, method, path, data=None, headers=None):
+        with self.lock:
+            self.requests.append((method, path, data))
+        if 'check-runs' in path:
+            return 201, {}, {'id': 99}
+        return 201, {}, {}
+
+class StatusPublisherTestCase(unittest.TestCase):
+    def test_unchanged_statuses_skipped(self):
+        client    = StatusClient()
+        publisher = StatusPublisher(client)
+        self.assertTrue(publisher.add('sha1', 'pycicle daint Build', 'success', 'errors 0', 'url'))
+        self.assertTrue(publisher.add('sha1', 'pycicle daint Test', 'failure', '1 failed', 'url'))
+        self.assertEqual(publisher.publish(), 2)
+        self.assertEqual(sorted(r[1] for r in client.requests),
+                         ['/repos/org/repo/statuses/sha1'] * 2)
+        # identical statuses are not sent again, changed ones are
+        self.assertFalse(publisher.add('sha1', 'pycicle daint Build', 'success', 'errors 0', 'url'))
+        self.assertTrue(publisher.add('sha1', 'pycicle daint Test', 'success', '10 passed', 'url'))
+        self.assertEqual(publisher.publish(), 1)
+        self.assertEqual(client.requests[-1][2]['description'], '10 passed')
+        self.assertEqual(publisher.publish(), 0)
+
+    def test_rate_limit_budget(self):
+        client    = StatusClient(rate_limit_remaining=103)
+        publisher = StatusPublisher(client, reserve=100)
+        for n in range(5):
+            publisher.add('sha1', 'context {}'.format(n), 'success', 'ok')
+        self.assertEqual(publisher.publish(), 3)
+        client.rate_limit_remaining = 5000
+        self.assertEqual(publisher.publish(), 2)
+        self.assertEqual(sorted(r[2]['context'] for r in client.requests),
+                         ['context {}'.format(n) for n in range(5)])
+
+    def test_check_run(self):
+        client    = StatusClient()
+        publisher = StatusPublisher(client, checks=True)
+        publisher.add('sha1', 'pycicle daint Build', 'success', 'errors 0')
+        publisher.add('sha1', 'pycicle greina Build', 'failure', 'errors 3')
+        publisher.publish()
+        method, path, data = client.requests[-1]
+        self.assertEqual((method, path), ('POST', '/repos/org/repo/check-runs'))
+        self.assertEqual(data['conclusion'], 'failure')
+        self.assertEqual(data['output']['title'], '1 of 2 failed')
+        self.assertEqual([a['annotation_level'] for a in data['output']['annotations']],
+                         ['notice', 'failure'])
+        # later results update the same check run
+        publisher.add('sha1', 'pycicle greina Build', 'success', 'errors 0')
+        publisher.publish()
+        method, path, data = client.requests[-1]
+        self.assertEqual((method, path), ('PATCH', '/repos/org/repo/check-runs/99'))
+        self.assertEqual(data['conclusion'], 'success')
+
+    def test_check_run_in_progress(self):
+        client    = StatusClient()
+        publisher = StatusPublisher(client, checks=True)
+        publisher.add('sha1', 'pycicle daint Build', 'failure', 'errors 3')
+        publisher.add('sha1', 'pycicle greina job', 'pending', 'job 12 queued')
+        publisher.publish()
+        data = client.requests[-1][2]
+        self.assertEqual(data['status'], 'in_progress')
+        self.assertNotIn('conclusion', data)
+        self.assertEqual(data['output']['title'], '1 of 2 pending, 1 failed')
+        publisher.add('sha1', 'pycicle greina job', 'success', 'job 12 completed')
+        publisher.publish()
+        data = client.requests[-1][2]
+        self.assertEqual((data['status'], data['conclusion']), ('completed', 'failure'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,330 @@
+#  Copyright (c) 2017-2019 John Biddiscombe
+#
+#  Distributed under the Boost Software License, Version 1.0. (See accompanying
+#  file LICENSE_1_0.txt or copy at http://www.boost.org/LICENSE_1_0.txt)
+#--------------------------------------------------------------------------
+# Persistent state of pycicle, kept in one sqlite file
+#  - pull_requests : branch name, head/base SHA last built, open or not
+#  - builds        : the build queue, queued and in flight jobs
+#  - statuses      : what was last published to github per commit/context
+#  - access_lists / access_decisions : who may have their PRs built
+#  - coverage      : the compiler/build type combinations each SHA was built with
+#  - results       : the statuses of each merged tree tested on a machine
+# Every change is committed straight away so that a restart continues
+# from where the previous run stopped.
+#--------------------------------------------------------------------------
+from __future__ import absolute_import, division, print_function, unicode_literals
+import re
+import json
+import time
+import sqlite3
+import threading
+import contextlib
+
+from pycicle_params import PycicleParamsHelper
+
+_schema = '''
+CREATE TABLE IF NOT EXISTS pull_requests (
+    branch_id   TEXT PRIMARY KEY,
+    branch_name TEXT,
+    sha         TEXT,
+    base_sha    TEXT,
+    built_sha   TEXT,
+    built_base  TEXT,
+    open        INTEGER DEFAULT 1,
+    updated     REAL);
+CREATE TABLE IF NOT EXISTS builds (
+    pr          TEXT,
+    branch_name TEXT,
+    machine     TEXT,
+    compiler    TEXT,
+    sha         TEXT,
+    priority    INTEGER,
+    state       TEXT,
+    enqueued    REAL,
+    started     REAL,
+    job_id      TEXT,
+    include_label TEXT,
+    build_type  TEXT,
+    tree        TEXT,
+    PRIMARY KEY (pr, machine, compiler, build_type));
+CREATE INDEX IF NOT EXISTS builds_state ON builds (machine, state);
+CREATE TABLE IF NOT EXISTS statuses (
+    sha         TEXT,
+    context     TEXT,
+    state       TEXT,
+    description TEXT,
+    target_url  TEXT,
+    updated     REAL,
+    PRIMARY KEY (sha, context));
+CREATE TABLE IF NOT EXISTS access_lists (
+    name        TEXT PRIMARY KEY,
+    logins      TEXT,
+    updated     REAL);
+CREATE TABLE IF NOT EXISTS access_decisions (
+    author      TEXT,
+    sha         TEXT,
+    allowed     INTEGER,
+    updated     REAL,
+    PRIMARY KEY (author, sha));
+CREATE TABLE IF NOT EXISTS coverage (
+    branch_id   TEXT,
+    sha         TEXT,
+    machine     TEXT,
+    compiler    TEXT,
+    build_type  TEXT,
+    tested      REAL,
+    PRIMARY KEY (branch_id, sha, machine, compiler, build_type));
+CREATE TABLE IF NOT EXISTS results (
+    tree        TEXT,
+    machine     TEXT,
+    compiler    TEXT,
+    build_type  TEXT,
+    include_label TEXT,
+    statuses    TEXT,
+    updated     REAL);
+CREATE INDEX IF NOT EXISTS results_tree ON results (tree, machine);
+'''
+
+class PycicleStore:
+    def __init__(self, db_file, debug_print=PycicleParamsHelper.no_op):
+        """db_file : sqlite database, ':memory:' for a store that is not kept"""
+        self.db_file     = db_file
+        self.debug_print = debug_print
+        self.lock        = threading.RLock()
+        self.depth       = 0
+        # shared by the scrape/launch threads, access is serialised by the lock
+        self.db = sqlite3.connect(db_file, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.transaction():
+            self.db.executescript(_schema)
+            self.migrate()
+
+    def migrate(self):
+        """Add the columns that are missing in a database of an older version,
+        tables whose primary key changed are copied into a new table"""
+        tables, keys = {}, {}
+        for statement in _schema.split(';'):
+            match = re.match(r'\s*CREATE TABLE IF NOT EXISTS (\w+) \((.*)\)\s*$', statement, re.S)
+            if match:
+                tables[match.group(1)] = [line.strip().rstrip(',') for line in match.group(2).splitlines()
+                                          if line.strip() and not line.strip().startswith('PRIMARY KEY')]
+                key = re.search(r'PRIMARY KEY \((.*?)\)', match.group(2))
+                keys[match.group(1)] = ([k.strip() for k in key.group(1).split(',')] if key else
+                                        [c.split()[0] for c in tables[match.group(1)] if 'PRIMARY KEY' in c])
+        for table, columns in tables.items():
+            info     = self.db.execute('PRAGMA table_info({})'.format(table)).fetchall()
+            existing = [row['name'] for row in info]
+            for column in columns:
+                if column.split()[0] not in existing:
+                    self.debug_print('adding column', table, column)
+                    self.db.execute('ALTER TABLE {} ADD COLUMN {}'.format(table, column))
+            primary = [row['name'] for row in sorted(info, key=lambda r: r['pk']) if row['pk']]
+            if primary != keys[table]:
+                self.debug_print('new primary key', table, keys[table])
+                names = ', '.join(c.split()[0] for c in columns)
+                self.db.execute('ALTER TABLE {0} RENAME TO {0}_old'.format(table))
+                inline = any('PRIMARY KEY' in c for c in columns)
+                self.db.execute('CREATE TABLE {} ({}{})'.format(
+                    table, ', '.join(columns), '' if inline else ', PRIMARY KEY ({})'.format(', '.join(keys[table]))))
+                self.db.execute('INSERT OR REPLACE INTO {0} ({1}) SELECT {1} FROM {0}_old'.format(table, names))
+                self.db.execute('DROP TABLE {}_old'.format(table))
+        # indexes of the tables that were copied
+        self.db.executescript(_schema)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Changes made inside are committed together, or not at all"""
+        with self.lock:
+            self.depth += 1
+            try:
+                yield self.db
+                if self.depth == 1:
+                    self.db.commit()
+            except BaseException:
+                if self.depth == 1:
+                    self.db.rollback()
+                raise
+            finally:
+                self.depth -= 1
+
+    def execute(self, sql, parameters=()):
+        with self.transaction() as db:
+            return db.execute(sql, parameters).fetchall()
+
+    #--------------------------------------------------------------------------
+    # pull requests
+    #--------------------------------------------------------------------------
+    def pull_request(self, branch_id):
+        rows = self.execute('SELECT * FROM pull_requests WHERE branch_id = ?', (branch_id,))
+        return dict(rows[0]) if rows else None
+
+    def set_pull_request(self, branch_id, branch_name, sha, base_sha):
+        """An open PR (or the base branch) and its current head"""
+        with self.transaction() as db:
+            db.execute('INSERT OR IGNORE INTO pull_requests (branch_id) VALUES (?)', (branch_id,))
+            db.execute('''UPDATE pull_requests SET branch_name = ?, sha = ?, base_sha = ?,
+                              open = 1, updated = ? WHERE branch_id = ?''',
+                       (branch_name, sha, base_sha, time.time(), branch_id))
+
+    def open_pull_requests(self):
+        """{branch_id: [branch_name, sha]} of everything open"""
+        rows = self.execute('SELECT branch_id, branch_name, sha FROM pull_requests WHERE open = 1')
+        return dict((r['branch_id'], [r['branch_name'], r['sha']]) for r in rows)
+
+    def close_missing(self, open_ids):
+        """Mark every PR that is not in open_ids as closed"""
+        with self.transaction() as db:
+            for row in db.execute('SELECT branch_id FROM pull_requests WHERE open = 1').fetchall():
+                if row['branch_id'] not in open_ids:
+                    self.debug_print('PR closed', row['branch_id'])
+                    db.execute('UPDATE pull_requests SET open = 0, updated = ? WHERE branch_id = ?',
+                               (time.time(), row['branch_id']))
+
+    def needs_update(self, branch_id, branch_name, sha, base_sha):
+        """True (and record the new SHAs) if the PR or base changed since the last build"""
+        with self.transaction() as db:
+            row = db.execute('SELECT built_sha, built_base FROM pull_requests WHERE branch_id = ?',
+                             (branch_id,)).fetchone()
+            if row is not None and row['built_sha'] == sha and row['built_base'] == base_sha:
+                return False
+            if row is None:
+                self.set_pull_request(branch_id, branch_name, sha, base_sha)
+            db.execute('UPDATE pull_requests SET built_sha = ?, built_base = ? WHERE branch_id = ?',
+                       (sha, base_sha, branch_id))
+            return True
+
+    def is_built(self, branch_id, sha, base_sha):
+        """True if the PR was last built at these SHAs (needs_update without recording)"""
+        rows = self.execute('SELECT built_sha, built_base FROM pull_requests WHERE branch_id = ?',
+                            (branch_id,))
+        return bool(rows) and rows[0]['built_sha'] == sha and rows[0]['built_base'] == base_sha
+
+    def forget_build(self, branch_id, sha, machine, compiler, build_type):
+        """Undo needs_update and add_coverage for a build that could not be launched"""
+        with self.transaction() as db:
+            db.execute('UPDATE pull_requests SET built_sha = NULL, built_base = NULL '
+                       'WHERE branch_id = ? AND built_sha = ?', (branch_id, sha))
+            db.execute('DELETE FROM coverage WHERE branch_id = ? AND sha = ? AND machine = ? '
+                       'AND compiler IS ? AND build_type IS ?',
+                       (branch_id, sha, machine, compiler, build_type))
+
+    def has_built(self, branch_id):
+        rows = self.execute('SELECT built_sha FROM pull_requests WHERE branch_id = ?', (branch_id,))
+        return bool(rows and rows[0]['built_sha'])
+
+    #--------------------------------------------------------------------------
+    # build queue
+    #--------------------------------------------------------------------------
+    build_fields = ['pr', 'branch_name', 'machine', 'compiler', 'sha',
+                    'priority', 'state', 'enqueued', 'started', 'job_id', 'include_label', 'build_type',
+                    'tree']
+
+    def builds(self):
+        return [dict(r) for r in self.execute('SELECT * FROM builds ORDER BY enqueued')]
+
+    def put_build(self, build):
+        """Insert or replace a build, given as a dict of build_fields"""
+        with self.transaction() as db:
+            # compiler may be NULL, which the primary key does not deduplicate
+            self.delete_build(build['pr'], build['machine'], build['compiler'], build.get('build_type'))
+            db.execute('INSERT INTO builds ({}) VALUES ({})'.format(
+                           ', '.join(self.build_fields), ', '.join('?' * len(self.build_fields))),
+                       [build.get(f) for f in self.build_fields])
+
+    def delete_build(self, pr, machine, compiler, build_type=None):
+        self.execute('DELETE FROM builds WHERE pr = ? AND machine = ? AND compiler IS ? AND build_type IS ?',
+                     (pr, machine, compiler, build_type))
+
+    #--------------------------------------------------------------------------
+    # build matrix coverage
+    #--------------------------------------------------------------------------
+    def coverage(self, branch_id, machine):
+        """[(sha, compiler, build_type, time)] of the builds of a PR on the machine"""
+        rows = self.execute('SELECT sha, compiler, build_type, tested FROM coverage '
+                            'WHERE branch_id = ? AND machine = ?', (branch_id, machine))
+        return [tuple(r) for r in rows]
+
+    def add_coverage(self, branch_id, sha, machine, compiler, build_type):
+        self.execute('INSERT OR REPLACE INTO coverage VALUES (?, ?, ?, ?, ?, ?)',
+                     (branch_id, sha, machine, compiler, build_type, time.time()))
+
+    #--------------------------------------------------------------------------
+    # result cache : the statuses of a build, by merged tree and machine,
+    # compiler, build type and selected tests (which may be NULL)
+    #--------------------------------------------------------------------------
+    _result_key = 'tree = ? AND machine = ? AND compiler IS ? AND build_type IS ? AND include_label IS ?'
+
+    def cached_results(self, tree, machine, compiler, build_type, include_label=None):
+        """[(context, state, description, target_url)] of the tree, None if never tested"""
+        rows = self.execute('SELECT statuses FROM results WHERE ' + self._result_key,
+                            (tree, machine, compiler, build_type, include_label))
+        return [tuple(s) for s in json.loads(rows[0]['statuses'])] if rows else None
+
+    def cache_results(self, tree, machine, compiler, build_type, include_label, statuses):
+        with self.transaction() as db:
+            db.execute('DELETE FROM results WHERE ' + self._result_key,
+                       (tree, machine, compiler, build_type, include_label))
+            db.execute('INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?)',
+                       (tree, machine, compiler, build_type, include_label,
+                        json.dumps([list(s) for s in statuses]), time.time()))
+
+    #--------------------------------------------------------------------------
+    # published github statuses
+    #--------------------------------------------------------------------------
+    def statuses(self):
+        return StatusTable(self)
+
+    #--------------------------------------------------------------------------
+    # access control : lists of logins fetched from github, and the decision
+    # taken for the author of each head SHA
+    #--------------------------------------------------------------------------
+    def access_list(self, name):
+        """(set of logins, time fetched), or None if never fetched"""
+        rows = self.execute('SELECT logins, updated FROM access_lists WHERE name = ?', (name,))
+        return (set(json.loads(rows[0]['logins'])), rows[0]['updated']) if rows else None
+
+    def set_access_list(self, name, logins):
+        self.execute('INSERT OR REPLACE INTO access_lists VALUES (?, ?, ?)',
+                     (name, json.dumps(sorted(logins)), time.time()))
+
+    def access_decision(self, author, sha):
+        """True/False if already decided for this author and SHA, else None"""
+        rows = self.execute('SELECT allowed FROM access_decisions WHERE author = ? AND sha = ?',
+                            (author, sha))
+        return bool(rows[0]['allowed']) if rows else None
+
+    def set_access_decision(self, author, sha, allowed):
+        self.execute('INSERT OR REPLACE INTO access_decisions VALUES (?, ?, ?, ?)',
+                     (author, sha, int(allowed), time.time()))
+
+    def prune(self, days):
+        """Forget statuses not published for days, and PRs closed since then"""
+        limit = time.time() - days * 24 * 3600
+        with self.transaction() as db:
+            db.execute('DELETE FROM statuses WHERE updated < ?', (limit,))
+            db.execute('DELETE FROM access_decisions WHERE updated < ?', (limit,))
+            db.execute('DELETE FROM coverage WHERE tested < ?', (limit,))
+            db.execute('DELETE FROM results WHERE updated < ?', (limit,))
+            db.execute('DELETE FROM pull_requests WHERE open = 0 AND updated < ?', (limit,))
+
+#--------------------------------------------------------------------------
+# The statuses table seen as a mapping (sha, context) -> (state, description, url)
+#--------------------------------------------------------------------------
+class StatusTable:
+    def __init__(self, store):
+        self.store = store
+
+    def get(self, key, default=None):
+        rows = self.store.execute('SELECT state, description, target_url FROM statuses '
+                                  'WHERE sha = ? AND context = ?', key)
+        return tuple(rows[0]) if rows else default
+
+    def __setitem__(self, key, value):
+        self.store.execute('INSERT OR REPLACE INTO statuses VALUES (?, ?, ?, ?, ?, ?)',
+                           tuple(key) + tuple(value) + (time.time(),))
+
+    def items(self):
+        rows = self.store.execute('SELECT * FROM statuses')
+        return [((r['sha'], r['context']), (r['state'], r['description'], r['target_url']))
+                for r in rows]
@@ -0,0 +1,104 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from pycicle_store import PycicleStore
+from pycicle_status import StatusPublisher
+from pycicle_status_test import StatusClient
+
+class StoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.db_file = os.path.join(self.tmp, 'pycicle.db')
+        self.store = PycicleStore(self.db_file)
+
+    def test_needs_update(self):
+        self.assertTrue(self.store.needs_update('12', 'fix', 'sha1', 'base1'))
+        self.assertFalse(self.store.needs_update('12', 'fix', 'sha1', 'base1'))
+        self.assertTrue(self.store.needs_update('12', 'fix', 'sha1', 'base2'))
+        self.assertTrue(self.store.needs_update('12', 'fix', 'sha2', 'base2'))
+        # the record survives a restart
+        restored = PycicleStore(self.db_file)
+        self.assertFalse(restored.needs_update('12', 'fix', 'sha2', 'base2'))
+        self.assertTrue(restored.has_built('12'))
+        self.assertFalse(restored.has_built('13'))
+
+    def test_open_pull_requests(self):
+        self.store.set_pull_request('12', 'fix', 'sha1', 'base')
+        self.store.set_pull_request('13', 'other', 'sha2', 'base')
+        self.store.set_pull_request('12', 'fix', 'sha3', 'base')
+        self.assertEqual(PycicleStore(self.db_file).open_pull_requests(),
+                         {'12': ['fix', 'sha3'], '13': ['other', 'sha2']})
+        self.store.close_missing({'13': ['other', 'sha2']})
+        self.assertEqual(list(self.store.open_pull_requests()), ['13'])
+        self.assertEqual(self.store.pull_request('12')['open'], 0)
+        self.store.prune(-1)
+        self.assertIsNone(self.store.pull_request('12'))
+
+    def test_failed_transaction(self):
+        self.store.set_pull_request('12', 'fix', 'sha1', 'base')
+        with self.assertRaises(RuntimeError):
+            with self.store.transaction():
+                self.store.set_pull_request('12', 'fix', 'sha2', 'base')
+                self.store.set_pull_request('13', 'other', 'sha3', 'base')
+                raise RuntimeError('failed')
+        self.assertEqual(self.store.open_pull_requests(), {'12': ['fix', 'sha1']})
+
+    def test_migrate(self):
+        old_file = os.path.join(self.tmp, 'old.db')
+        db = sqlite3.connect(old_file)
+        db.execute('CREATE TABLE builds (pr TEXT, branch_name TEXT, machine TEXT, compiler TEXT, '
+                   'sha TEXT, priority INTEGER, state TEXT, enqueued REAL, started REAL, '
+                   'PRIMARY KEY (pr, machine, compiler))')
+        db.execute("INSERT INTO builds (pr, machine, compiler, sha) VALUES ('11', 'daint', 'gcc', 'sha0')")
+        db.commit()
+        db.close()
+        store = PycicleStore(old_file)
+        build = dict((f, None) for f in store.build_fields)
+        build.update(pr='12', machine='daint', compiler='gcc', include_label='^(a)$')
+        store.put_build(build)
+        self.assertEqual(store.builds()[1]['include_label'], '^(a)$')
+        self.assertEqual(store.builds()[0]['sha'], 'sha0')
+        # build types are part of the primary key now
+        build.update(build_type='Debug')
+        store.put_build(build)
+        self.assertEqual(len(PycicleStore(old_file).builds()), 3)
+
+    def test_coverage(self):
+        self.store.add_coverage('12', 'sha1', 'daint', 'gcc', 'Release')
+        self.store.add_coverage('12', 'sha1', 'daint', 'clang', 'Release')
+        self.store.add_coverage('12', 'sha1', 'greina', 'gcc', 'Release')
+        self.assertEqual(sorted(c[:3] for c in self.store.coverage('12', 'daint')),
+                         [('sha1', 'clang', 'Release'), ('sha1', 'gcc', 'Release')])
+        self.store.prune(-1)
+        self.assertEqual(self.store.coverage('12', 'daint'), [])
+
+    def test_result_cache(self):
+        statuses = [('pycicle daint-gcc Build', 'success', 'errors 0', 'url'),
+                    ('pycicle daint-gcc Test', 'failure', '1 of 2 failed', 'url')]
+        self.assertIsNone(self.store.cached_results('tree1', 'daint', 'gcc', 'Release'))
+        self.store.cache_results('tree1', 'daint', 'gcc', 'Release', None, statuses[:1])
+        self.store.cache_results('tree1', 'daint', 'gcc', 'Release', None, statuses)
+        self.assertEqual(PycicleStore(self.db_file).cached_results('tree1', 'daint', 'gcc', 'Release'),
+                         statuses)
+        # only the same tests on the same machine and compiler count
+        self.assertIsNone(self.store.cached_results('tree1', 'daint', 'gcc', 'Release', '^(a)$'))
+        self.assertIsNone(self.store.cached_results('tree1', 'greina', 'gcc', 'Release'))
+        self.store.prune(-1)
+        self.assertIsNone(self.store.cached_results('tree1', 'daint', 'gcc', 'Release'))
+
+    def test_published_statuses(self):
+        publisher = StatusPublisher(StatusClient(), self.store.statuses())
+        publisher.add('sha1', 'pycicle daint Build', 'success', 'errors 0', 'url')
+        publisher.publish()
+        # after a restart an unchanged status is still not sent again
+        client    = StatusClient()
+        publisher = StatusPublisher(client, PycicleStore(self.db_file).statuses())
+        self.assertFalse(publisher.add('sha1', 'pycicle daint Build', 'success', 'errors 0', 'url'))
+        self.assertTrue(publisher.add('sha1', 'pycicle daint Build', 'failure', 'errors 1', 'url'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,263 @@
+#  Copyright (c) 2017-2019 John Biddiscombe
+#
+#  Distributed under the Boost Software License, Version 1.0. (See accompanying
+#  file LICENSE_1_0.txt or copy at http://www.boost.org/LICENSE_1_0.txt)
+#--------------------------------------------------------------------------
+# Build result summary.
+# Run on the build machine by dashboard_script.cmake when a build ends,
+#   python pycicle_summary.py <binary dir> [--build-id N] [-o file]
+# it makes one streaming pass over the CTest Configure/Build/Test.xml of
+# the most recent dashboard run and writes a small json summary which
+# pycicle scrapes to set the github status. For incremental builds the
+# ccache statistics taken before and after the build give the hit rate.
+# After the configure and build stages it is also run with --stage, the
+# results so far go to a pycicle-stage-<stage>.txt marker that pycicle
+# publishes while the rest of the build is still running.
+# Only the standard library is used, the build machine has nothing else.
+#--------------------------------------------------------------------------
+from __future__ import absolute_import, division, print_function, unicode_literals
+import os
+import re
+import sys
+import json
+import argparse
+import xml.etree.ElementTree as ElementTree
+
+SUMMARY_VERSION = 1
+
+# the dashboard stages, in order, and the file names scraped by pycicle
+STAGES      = ('configure', 'build', 'test')
+RESULT_FILE = 'pycicle-TAG.txt'
+
+def stage_file(stage):
+    return 'pycicle-stage-{}.txt'.format(stage)
+
+# elements that are done with once they end, cleared to keep memory flat
+_disposable = ('Error', 'Warning', 'Test', 'Log', 'TestList', 'Results')
+
+def _elapsed(text):
+    try:
+        return round(float(text), 2)
+    except (TypeError, ValueError):
+        return None
+
+#--------------------------------------------------------------------------
+# One pass over a CTest xml file, counting errors/warnings and tests
+#--------------------------------------------------------------------------
+def scan_ctest_xml(xml_file):
+    result = {'errors': 0, 'warnings': 0, 'minutes': None}
+    tests  = {'passed': 0, 'failed': 0, 'not_run': 0, 'failed_tests': []}
+    status = None
+    for _, elem in ElementTree.iterparse(xml_file, events=('end',)):
+        tag = elem.tag
+        if tag == 'Error':
+            result['errors'] += 1
+        elif tag == 'Warning':
+            result['warnings'] += 1
+        elif tag == 'ElapsedMinutes':
+            result['minutes'] = _elapsed(elem.text)
+        elif tag == 'ConfigureStatus':
+            status = elem.text
+        elif tag == 'Test' and 'Status' in elem.attrib:
+            state = elem.attrib['Status']
+            if state == 'passed':
+                tests['passed'] += 1
+            elif state == 'notrun':
+                tests['not_run'] += 1
+            else:
+                tests['failed'] += 1
+                tests['failed_tests'].append(elem.findtext('Name'))
+        if tag in _disposable:
+            elem.clear()
+    if status is not None:
+        result['status'] = int(status) if status.strip().lstrip('-').isdigit() else status
+        # a failing configure without any error lines is still an error
+        if result['status'] != 0 and result['errors'] == 0:
+            result['errors'] = 1
+    if tests['passed'] or tests['failed'] or tests['not_run']:
+        result.update(tests)
+    return result
+
+#--------------------------------------------------------------------------
+# (hits, misses) from `ccache --print-stats` (ccache 4) or `ccache -s`
+#--------------------------------------------------------------------------
+def parse_ccache_stats(text):
+    values = {}
+    for line in text.splitlines():
+        fields = line.split('\t')
+        if len(fields) == 2 and fields[1].strip().isdigit():
+            values[fields[0].strip()] = int(fields[1])
+    if 'cache_miss' in values:
+        return (values.get('direct_cache_hit', 0) + values.get('preprocessed_cache_hit', 0),
+                values['cache_miss'])
+    hits, misses = 0, None
+    for line in text.splitlines():
+        # ccache 3 : "cache hit (direct)   12", ccache 4 : "  Hits:   12 / 16 (75.00 %)"
+        match = re.match(r'\s*(cache hit \(\w+\)|cache miss|Hits:|Misses:)\s+(\d+)', line)
+        if not match:
+            continue
+        name, value = match.group(1), int(match.group(2))
+        if name.startswith('cache hit'):
+            hits += value
+        elif name == 'Hits:' and not hits:
+            hits = value
+        elif misses is None:
+            misses = value
+    if misses is None:
+        return None
+    return hits, misses
+
+def ccache_summary(before_file, after_file):
+    stats = []
+    for stats_file in (before_file, after_file):
+        if not os.path.exists(stats_file):
+            return None
+        with open(stats_file, 'r') as f:
+            stats.append(parse_ccache_stats(f.read()))
+    if None in stats:
+        return None
+    hits   = stats[1][0] - stats[0][0]
+    misses = stats[1][1] - stats[0][1]
+    total  = hits + misses
+    return {'hits': hits, 'misses': misses,
+            'hit_rate': round(100.0 * hits / total, 1) if total else None}
+
+def summarize(binary_dir, build_id=None, include_label=None, stage=None, aborted=None,
+              sha=None, tree=None):
+    """stage   : last stage that has finished, when the build is still running
+    aborted : stage whose failure stopped the build (--fail-fast)
+    sha     : head SHA of the PR (or base branch) that was built
+    tree    : git tree of the sources that were built, the PR merged onto the base
+    """
+    testing_dir = os.path.join(binary_dir, 'Testing')
+    with open(os.path.join(testing_dir, 'TAG'), 'r') as f:
+        tag = f.readline().strip()
+    summary = {'version': SUMMARY_VERSION, 'tag': tag}
+    if build_id:
+        summary['build_id'] = build_id
+    if stage:
+        summary['stage'] = stage
+    if aborted:
+        summary['aborted'] = aborted
+    if sha:
+        summary['sha'] = sha
+    if tree:
+        summary['tree'] = tree
+    stages = STAGES[:STAGES.index(stage) + 1] if stage else STAGES
+    for stage in stages:
+        name = stage.capitalize() + '.xml'
+        xml_file = os.path.join(testing_dir, tag, name)
+        if os.path.exists(xml_file):
+            try:
+                summary[stage] = scan_ctest_xml(xml_file)
+            except ElementTree.ParseError as ex:
+                summary[stage] = {'errors': 1, 'parse_error': str(ex)}
+    if include_label and 'test' in summary:
+        summary['test']['include_label'] = include_label
+    ccache = ccache_summary(os.path.join(binary_dir, 'ccache-before.txt'),
+                            os.path.join(binary_dir, 'ccache-after.txt'))
+    if ccache:
+        summary['ccache'] = ccache
+    return summary
+
+#--------------------------------------------------------------------------
+# Read a scraped result file, either a json summary or the original
+# four line format (config errors, build errors, failed tests, TAG)
+#--------------------------------------------------------------------------
+def parse_result(content):
+    content = content.strip()
+    if content.startswith('{'):
+        return json.loads(content)
+    lines = content.split()
+    summary = {'version': 0,
+               'configure': {'errors': int(lines[0])},
+               'build':     {'errors': int(lines[1])},
+               'test':      {'errors': int(lines[2]), 'failed': int(lines[2])}}
+    if len(lines) > 3:
+        summary['tag'] = lines[3]
+    return summary
+
+#--------------------------------------------------------------------------
+# (context, state, description) of the Config/Build/Test github statuses
+#--------------------------------------------------------------------------
+def _minutes(stage):
+    if stage.get('minutes') is None:
+        return ''
+    return ' ({:.0f} min)'.format(stage['minutes'])
+
+def _missing(summary, name):
+    """(state, description) of a stage without results"""
+    if summary.get('aborted'):
+        return 'error', 'not run, {} failed'.format(summary['aborted'])
+    if summary.get('stage') in STAGES:
+        previous = STAGES[STAGES.index(name) - 1]
+        if previous == summary['stage']:
+            return 'pending', 'running'
+        return 'pending', 'waiting for ' + previous
+    return 'error', 'no results'
+
+def result_statuses(summary, max_description=140):
+    statuses = []
+    for context, name in [('Config', 'configure'), ('Build', 'build')]:
+        stage = summary.get(name)
+        if stage is None:
+            statuses.append((context,) + _missing(summary, name))
+            continue
+        description = 'errors {}'.format(stage['errors'])
+        if 'warnings' in stage:
+            description += ', warnings {}'.format(stage['warnings'])
+        if name == 'build' and summary.get('ccache', {}).get('hit_rate') is not None:
+            description += ', ccache hits {:.0f}%'.format(summary['ccache']['hit_rate'])
+        statuses.append((context, 'success' if stage['errors'] == 0 else 'failure',
+                         description + _minutes(stage)))
+    stage = summary.get('test')
+    if stage is None:
+        statuses.append(('Test',) + _missing(summary, 'test'))
+    elif 'failed_tests' in stage:
+        selected = ' selected' if stage.get('include_label') else ''
+        if stage['failed']:
+            description = '{} of {}{} failed{}: {}'.format(
+                stage['failed'], stage['passed'] + stage['failed'], selected, _minutes(stage),
+                ', '.join(t for t in stage['failed_tests'] if t))
+        else:
+            description = '{}{} passed{}'.format(stage['passed'], selected, _minutes(stage))
+        if len(description) > max_description:
+            description = description[:max_description - 3] + '...'
+        statuses.append(('Test', 'failure' if stage['failed'] else 'success', description))
+    else:
+        failed = stage.get('failed', stage.get('errors', 0))
+        statuses.append(('Test', 'failure' if failed else 'success',
+                         'errors {}'.format(failed) + _minutes(stage)))
+    return statuses
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Summarize a CTest dashboard run as json')
+    parser.add_argument('binary_dir', help='ctest binary directory of the build')
+    parser.add_argument('--build-id', dest='build_id', default=None,
+                        help='CDash build id returned by ctest_submit')
+    parser.add_argument('--include-label', dest='include_label', default=None,
+                        help='label regex when only some of the tests were run')
+    parser.add_argument('--stage', dest='stage', default=None, choices=STAGES[:-1],
+                        help='only this and the earlier stages have finished')
+    parser.add_argument('--aborted', dest='aborted', default=None, choices=STAGES[:-1],
+                        help='the build stopped after this stage failed')
+    parser.add_argument('--sha', dest='sha', default=None,
+                        help='head SHA that was built')
+    parser.add_argument('--tree', dest='tree', default=None,
+                        help='git tree of the sources that were built')
+    parser.add_argument('-o', '--output', dest='output', default=None,
+                        help='file to write (default <binary_dir>/pycicle-TAG.txt, '
+                             'pycicle-stage-<stage>.txt with --stage)')
+    args = parser.parse_args(argv)
+    output = args.output or os.path.join(args.binary_dir,
+                                         stage_file(args.stage) if args.stage else RESULT_FILE)
+    summary = summarize(args.binary_dir, args.build_id, args.include_label, args.stage, args.aborted,
+                        args.sha, args.tree)
+    # written under a temp name so pycicle never scrapes a partial file
+    with open(output + '.tmp', 'w') as f:
+        json.dump(summary, f, sort_keys=True)
+    os.rename(output + '.tmp', output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from pycicle_summary import (summarize, parse_result, result_statuses, main,
+                             parse_ccache_stats)
+
+test_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test', 'ctest')
+
+class SummaryTestCase(unittest.TestCase):
+    def test_summarize(self):
+        summary = summarize(test_dir, '4242')
+        self.assertEqual(summary['tag'], '20190311-0100')
+        self.assertEqual(summary['build_id'], '4242')
+        self.assertEqual(summary['configure'],
+                         {'errors': 0, 'warnings': 0, 'minutes': 1.5, 'status': 0})
+        self.assertEqual(summary['build'],
+                         {'errors': 0, 'warnings': 2, 'minutes': 40.2})
+        test = summary['test']
+        self.assertEqual((test['passed'], test['failed'], test['not_run']), (1, 2, 1))
+        self.assertEqual(test['failed_tests'], ['tests.unit.thread', 'tests.regressions.lock'])
+        self.assertEqual(test['minutes'], 12.6)
+
+    def test_statuses(self):
+        statuses = result_statuses(summarize(test_dir))
+        self.assertEqual(statuses, [
+            ('Config', 'success', 'errors 0, warnings 0 (2 min)'),
+            ('Build',  'success', 'errors 0, warnings 2 (40 min)'),
+            ('Test',   'failure', '2 of 3 failed (13 min): tests.unit.thread, tests.regressions.lock')])
+
+    def test_write_and_parse(self):
+        out_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, out_dir)
+        output = os.path.join(out_dir, 'pycicle-TAG.txt')
+        main([test_dir, '--build-id', '7', '--sha', 'sha12', '--tree', 'tree12', '-o', output])
+        with open(output) as f:
+            content = f.read()
+        self.assertEqual(parse_result(content), json.loads(content))
+        self.assertFalse(os.path.exists(output + '.tmp'))
+        self.assertEqual((json.loads(content)['sha'], json.loads(content)['tree']), ('sha12', 'tree12'))
+
+    def test_stages(self):
+        out_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, out_dir)
+        shutil.copytree(os.path.join(test_dir, 'Testing'), os.path.join(out_dir, 'Testing'))
+        main([out_dir, '--stage', 'configure'])
+        with open(os.path.join(out_dir, 'pycicle-stage-configure.txt')) as f:
+            summary = parse_result(f.read())
+        self.assertEqual(sorted(s for s in ('configure', 'build', 'test') if s in summary), ['configure'])
+        self.assertEqual(result_statuses(summary), [
+            ('Config', 'success', 'errors 0, warnings 0 (2 min)'),
+            ('Build',  'pending', 'running'),
+            ('Test',   'pending', 'waiting for build')])
+        self.assertEqual(result_statuses(summarize(out_dir, stage='build'))[2],
+                         ('Test', 'pending', 'running'))
+        # --fail-fast stopped the build after the configure failed
+        summary = summarize(out_dir, stage='configure', aborted='configure')
+        summary.pop('stage')
+        self.assertEqual(result_statuses(summary)[1:], [
+            ('Build', 'error', 'not run, configure failed'),
+            ('Test',  'error', 'not run, configure failed')])
+
+    def test_ccache_stats(self):
+        ccache3 = ('cache directory                     /scratch/ccache\n'
+                   'cache hit (direct)                   120\n'
+                   'cache hit (preprocessed)              30\n'
+                   'cache miss                            50\n'
+                   'cache hit rate                     75.00 %\n')
+        ccache4 = ('Cacheable calls:    200 /  210 (95.24%)\n'
+                   '  Hits:             150 /  200 (75.00%)\n'
+                   '    Direct:         120 /  150 (80.00%)\n'
+                   '  Misses:            50 /  200 (25.00%)\n'
+                   'Local storage:\n'
+                   '  Hits:             150 /  200 (75.00%)\n'
+                   '  Misses:            50 /  200 (25.00%)\n')
+        print_stats = 'direct_cache_hit\t120\npreprocessed_cache_hit\t30\ncache_miss\t50\n'
+        for text in [ccache3, ccache4, print_stats]:
+            self.assertEqual(parse_ccache_stats(text), (150, 50))
+        self.assertIsNone(parse_ccache_stats('ccache: command not found'))
+
+    def test_ccache_hit_rate(self):
+        binary_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, binary_dir)
+        shutil.copytree(os.path.join(test_dir, 'Testing'), os.path.join(binary_dir, 'Testing'))
+        for name, hits, misses in [('before', 100, 40), ('after', 190, 50)]:
+            with open(os.path.join(binary_dir, 'ccache-{}.txt'.format(name)), 'w') as f:
+                f.write('direct_cache_hit\t{}\ncache_miss\t{}\n'.format(hits, misses))
+        summary = summarize(binary_dir)
+        self.assertEqual(summary['ccache'], {'hits': 90, 'misses': 10, 'hit_rate': 90.0})
+        self.assertEqual(result_statuses(summary)[1],
+                         ('Build', 'success', 'errors 0, warnings 2, ccache hits 90% (40 min)'))
+
+    def test_legacy_format(self):
+        summary = parse_result('0\n3\n1\n20190311-0100\n')
+        self.assertEqual(summary['tag'], '20190311-0100')
+        self.assertEqual(result_statuses(summary), [
+            ('Config', 'success', 'errors 0'),
+            ('Build',  'failure', 'errors 3'),
+            ('Test',   'failure', 'errors 1')])
+
+if __name__ == '__main__':
+    unittest.main()
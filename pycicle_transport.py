@@ -0,0 +1,235 @@
+#  Copyright (c) 2017-2019 John Biddiscombe
+#
+#  Distributed under the Boost Software License, Version 1.0. (See accompanying
+#  file LICENSE_1_0.txt or copy at http://www.boost.org/LICENSE_1_0.txt)
+#--------------------------------------------------------------------------
+# Transports run shell commands on the machine that does the builds.
+# Commands are always given as a single shell string so that the same
+# string works locally (bash -c) and remotely (ssh host string).
+# The ssh transport keeps one multiplexed master connection per machine
+# (ControlMaster) so that each command does not pay for a new handshake.
+# The *_async variants are used by the asyncio runner, the command is
+# run by an asyncio subprocess and is killed if the caller gives up.
+#--------------------------------------------------------------------------
+from __future__ import absolute_import, division, print_function, unicode_literals
+import os
+import abc
+import time
+import asyncio
+import contextlib
+import subprocess
+
+try:
+    from shlex import quote
+except ImportError:
+    from pipes import quote
+
+from pycicle_params import PycicleParamsHelper
+from pycicle_metrics import Metrics
+
+#--------------------------------------------------------------------------
+# Turn a list of arguments into a string for the shell, quoting as needed
+#--------------------------------------------------------------------------
+def shell_command(argv):
+    return ' '.join(quote(arg) for arg in argv)
+
+class Transport(abc.ABC):
+    is_local = False
+
+    def __init__(self, nickname, debug_print=PycicleParamsHelper.no_op, metrics=None):
+        self.nickname    = nickname
+        self.debug_print = debug_print
+        self.metrics     = metrics or Metrics()
+
+    @abc.abstractmethod
+    def command(self, script):
+        """The argv that runs script on the machine"""
+
+    def ensure_connected(self):
+        pass
+
+    def run(self, script):
+        """Run script and return its output, raises CalledProcessError on failure"""
+        self.ensure_connected()
+        cmd = self.command(script)
+        self.debug_print('executing', self.nickname, ':', script)
+        with self.timed():
+            return subprocess.check_output(cmd)
+
+    @contextlib.contextmanager
+    def timed(self):
+        """Count and time a command run on the machine"""
+        try:
+            with self.metrics.timer('pycicle_command_seconds', machine=self.nickname):
+                yield
+        except Exception as ex:
+            self.metrics.inc('pycicle_command_failures_total', machine=self.nickname,
+                             error=type(ex).__name__)
+            raise
+
+    def popen(self, script, **kwargs):
+        """Start script without waiting for it to complete"""
+        self.ensure_connected()
+        cmd = self.command(script)
+        self.debug_print('starting', self.nickname, ':', script)
+        return subprocess.Popen(cmd, **kwargs)
+
+    async def ensure_connected_async(self):
+        pass
+
+    async def run_async(self, script, timeout=None, merge_stderr=False):
+        """Run script and return its output, raises CalledProcessError on failure
+        and subprocess.TimeoutExpired when it takes longer than timeout seconds"""
+        await self.ensure_connected_async()
+        cmd = self.command(script)
+        self.debug_print('executing', self.nickname, ':', script)
+        with self.timed():
+            process = await asyncio.create_subprocess_exec(
+                *cmd, stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT if merge_stderr else None)
+            try:
+                output, _ = await asyncio.wait_for(process.communicate(), timeout)
+            except asyncio.TimeoutError:
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            finally:
+                # timed out or cancelled by the caller
+                if process.returncode is None:
+                    process.kill()
+                    await process.wait()
+            if process.returncode != 0:
+                raise subprocess.CalledProcessError(process.returncode, cmd, output)
+            return output
+
+    async def start_async(self, script):
+        """Start script without waiting for it to complete, returns the process"""
+        await self.ensure_connected_async()
+        cmd = self.command(script)
+        self.debug_print('starting', self.nickname, ':', script)
+        return await asyncio.create_subprocess_exec(*cmd)
+
+class LocalTransport(Transport):
+    is_local = True
+
+    def command(self, script):
+        return ['bash', '-c', script]
+
+class SSHTransport(Transport):
+    # seconds between checks that the master connection is still alive
+    check_interval = 60
+    # how long an idle master connection is kept open
+    persist_time   = 600
+    # exit status used by ssh itself when the connection fails
+    ssh_error      = 255
+
+    def __init__(self, nickname, host, control_dir=None, debug_print=PycicleParamsHelper.no_op,
+                 metrics=None):
+        Transport.__init__(self, nickname, debug_print, metrics)
+        self.host = host
+        if control_dir is None:
+            control_dir = os.path.join(os.path.expanduser('~'), '.ssh')
+        # %C is a hash of the connection, keeps the socket path short
+        self.options = ['-o', 'ControlMaster=auto',
+                        '-o', 'ControlPath=' + os.path.join(control_dir, 'pycicle-%C'),
+                        '-o', 'ControlPersist={}'.format(self.persist_time),
+                        '-o', 'ServerAliveInterval=30']
+        self.last_check = 0
+        self.connecting = None
+
+    def command(self, script):
+        return ['ssh'] + self.options + [self.host, script]
+
+    def control(self, operation):
+        return subprocess.call(['ssh'] + self.options + ['-O', operation, self.host],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def connect(self):
+        # drop a stale master (if any) and start a fresh one in the background
+        self.control('exit')
+        self.debug_print('opening ssh master connection to', self.host)
+        subprocess.check_call(['ssh'] + self.options + ['-f', '-N', self.host])
+        self.last_check = time.time()
+
+    def ensure_connected(self):
+        if time.time() - self.last_check < self.check_interval:
+            return
+        if self.control('check') != 0:
+            self.connect()
+        self.last_check = time.time()
+
+    def run(self, script):
+        try:
+            return Transport.run(self, script)
+        except subprocess.CalledProcessError as ex:
+            if ex.returncode != self.ssh_error:
+                raise
+            # the connection (not the command) failed, reconnect and retry once
+            print('ssh to', self.host, 'failed, reconnecting')
+            self.connect()
+            return Transport.run(self, script)
+
+    #--------------------------------------------------------------------------
+    # asyncio versions of the above
+    #--------------------------------------------------------------------------
+    async def control_async(self, operation):
+        process = await asyncio.create_subprocess_exec(
+            *(['ssh'] + self.options + ['-O', operation, self.host]),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return await process.wait()
+
+    async def connect_async(self):
+        await self.control_async('exit')
+        self.debug_print('opening ssh master connection to', self.host)
+        process = await asyncio.create_subprocess_exec(*(['ssh'] + self.options + ['-f', '-N', self.host]))
+        if await process.wait() != 0:
+            raise subprocess.CalledProcessError(process.returncode, 'ssh -f -N ' + self.host)
+        self.last_check = time.time()
+
+    async def ensure_connected_async(self):
+        if time.time() - self.last_check < self.check_interval:
+            return
+        # several tasks may find the connection down at once, one reconnects
+        if self.connecting is None:
+            self.connecting = asyncio.ensure_future(self._check_async())
+        try:
+            await asyncio.shield(self.connecting)
+        finally:
+            if self.connecting is not None and self.connecting.done():
+                self.connecting = None
+
+    async def _check_async(self):
+        if await self.control_async('check') != 0:
+            await self.connect_async()
+        self.last_check = time.time()
+
+    async def run_async(self, script, timeout=None, merge_stderr=False):
+        try:
+            return await Transport.run_async(self, script, timeout, merge_stderr)
+        except subprocess.CalledProcessError as ex:
+            if ex.returncode != self.ssh_error:
+                raise
+            print('ssh to', self.host, 'failed, reconnecting')
+            await self.connect_async()
+            return await Transport.run_async(self, script, timeout, merge_stderr)
+
+#--------------------------------------------------------------------------
+# One transport per machine, created on first use
+#--------------------------------------------------------------------------
+class TransportPool:
+    def __init__(self, control_dir=None, debug_print=PycicleParamsHelper.no_op, metrics=None):
+        self.control_dir = control_dir
+        self.debug_print = debug_print
+        self.metrics     = metrics
+        self.transports  = {}
+
+    def get(self, nickname, remote_ssh):
+        """remote_ssh : the PYCICLE_MACHINE setting, 'local' for this machine"""
+        entry = self.transports.get(nickname)
+        if entry is None or entry[0] != remote_ssh:
+            if 'local' in remote_ssh:
+                transport = LocalTransport(nickname, self.debug_print, self.metrics)
+            else:
+                transport = SSHTransport(nickname, remote_ssh, self.control_dir, self.debug_print,
+                                         self.metrics)
+            entry = (remote_ssh, transport)
+            self.transports[nickname] = entry
+        return entry[1]
@@ -0,0 +1,63 @@
+import time
+import asyncio
+import subprocess
+import unittest
+
+from pycicle_transport import (Transport, LocalTransport, SSHTransport, TransportPool,
+                               shell_command)
+
+class LocalTransportTestCase(unittest.TestCase):
+    def test_quoting(self):
+        transport = LocalTransport('test')
+        cmd = shell_command(['printf', '%s|', 'a b', "it's", '*'])
+        self.assertEqual(transport.run(cmd), b"a b|it's|*|")
+
+    def test_failure(self):
+        transport = LocalTransport('test')
+        self.assertRaises(subprocess.CalledProcessError, transport.run, 'exit 3')
+
+    def test_incomplete_transport(self):
+        class NoCommand(Transport):
+            pass
+        self.assertRaises(TypeError, NoCommand, 'test')
+
+    def test_async(self):
+        transport = LocalTransport('test')
+        self.assertEqual(asyncio.run(transport.run_async('echo out; echo err >&2', merge_stderr=True)),
+                         b'out\nerr\n')
+        self.assertRaises(subprocess.CalledProcessError, asyncio.run, transport.run_async('exit 3'))
+        # commands run concurrently, and are killed when they take too long
+        async def concurrent():
+            return await asyncio.gather(transport.run_async('sleep 0.3; echo a'),
+                                        transport.run_async('sleep 0.3; echo b'))
+        start = time.time()
+        self.assertEqual(asyncio.run(concurrent()), [b'a\n', b'b\n'])
+        self.assertLess(time.time() - start, 0.55)
+        start = time.time()
+        self.assertRaises(subprocess.TimeoutExpired, asyncio.run,
+                          transport.run_async('sleep 10', timeout=0.2))
+        self.assertLess(time.time() - start, 5)
+
+class SSHTransportTestCase(unittest.TestCase):
+    def test_command(self):
+        transport = SSHTransport('daint', 'daint.cscs.ch', control_dir='/tmp/ctl')
+        cmd = transport.command('ls -l')
+        self.assertEqual(cmd[0], 'ssh')
+        self.assertEqual(cmd[-2:], ['daint.cscs.ch', 'ls -l'])
+        self.assertIn('ControlMaster=auto', cmd)
+        self.assertIn('ControlPath=/tmp/ctl/pycicle-%C', cmd)
+
+class TransportPoolTestCase(unittest.TestCase):
+    def test_pool(self):
+        pool = TransportPool()
+        local = pool.get('laptop', 'local')
+        self.assertTrue(local.is_local)
+        self.assertIs(pool.get('laptop', 'local'), local)
+        remote = pool.get('daint', 'daint.cscs.ch')
+        self.assertFalse(remote.is_local)
+        self.assertIs(pool.get('daint', 'daint.cscs.ch'), remote)
+        # a changed config gives a new transport
+        self.assertIsNot(pool.get('daint', 'ela.cscs.ch'), remote)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,136 @@
+#  Copyright (c) 2017-2019 John Biddiscombe
+#
+#  Distributed under the Boost Software License, Version 1.0. (See accompanying
+#  file LICENSE_1_0.txt or copy at http://www.boost.org/LICENSE_1_0.txt)
+#--------------------------------------------------------------------------
+# Minimal http server receiving github webhook deliveries.
+# Only the PR number (pull_request events) or the fact that the base
+# branch moved (push events) is taken from the payload, pycicle then
+# queries github for the current state, exactly as a poll would.
+#
+# To test locally, POST a recorded payload:
+# curl -H 'X-GitHub-Event: pull_request' -d @payload.json http://localhost:8080/
+#--------------------------------------------------------------------------
+from __future__ import absolute_import, division, print_function, unicode_literals
+import hmac
+import json
+import hashlib
+import threading
+
+try:
+    from http.server import HTTPServer, BaseHTTPRequestHandler
+except ImportError:
+    from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+from pycicle_params import PycicleParamsHelper
+
+# pull_request actions that can change what needs to be built
+pr_actions = ('opened', 'reopened', 'synchronize', 'edited', 'ready_for_review')
+
+class _WebhookHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        listener = self.server.listener
+        length   = int(self.headers.get('Content-Length', 0))
+        body     = self.rfile.read(length)
+        if not listener.signature_valid(body, self.headers.get('X-Hub-Signature-256')):
+            self.send_response(403)
+            self.end_headers()
+            return
+        try:
+            payload = json.loads(body.decode('utf-8'))
+        except ValueError:
+            self.send_response(400)
+            self.end_headers()
+            return
+        listener.handle_event(self.headers.get('X-GitHub-Event'), payload)
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        self.server.listener.debug_print('webhook:', format % args)
+
+class WebhookListener:
+    def __init__(self, port, base, secret=None, on_event=None, debug_print=PycicleParamsHelper.no_op):
+        """port     : port to listen on (0 picks a free one)
+        base     : the base branch that PRs must target
+        secret   : the webhook secret configured on github, if any
+        on_event : called (from the server thread) when an event is queued
+        """
+        self.base        = base
+        self.secret      = secret
+        self.on_event    = on_event
+        self.debug_print = debug_print
+        self.lock        = threading.Lock()
+        self.wakeup      = threading.Event()
+        self.pending_prs = set()
+        self.base_pushed = False
+        self.server      = HTTPServer(('', port), _WebhookHandler)
+        self.server.listener = self
+        self.port        = self.server.server_address[1]
+        self.thread      = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        print('Listening for github webhooks on port', self.port)
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def signature_valid(self, body, signature):
+        if not self.secret:
+            return True
+        if not signature:
+            return False
+        expected = 'sha256=' + hmac.new(self.secret.encode('utf-8'), body,
+                                        hashlib.sha256).hexdigest()
+        return hmac.compare_digest(expected, signature)
+
+    def handle_event(self, event, payload):
+        self.queue_event(event, payload)
+        if self.wakeup.is_set() and self.on_event:
+            self.on_event()
+
+    def queue_event(self, event, payload):
+        with self.lock:
+            if event == 'pull_request':
+                pr = payload.get('pull_request', {})
+                if (payload.get('action') in pr_actions
+                        and pr.get('base', {}).get('ref') == self.base):
+                    self.debug_print('webhook: pull request', pr.get('number'), payload['action'])
+                    self.pending_prs.add(pr['number'])
+                    self.wakeup.set()
+            elif event == 'push':
+                if payload.get('ref') == 'refs/heads/' + self.base:
+                    self.debug_print('webhook: push to base branch', self.base)
+                    self.base_pushed = True
+                    self.wakeup.set()
+
+    #--------------------------------------------------------------------------
+    # Block for up to timeout seconds, returning early when an event arrives
+    #--------------------------------------------------------------------------
+    def wait(self, timeout):
+        self.wakeup.wait(timeout)
+
+    #--------------------------------------------------------------------------
+    # Put events back to be handled by the next pass, when a pass failed or
+    # github did not know yet if a PR can be merged (no wakeup, the next
+    # pass comes after the poll interval)
+    #--------------------------------------------------------------------------
+    def requeue(self, prs, base_pushed=False):
+        with self.lock:
+            self.pending_prs |= set(prs)
+            self.base_pushed = self.base_pushed or base_pushed
+
+    #--------------------------------------------------------------------------
+    # Return (set of PR numbers, base branch pushed) received since last call
+    #--------------------------------------------------------------------------
+    def take_events(self):
+        with self.lock:
+            prs, base_pushed = self.pending_prs, self.base_pushed
+            self.pending_prs = set()
+            self.base_pushed = False
+            self.wakeup.clear()
+        return prs, base_pushed
@@ -0,0 +1,66 @@
+import os
+import hmac
+import hashlib
+import unittest
+
+try:
+    from urllib.request import Request, urlopen
+    from urllib.error import HTTPError
+except ImportError:
+    from urllib2 import Request, urlopen, HTTPError
+
+from pycicle_webhook import WebhookListener
+
+payload_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'test', 'webhooks')
+
+class WebhookTestCase(unittest.TestCase):
+    secret = None
+
+    def setUp(self):
+        self.listener = WebhookListener(0, 'master', self.secret)
+        self.listener.start()
+        self.addCleanup(self.listener.stop)
+
+    def post(self, event, name, signature=None):
+        with open(os.path.join(payload_dir, name), 'rb') as f:
+            body = f.read()
+        headers = {'X-GitHub-Event': event, 'Content-Type': 'application/json'}
+        if signature is not None:
+            headers['X-Hub-Signature-256'] = signature(body)
+        req = Request('http://localhost:{}/'.format(self.listener.port), data=body, headers=headers)
+        try:
+            return urlopen(req, timeout=10).getcode()
+        except HTTPError as ex:
+            return ex.code
+
+class RecordedPayloadTestCase(WebhookTestCase):
+    def test_pull_request(self):
+        self.assertEqual(self.post('pull_request', 'pull_request_synchronize.json'), 204)
+        self.listener.wait(5)
+        self.assertEqual(self.listener.take_events(), ({3712}, False))
+        self.assertEqual(self.listener.take_events(), (set(), False))
+
+    def test_push(self):
+        self.assertEqual(self.post('push', 'push_master.json'), 204)
+        self.assertEqual(self.listener.take_events(), (set(), True))
+
+    def test_other_base_ignored(self):
+        self.listener.base = 'release'
+        self.post('pull_request', 'pull_request_synchronize.json')
+        self.post('push', 'push_master.json')
+        self.assertEqual(self.listener.take_events(), (set(), False))
+
+class SignedPayloadTestCase(WebhookTestCase):
+    secret = 'not-so-secret'
+
+    def test_signature(self):
+        def good(body):
+            return 'sha256=' + hmac.new(self.secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+        self.assertEqual(self.post('push', 'push_master.json', lambda body: 'sha256=0'), 403)
+        self.assertEqual(self.post('push', 'push_master.json'), 403)
+        self.assertEqual(self.listener.take_events(), (set(), False))
+        self.assertEqual(self.post('push', 'push_master.json', good), 204)
+        self.assertEqual(self.listener.take_events(), (set(), True))
+
+if __name__ == "__main__":
+    unittest.main()